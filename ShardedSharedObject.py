@@ -0,0 +1,233 @@
+import marshal, os, pickle, zlib
+from multiprocessing.shared_memory import SharedMemory
+
+from SharedObject import SharedObject
+
+
+# Version 3 and later of marshal refer back to objects seen before depending on their reference
+# counts, so equal keys may be marshalled differently, version 2 has no references.
+marshal_version = 2
+
+
+def key_hash(key):
+    """Hash of `key` which is the same in every process unlike `hash`."""
+
+    try:
+        return zlib.crc32(marshal.dumps(key, marshal_version))
+    except ValueError:
+        return zlib.crc32(pickle.dumps(key, protocol = pickle.HIGHEST_PROTOCOL))
+
+
+def attach_shards(cls, name, shards):
+    """Unpickled sharded object `name`, its shards are the cached handles of the process."""
+
+    sharded = cls.__new__(cls)
+    sharded.name = name
+    sharded._control = None
+    sharded._shards = shards
+    sharded.closed = False
+    sharded.unlinked = False
+    return sharded
+
+
+class ShardedSharedObject:
+    """Base of dicts and sets whose keys are spread over `shards` independent shared objects.
+
+    Every shard has its own control segment, op-log, full dump and lock, so writers of
+    keys of different shards do not wait for each other and readers sync only the
+    shards of the keys they access. Keys go to shards by the hash of their marshalled
+    or pickled form, so keys which are equal but serialize differently, like `1` and
+    `1.0`, are different keys. Other arguments are passed to the shards.
+    """
+
+    obj_type = None
+
+    def __init__(self, obj = None, create = None, name = None, shards = None, **kwargs):
+
+        if obj is None and create == True:
+            raise Exception('If create == True, obj is need to be specified')
+
+        self.closed = False
+        self.unlinked = False
+
+        # Control segment: number of shards.
+        self._control = SharedMemory(create = create, name = name, size = 8)
+        self.name = self._control.name
+        shards_remote = self._control.buf[0:8].cast('Q')
+        if create:
+            shards_remote[0] = shards or os.cpu_count() or 1
+        shards = shards_remote[0]
+        shards_remote.release()
+
+        if create:
+            kwargs.setdefault('is_nested', False)
+            self._shards = [SharedObject(obj = self.obj_type(), create = True, name = self._shard_name(i), **kwargs)
+                            for i in range(shards)]
+            self.update(obj)
+        else:
+            self._shards = [SharedObject(create = False, name = self._shard_name(i), **kwargs) for i in range(shards)]
+
+    def __del__(self):
+        if not getattr(self, 'closed', True):
+            self.close()
+
+    def __reduce__(self):
+        return (attach_shards, (self.__class__, self.name, self._shards))
+
+    def __len__(self):
+        return sum(len(shard) for shard in self._shards)
+
+    def __contains__(self, key):
+        return key in self._shard(key)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, ShardedSharedObject):
+            other = other.copy()
+        return self.copy() == other
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.copy()!r})'
+
+    @property
+    def shards(self):
+        return len(self._shards)
+
+    def keys(self):
+        return [key for shard in self._shards for key in shard.snapshot()]
+
+    def clear(self):
+        for shard in self._shards:
+            shard.clear()
+
+    def _shard(self, key):
+        return self._shards[key_hash(key) % len(self._shards)]
+
+    def _split(self, keys):
+        """Indexes of the shards of `keys` and their keys by shard index."""
+
+        split = {}
+        for key in keys:
+            split.setdefault(key_hash(key) % len(self._shards), []).append(key)
+        return split
+
+    def _shard_name(self, index):
+        return f'{self.name}_shard{index}'
+
+    # SHARED MEMORY METHODS #
+
+    def close(self):
+        """Close all the instances of shared memory."""
+
+        if self.closed == True:
+            return True
+        for shard in self._shards:
+            shard.close()
+        if self._control is not None:
+            self._control.close()
+        self.closed = True
+        return True
+
+    def unlink(self):
+        """Unlink all the instances of shared memory."""
+
+        if self.unlinked == True:
+            return True
+        for shard in self._shards:
+            shard.unlink()
+        SharedObject.unlink_shm_by_name(self.name)
+        self.unlinked = True
+        return True
+
+
+class ShardedSharedDict(ShardedSharedObject):
+    """Dict whose keys are spread over independent shared object shards."""
+
+    obj_type = dict
+
+    def __getitem__(self, key):
+        return self._shard(key)[key]
+
+    def __setitem__(self, key, item):
+        self._shard(key)[key] = item
+
+    def __delitem__(self, key):
+        del self._shard(key)[key]
+
+    def get(self, key, default = None):
+        return self._shard(key).get(key, default)
+
+    def pop(self, key, *default):
+        return self._shard(key).pop(key, *default)
+
+    def setdefault(self, key, item = None):
+        return self._shard(key).setdefault(key, item)
+
+    def incr(self, key, delta = 1):
+        return self._shard(key).incr(key, delta)
+
+    def compare_and_set(self, key, expected, item):
+        return self._shard(key).compare_and_set(key, expected, item)
+
+    def get_and_set(self, key, item):
+        return self._shard(key).get_and_set(key, item)
+
+    def update(self, *others, **kwargs):
+        """Update the shards with one op per shard."""
+
+        other = {}
+        for items in others + (kwargs, ):
+            other.update(items)
+        for index, keys in self._split(other).items():
+            self._shards[index].update({key: other[key] for key in keys})
+
+    def values(self):
+        return [item for shard in self._shards for item in shard.snapshot().values()]
+
+    def items(self):
+        return [item for shard in self._shards for item in shard.snapshot().items()]
+
+    def copy(self):
+        return dict(self.items())
+
+
+class ShardedSharedSet(ShardedSharedObject):
+    """Set whose items are spread over independent shared object shards."""
+
+    obj_type = set
+
+    def add(self, item):
+        self._shard(item).add(item)
+
+    def discard(self, item):
+        self._shard(item).discard(item)
+
+    def remove(self, item):
+        self._shard(item).remove(item)
+
+    def pop(self):
+        for shard in self._shards:
+            if len(shard):
+                try:
+                    return shard.pop()
+                except KeyError:
+                    # Emptied by another process meanwhile.
+                    continue
+        raise KeyError('pop from an empty set')
+
+    def update(self, *others):
+        """Update the shards with one op per shard."""
+
+        for other in others:
+            for index, items in self._split(other).items():
+                self._shards[index].update(items)
+
+    def difference_update(self, *others):
+        for other in others:
+            for index, items in self._split(other).items():
+                self._shards[index].difference_update(items)
+
+    def copy(self):
+        return set(self.keys())
@@ -0,0 +1,269 @@
+import os, struct
+from multiprocessing.shared_memory import SharedMemory
+
+from SharedObject import SharedLock
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Python types accepted as `dtype` and their struct formats.
+python_formats = {float: 'd', int: 'q', bool: '?'}
+max_ndim = 8
+# The items follow the header aligned to a cache line.
+data_offset = 128
+
+
+class SharedArray:
+    """Typed array of fixed layout which lives in shared memory.
+
+    `dtype` is a struct format character, a Python type or a NumPy dtype, float64 ('d') 
+    by default or the dtype of `obj` when it is a NumPy array.
+
+    Items are read and written in place, without op-log and per-process replica, so
+    changes are visible to all the processes at once. Slice writes are not atomic.
+    The first dimension grows by `append` and `extend` up to the reserved `capacity`.
+    With NumPy installed `ndarray` is a zero-copy view of the items and `numpy.asarray`
+    works on the array.
+    """
+
+    def __init__(self, dtype = None, shape = None, create = None, name = None, capacity = None, obj = None):
+
+        if shape is None and obj is None and create == True:
+            raise Exception('If create == True, shape or obj is need to be specified')
+
+        self.closed = False
+        self.unlinked = False
+
+        if create:
+            if obj is not None:
+                if numpy is not None and isinstance(obj, numpy.ndarray):
+                    fmt = self._format(obj.dtype if dtype is None else dtype)
+                    obj_shape = obj.shape
+                else:
+                    obj = list(obj)
+                    fmt = self._format('d' if dtype is None else dtype)
+                    obj_shape = (len(obj), )
+                if shape is not None and tuple(shape) != tuple(obj_shape):
+                    raise Exception(f'Shape {tuple(shape)} does not match the shape of obj {tuple(obj_shape)}')
+                shape = obj_shape
+            else:
+                fmt = self._format('d' if dtype is None else dtype)
+
+            shape = (shape, ) if isinstance(shape, int) else tuple(shape)
+            if not 1 <= len(shape) <= max_ndim:
+                raise Exception(f'Number of dimensions has to be from 1 to {max_ndim}, got {len(shape)}')
+
+            capacity = shape[0] if capacity is None else max(capacity, shape[0])
+            itemsize = struct.calcsize(fmt)
+            row_items = 1
+            for dim in shape[1:]:
+                row_items *= dim
+            size = data_offset + max(capacity * row_items * itemsize, 1)
+
+            self._shm = SharedMemory(create = True, name = name, size = size)
+        else:
+            self._shm = SharedMemory(create = False, name = name)
+
+        self.name = self._shm.name
+
+        self._length_remote     = self._shm.buf[ 0:  8].cast('Q')
+        self._capacity_remote   = self._shm.buf[ 8: 16].cast('Q')
+        self._ndim_remote       = self._shm.buf[16: 24].cast('Q')
+        self._format_remote     = self._shm.buf[24: 32]
+        self._shape_remote      = self._shm.buf[32: 96].cast('Q')
+
+        if create:
+            self._format_remote[:] = fmt.encode('ascii').ljust(8, b'\x00')
+            self._ndim_remote[0] = len(shape)
+            for i, dim in enumerate(shape[1:]):
+                self._shape_remote[i] = dim
+            self._capacity_remote[0] = capacity
+
+        self.format = bytes(self._format_remote).rstrip(b'\x00').decode('ascii')
+        self.itemsize = struct.calcsize(self.format)
+        self.capacity = self._capacity_remote[0]
+        self._row_shape = tuple(self._shape_remote[:self._ndim_remote[0] - 1])
+        self._row_items = 1
+        for dim in self._row_shape:
+            self._row_items *= dim
+
+        self._items = self._shm.buf[data_offset:data_offset + self.capacity * self._row_items * self.itemsize].cast(self.format)
+        self._lock = SharedLock(self._shm)
+        # View of the items for the length it was made for.
+        self._view = None
+        self._view_length = -1
+
+        if create:
+            if obj is not None:
+                self._set_rows(0, obj)
+            self._length_remote[0] = shape[0]
+
+    def __del__(self):
+        if not getattr(self, 'closed', True):
+            self.close()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.tolist()!r}, format={self.format!r})'
+
+    def __len__(self):
+        return self._length_remote[0]
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __getitem__(self, key):
+        if type(key) is int and not self._row_shape:
+            return self._items[self._index(key)]
+        if numpy is not None:
+            item = self.ndarray[key]
+            # Slices are copied, views would keep the shared memory from being closed.
+            return item.copy() if isinstance(item, numpy.ndarray) else item
+
+        item = self._memoryview()[key]
+        return item.tolist() if isinstance(item, memoryview) else item
+
+    def __setitem__(self, key, value):
+        if type(key) is int and not self._row_shape:
+            self._items[self._index(key)] = value
+            return
+        if numpy is not None:
+            self.ndarray[key] = value
+            return
+
+        view = self._memoryview()
+        if isinstance(key, slice):
+            count = len(range(*key.indices(len(view))))
+            value = list(value)
+            if len(value) != count:
+                raise Exception(f'Cannot assign {len(value)} items to a slice of {count} items')
+            view[key] = memoryview(struct.pack(f'{count}{self.format}', *value)).cast(self.format)
+        else:
+            view[key] = value
+
+    def __eq__(self, other):
+        if isinstance(other, SharedArray):
+            other = other.tolist()
+        elif numpy is not None and isinstance(other, numpy.ndarray):
+            other = other.tolist()
+        return self.tolist() == other
+
+    def __array__(self, dtype = None, copy = None):
+        array = self.ndarray
+        if dtype is not None and array.dtype != dtype:
+            return array.astype(dtype)
+        return array.copy() if copy else array
+
+    @property
+    def shape(self):
+        return (len(self), ) + self._row_shape
+
+    @property
+    def ndarray(self):
+        """Zero-copy NumPy view of the items, it has to be released before `close`."""
+
+        if numpy is None:
+            raise Exception('`ndarray` requires NumPy')
+        return numpy.ndarray(self.shape, dtype = self.format, buffer = self._items)
+
+    def tolist(self):
+        return self._memoryview().tolist()
+
+    def append(self, value):
+        """Append an item, or a row of a multi-dimensional array, into the reserved capacity."""
+
+        self.extend([value])
+
+    def extend(self, values):
+        """Append items, or rows of a multi-dimensional array, into the reserved capacity."""
+
+        if numpy is None or not isinstance(values, numpy.ndarray):
+            values = list(values)
+        with self._lock:
+            length = self._length_remote[0]
+            if length + len(values) > self.capacity:
+                raise Exception(f'Not enough capacity to append {len(values)} items, capacity is {self.capacity}, length is {length}')
+            self._set_rows(length, values)
+            # The items are written before the length is published.
+            self._length_remote[0] = length + len(values)
+
+    def _set_rows(self, start, rows):
+        """Write `rows` from row `start` on, past the published length as well."""
+
+        if not len(rows):
+            return
+        if numpy is not None:
+            view = numpy.ndarray((self.capacity, ) + self._row_shape, dtype = self.format, buffer = self._items)
+            view[start:start + len(rows)] = rows
+            del view
+            return
+        if self._row_shape:
+            raise Exception('Multi-dimensional arrays require NumPy to write rows')
+        self._items[start:start + len(rows)] = memoryview(struct.pack(f'{len(rows)}{self.format}', *rows)).cast(self.format)
+
+    def _index(self, key):
+        """Position of item `key` of a one-dimensional array in the items."""
+
+        length = self._length_remote[0]
+        if key < 0:
+            key += length
+        if not 0 <= key < length:
+            raise IndexError('SharedArray index out of range')
+        return key
+
+    def _memoryview(self):
+        length = len(self)
+        if length != self._view_length:
+            if self._view is not None:
+                self._view.release()
+            self._view = self._items[:length * self._row_items].cast('B').cast(self.format, (length, ) + self._row_shape) \
+                if self._row_shape and length else self._items[:length * self._row_items]
+            self._view_length = length
+        return self._view
+
+    @staticmethod
+    def _format(dtype):
+        """Struct format of `dtype`: a format character, a Python type or a NumPy dtype."""
+
+        if dtype in python_formats:
+            return python_formats[dtype]
+        if isinstance(dtype, str) and len(dtype) == 1:
+            struct.calcsize(dtype)
+            return dtype
+        if numpy is not None:
+            return numpy.dtype(dtype).char
+        raise Exception(f'Unsupported dtype `{dtype}`, use a struct format character without NumPy')
+
+    # SHARED MEMORY METHODS #
+
+    def close(self):
+        """Close the shared memory, NumPy views of it have to be released before."""
+
+        if self.closed == True:
+            return True
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        self._items.release()
+        for remote in (self._length_remote, self._capacity_remote, self._ndim_remote,
+                       self._format_remote, self._shape_remote):
+            remote.release()
+        self._lock.close()
+        self._shm.close()
+        self.closed = True
+        return True
+
+    def unlink(self):
+        """Unlink the shared memory."""
+
+        if self.unlinked == True:
+            return True
+        self._shm.unlink()
+        try:
+            os.remove(SharedLock.lock_file_path(self.name))
+        except OSError:
+            pass
+        self.unlinked = True
+        return True
@@ -0,0 +1,434 @@
+import marshal, os, struct, time, zlib
+from functools import wraps
+from multiprocessing.shared_memory import SharedMemory
+
+from SharedObject import SharedLock, codecs, get_codec, commit_marker
+from SharedDict import marshal_version, marshal_key, codec_key
+
+
+# Header: number of slots, payload bytes of a slot, entries of the index, clock hand, items,
+# used entries of the index (live and deleted), codec id and time to live in seconds, 0 for none.
+# Counters follow: hits, misses, evictions and expirations.
+counters_offset = 64
+counter_names = ('hits', 'misses', 'evictions', 'expirations')
+# Reference bits of the slots, one byte per slot, follow the counters.
+refs_offset = 128
+# Index entry: hash of the serialized key and the slot of the item + 2.
+index_entry = struct.Struct('<QQ')
+empty_entry = 0
+deleted_entry = 1
+# Slot: sequence number, hash of the key, expiry time, lengths of the serialized key and value
+# which follow and commit marker of them. The sequence number is odd while the slot is written,
+# a free slot has no key.
+slot_header = struct.Struct('<QQdIII4x')
+# Reads of a slot which is being written before the lookup is taken as a miss.
+read_attempts = 100
+# Longest time hits and misses of a process are kept before they are added to the shared counters.
+counters_interval = 0.1
+
+
+def canonical_key(key):
+    """Key with the numbers equal to an int replaced by the int, as they are the same dict key."""
+
+    if type(key) is tuple:
+        return tuple(canonical_key(item) for item in key)
+    if type(key) is bool or (type(key) is float and key.is_integer()):
+        return int(key)
+    return key
+
+
+class SharedCache:
+    """Cache of up to `maxsize` items in fixed-size slots of shared memory, shared by processes.
+
+    Lookups probe the index of the slots and decode the value which was hit without the lock,
+    a hit only sets the reference bit of its slot, nothing is logged. When the cache is full,
+    a write evicts by CLOCK: the hand sweeps the slots, clears set reference bits and evicts
+    the first item which expired or was not hit since the last sweep, so the sweep visits
+    at most two rounds of the slots. Items expire `ttl` seconds after they were set.
+    Keys are serialized like the keys of SharedDict, so equal keys get equal bytes, values
+    by the codec, and they have to fit into `item_size` bytes together.
+
+    Lookups which race with a rebuild of the index by a writer may miss. Hits and misses
+    are counted by the process and added to the shared counters when it takes the lock,
+    at least every `counters_interval` seconds of lookups.
+    """
+
+    def __init__(self, obj = None, create = None, name = None, maxsize = 1024, ttl = None, item_size = 1024,
+                 serializer = 'pickle'):
+
+        self.closed = False
+        self.unlinked = False
+
+        if create:
+            index_size = 8
+            while index_size < 2 * maxsize:
+                index_size *= 2
+            slot_size = slot_header.size + item_size + -item_size % 8
+            size = refs_offset + maxsize + -maxsize % 8 + index_size * index_entry.size + maxsize * slot_size
+            self._shm = SharedMemory(create = True, name = name, size = size)
+        else:
+            self._shm = SharedMemory(create = False, name = name)
+        self.name = self._shm.name
+
+        self._maxsize_remote    = self._shm.buf[ 0:  8].cast('Q')
+        self._item_size_remote  = self._shm.buf[ 8: 16].cast('Q')
+        self._index_size_remote = self._shm.buf[16: 24].cast('Q')
+        self._hand_remote       = self._shm.buf[24: 32].cast('Q')
+        self._count_remote      = self._shm.buf[32: 40].cast('Q')
+        self._used_remote       = self._shm.buf[40: 48].cast('Q')
+        self._codec_remote      = self._shm.buf[48: 49]
+        self._ttl_remote        = self._shm.buf[56: 64].cast('d')
+        self._counters_remote   = self._shm.buf[counters_offset:counters_offset + 32].cast('Q')
+
+        if create:
+            serializer = get_codec(serializer)
+            self._maxsize_remote[0] = maxsize
+            self._item_size_remote[0] = item_size
+            self._index_size_remote[0] = index_size
+            self._codec_remote[0] = serializer.codec_id
+            self._ttl_remote[0] = ttl or 0
+        else:
+            if self._codec_remote[0] not in codecs:
+                raise Exception(f'Codec id {self._codec_remote[0]} is not registered in this process')
+            serializer = codecs[self._codec_remote[0]]
+        self._dumps = serializer.dumps
+        self._loads = serializer.loads
+
+        self.maxsize = self._maxsize_remote[0]
+        self.item_size = self._item_size_remote[0]
+        self.ttl = self._ttl_remote[0] or None
+        self._index_size = self._index_size_remote[0]
+        self._slot_size = slot_header.size + self.item_size + -self.item_size % 8
+        self._index_offset = refs_offset + self.maxsize + -self.maxsize % 8
+        self._slots_offset = self._index_offset + self._index_size * index_entry.size
+        self._buf = self._shm.buf
+        self._refs = self._shm.buf[refs_offset:refs_offset + self.maxsize]
+        # Hits and misses of this process not added to the shared counters yet.
+        self._pending = [0, 0]
+        self._next_flush = time.monotonic() + counters_interval
+        self._lock = SharedLock(self._shm)
+
+        if create and obj is not None:
+            self.update(obj)
+
+    def __del__(self):
+        if not getattr(self, 'closed', True):
+            self.close()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(name={self.name!r}, size={len(self)}, maxsize={self.maxsize})'
+
+    def __len__(self):
+        """Number of items, including the expired ones which were not evicted yet."""
+
+        return self._count_remote[0]
+
+    def __reduce__(self):
+        return (self.__class__, (None, False, self.name))
+
+    def __getitem__(self, key):
+        value_bytes = self._lookup(self._dumps_key(key))
+        if value_bytes is None:
+            raise KeyError(key)
+        return self._loads(value_bytes)
+
+    def __setitem__(self, key, value):
+        key_bytes, value_bytes = self._dumps_key(key), self._dumps(value)
+        if not self._put(key_bytes, value_bytes):
+            raise Exception(f'Item of {len(key_bytes) + len(value_bytes)} bytes does not fit into a slot '
+                            f'of {self.item_size} bytes, increase `item_size`')
+
+    def __delitem__(self, key):
+        key_bytes = self._dumps_key(key)
+        with self._lock:
+            self._flush_counters()
+            _, slot = self._probe(key_bytes, zlib.crc32(key_bytes))
+            if slot is None:
+                raise KeyError(key)
+            self._remove(slot)
+
+    def __contains__(self, key):
+        key_bytes = self._dumps_key(key)
+        _, slot = self._probe(key_bytes, zlib.crc32(key_bytes))
+        return slot is not None and self._read_slot(slot, key_bytes) is not None
+
+    def get(self, key, default = None):
+        value_bytes = self._lookup(self._dumps_key(key))
+        return default if value_bytes is None else self._loads(value_bytes)
+
+    def update(self, *others, **kwargs):
+        for other in others + (kwargs, ):
+            items = other.items() if hasattr(other, 'items') else other
+            for key, value in items:
+                self[key] = value
+
+    def clear(self):
+        with self._lock:
+            self._flush_counters()
+            for slot in range(self.maxsize):
+                if self._key_length(slot):
+                    self._free_slot(slot)
+            self._buf[self._index_offset:self._slots_offset] = bytes(self._slots_offset - self._index_offset)
+            self._refs[:] = bytes(self.maxsize)
+            self._count_remote[0] = 0
+            self._used_remote[0] = 0
+            self._hand_remote[0] = 0
+
+    # STATISTICS METHODS #
+
+    def stats(self):
+        """Counters of all the processes, the number of items and the capacity of the cache."""
+
+        with self._lock:
+            self._flush_counters()
+            stats = dict(zip(counter_names, self._counters_remote))
+        stats.update(size = len(self), maxsize = self.maxsize)
+        return stats
+
+    def _flush_counters(self):
+        """Add the hits and misses of this process to the shared counters, under the lock."""
+
+        if self._pending != [0, 0]:
+            self._counters_remote[0] += self._pending[0]
+            self._counters_remote[1] += self._pending[1]
+            self._pending = [0, 0]
+        self._next_flush = time.monotonic() + counters_interval
+
+    # CACHE METHODS #
+
+    def _dumps_key(self, key):
+        try:
+            return marshal_key + marshal.dumps(canonical_key(key), marshal_version)
+        except ValueError:
+            return codec_key + self._dumps(key)
+
+    def _lookup(self, key_bytes):
+        """Serialized value of the key without the lock, None if it is missing or expired."""
+
+        _, slot = self._probe(key_bytes, zlib.crc32(key_bytes))
+        value_bytes = None if slot is None else self._read_slot(slot, key_bytes)
+        if value_bytes is None:
+            self._pending[1] += 1
+        else:
+            self._refs[slot] = 1
+            self._pending[0] += 1
+        if time.monotonic() >= self._next_flush:
+            with self._lock:
+                self._flush_counters()
+        return value_bytes
+
+    def _put(self, key_bytes, value_bytes):
+        """Set the serialized item, False if it does not fit into a slot."""
+
+        if len(key_bytes) + len(value_bytes) > self.item_size:
+            return False
+        hash_ = zlib.crc32(key_bytes)
+        expires = time.time() + self.ttl if self.ttl else 0
+        with self._lock:
+            self._flush_counters()
+            _, slot = self._probe(key_bytes, hash_)
+            if slot is not None:
+                self._write_slot(slot, hash_, key_bytes, value_bytes, expires)
+                return True
+
+            slot = self._claim_slot()
+            # The slot is written before the index entry which publishes it.
+            self._write_slot(slot, hash_, key_bytes, value_bytes, expires)
+            self._refs[slot] = 0
+            position, _ = self._probe(key_bytes, hash_)
+            if self._index_entry(position)[1] == empty_entry:
+                self._used_remote[0] += 1
+            index_entry.pack_into(self._buf, self._index_offset + position * index_entry.size, hash_, slot + 2)
+            self._count_remote[0] += 1
+            if 4 * self._used_remote[0] > 3 * self._index_size:
+                self._rebuild_index()
+        return True
+
+    def _probe(self, key_bytes, hash_):
+        """Find the index entry of the key: (entry position, slot), the slot is None if the key is missing.
+
+        The position of a missing key is the position for insertion: the first deleted entry
+        on the probe sequence or the empty entry which ended it.
+        """
+
+        mask = self._index_size - 1
+        position = hash_ & mask
+        insert_position = None
+        for _ in range(self._index_size):
+            entry_hash, entry = self._index_entry(position)
+            if entry == empty_entry:
+                break
+            if entry == deleted_entry:
+                if insert_position is None:
+                    insert_position = position
+            elif entry_hash == hash_:
+                slot = entry - 2
+                offset = self._slot_offset(slot) + slot_header.size
+                if self._key_length(slot) == len(key_bytes) and self._buf[offset:offset + len(key_bytes)] == key_bytes:
+                    return position, slot
+            position = (position + 1) & mask
+        return (position if insert_position is None else insert_position), None
+
+    def _read_slot(self, slot, key_bytes):
+        """Serialized value of the slot if it holds the key and has not expired, None otherwise."""
+
+        offset = self._slot_offset(slot)
+        for _ in range(read_attempts):
+            sequence, _, expires, key_length, value_length, marker = slot_header.unpack_from(self._buf, offset)
+            if sequence % 2 == 0:
+                start = offset + slot_header.size
+                payload = bytes(self._buf[start:start + key_length + value_length])
+                # The payload may become visible after the header on weakly ordered CPUs.
+                if marker == commit_marker(payload, sequence):
+                    if payload[:key_length] != key_bytes or (expires and expires <= time.time()):
+                        return None
+                    return payload[key_length:]
+            time.sleep(0)
+        return None
+
+    def _write_slot(self, slot, hash_, key_bytes, value_bytes, expires):
+        offset = self._slot_offset(slot)
+        sequence = struct.unpack_from('<Q', self._buf, offset)[0] + 1
+        struct.pack_into('<Q', self._buf, offset, sequence)
+        payload = key_bytes + value_bytes
+        self._buf[offset + slot_header.size:offset + slot_header.size + len(payload)] = payload
+        slot_header.pack_into(self._buf, offset, sequence + 1, hash_, expires, len(key_bytes), len(value_bytes),
+                              commit_marker(payload, sequence + 1))
+
+    def _free_slot(self, slot):
+        self._write_slot(slot, 0, b'', b'', 0)
+
+    def _claim_slot(self):
+        """Free slot for a new item, evicts an item by CLOCK if there is none, under the lock."""
+
+        hand = self._hand_remote[0]
+        if self._count_remote[0] < self.maxsize:
+            for step in range(self.maxsize):
+                slot = (hand + step) % self.maxsize
+                if not self._key_length(slot):
+                    self._hand_remote[0] = (slot + 1) % self.maxsize
+                    return slot
+
+        # Lookups of other processes may set reference bits during the sweep,
+        # so the item under the hand after two rounds is evicted anyway.
+        now = time.time()
+        for step in range(2 * self.maxsize):
+            slot = (hand + step) % self.maxsize
+            expires = slot_header.unpack_from(self._buf, self._slot_offset(slot))[2]
+            if expires and expires <= now:
+                self._counters_remote[3] += 1
+            elif self._refs[slot] and step < 2 * self.maxsize - 1:
+                self._refs[slot] = 0
+                continue
+            else:
+                self._counters_remote[2] += 1
+            self._remove(slot)
+            self._hand_remote[0] = (slot + 1) % self.maxsize
+            return slot
+
+    def _remove(self, slot):
+        """Delete the item of the slot from the index and free the slot, under the lock."""
+
+        hash_ = slot_header.unpack_from(self._buf, self._slot_offset(slot))[1]
+        mask = self._index_size - 1
+        position = hash_ & mask
+        while self._index_entry(position)[1] != slot + 2:
+            position = (position + 1) & mask
+        index_entry.pack_into(self._buf, self._index_offset + position * index_entry.size, hash_, deleted_entry)
+        self._free_slot(slot)
+        self._count_remote[0] -= 1
+
+    def _rebuild_index(self):
+        """Insert the items into the emptied index to drop deleted entries, under the lock."""
+
+        self._buf[self._index_offset:self._slots_offset] = bytes(self._slots_offset - self._index_offset)
+        mask = self._index_size - 1
+        for slot in range(self.maxsize):
+            if not self._key_length(slot):
+                continue
+            hash_ = slot_header.unpack_from(self._buf, self._slot_offset(slot))[1]
+            position = hash_ & mask
+            while self._index_entry(position)[1] != empty_entry:
+                position = (position + 1) & mask
+            index_entry.pack_into(self._buf, self._index_offset + position * index_entry.size, hash_, slot + 2)
+        self._used_remote[0] = self._count_remote[0]
+
+    def _index_entry(self, position):
+        return index_entry.unpack_from(self._buf, self._index_offset + position * index_entry.size)
+
+    def _slot_offset(self, slot):
+        return self._slots_offset + slot * self._slot_size
+
+    def _key_length(self, slot):
+        return struct.unpack_from('<I', self._buf, self._slot_offset(slot) + 24)[0]
+
+    # SHARED MEMORY METHODS #
+
+    def close(self):
+        """Close the shared memory."""
+
+        if self.closed == True:
+            return True
+        with self._lock:
+            self._flush_counters()
+        del self._buf
+        for remote in (self._maxsize_remote, self._item_size_remote, self._index_size_remote, self._hand_remote,
+                       self._count_remote, self._used_remote, self._codec_remote, self._ttl_remote,
+                       self._counters_remote, self._refs):
+            remote.release()
+        self._lock.close()
+        self._shm.close()
+        self.closed = True
+        return True
+
+    def unlink(self):
+        """Unlink the shared memory."""
+
+        if self.unlinked == True:
+            return True
+        self._shm.unlink()
+        try:
+            os.remove(SharedLock.lock_file_path(self.name))
+        except OSError:
+            pass
+        self.unlinked = True
+        return True
+
+
+def shared_memoize(cache):
+    """Decorator which keeps results of the function in SharedCache `cache`, or in the cache of that name.
+
+    A result computed by one process is returned to calls with the same arguments in all
+    the processes until it is evicted or expires. The function, its arguments and its result
+    have to be serializable by the codec of the cache, results which do not fit into a slot
+    are not kept. Each process attaches the cache by name on its first call.
+    """
+
+    name = cache if isinstance(cache, str) else cache.name
+    handles = {} if isinstance(cache, str) else {os.getpid(): cache}
+
+    def handle():
+        if os.getpid() not in handles:
+            # Handles inherited by a forked process hold the hits and misses counted by the parent.
+            handles[os.getpid()] = SharedCache(create = False, name = name)
+        return handles[os.getpid()]
+
+    def decorator(func):
+        prefix = (func.__module__, func.__qualname__)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = handle()
+            key_bytes = cache._dumps_key((prefix, args, tuple(sorted(kwargs.items()))))
+            value_bytes = cache._lookup(key_bytes)
+            if value_bytes is not None:
+                return cache._loads(value_bytes)
+            result = func(*args, **kwargs)
+            cache._put(key_bytes, cache._dumps(result))
+            return result
+
+        # Statistics of the cache, with the hits and misses of this process.
+        wrapper.cache_stats = lambda: handle().stats()
+        return wrapper
+
+    return decorator
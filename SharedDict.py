@@ -0,0 +1,479 @@
+import marshal, os, struct, zlib
+from multiprocessing.shared_memory import SharedMemory
+
+from SharedObject import SharedLock, codecs, get_codec
+
+
+# Table segment: header, slots and the heap of entries.
+# Header: number of slots, heap top, used slots (live and deleted), garbage bytes in the heap.
+table_header = struct.Struct('<QQQQ')
+# Slot: hash of the serialized key and offset of the entry in the table segment.
+slot_struct = struct.Struct('<QQ')
+# Entry: lengths of the serialized key and value which follow the header.
+entry_header = struct.Struct('<II')
+empty_slot = 0
+deleted_slot = 1
+entry_alignment = 8
+# Value lengths of entries whose value is a number kept in place: 8 bytes at the
+# next aligned offset after the key, changed by atomic ops without a new entry.
+int_value = 0xFFFFFFFF
+float_value = 0xFFFFFFFE
+number_structs = {int_value: struct.Struct('<q'), float_value: struct.Struct('<d')}
+int_min, int_max = -2 ** 63, 2 ** 63 - 1
+# Serialized keys start with a tag: keys of built-in types are marshalled with version 2,
+# which unlike pickle and later versions does not refer back to objects seen before, so
+# equal keys get equal bytes. Other keys are serialized by the codec.
+marshal_version = 2
+marshal_key = b'm'
+codec_key = b'c'
+
+
+def key_hash(key_bytes):
+    """Hash of serialized key, the same in every process unlike `hash`."""
+    return zlib.crc32(key_bytes)
+
+
+def value_start(offset, key_length, value_length):
+    """Offset of the value of the entry at `offset`, numbers are aligned to be written by one store."""
+
+    start = offset + entry_header.size + key_length
+    if value_length in number_structs:
+        start += -start % entry_alignment
+    return start
+
+
+def aligned_entry_size(key_length, value_length):
+    size = value_start(0, key_length, value_length) + (8 if value_length in number_structs else value_length)
+    return size + -size % entry_alignment
+
+
+class SharedDict:
+    """Dict which keeps an open-addressing hash table and its entries in shared memory.
+
+    Lookups probe shared memory and decode only the value which was hit, so there is
+    no per-process replica and attaching does not load the data. Writes change the
+    table in place under the lock. Keys are compared by their serialized form, so
+    keys which are equal but serialize differently, like `1` and `1.0`, are different keys.
+    Keys which are not of built-in types are serialized by the codec, pickle serializes
+    an object repeated in the key by reference, so `(a, a)` and `(a, b)` with `a == b`
+    are different keys then.
+
+    Values which are ints of 64 bits or floats are kept in 8-byte slots of their entries,
+    `incr`, `compare_and_set` and `get_and_set` change them in place.
+
+    The table is rebuilt into a segment of the next generation when it runs out of
+    slots or heap, readers switch to it on the next access.
+    """
+
+    def __init__(self, obj = None, create = None, name = None, size = 10_000, capacity = 8,
+                 serializer = 'pickle'):
+
+        if obj is None and create == True:
+            raise Exception('If create == True, obj is need to be specified')
+
+        self.closed = False
+        self.unlinked = False
+
+        self._control = SharedMemory(create = create, name = name, size = 24)
+        self.name = self._control.name
+
+        self._generation_remote = self._control.buf[ 0:  8].cast('Q')
+        self._count_remote      = self._control.buf[ 8: 16].cast('Q')
+        self._codec_remote      = self._control.buf[16: 17]
+
+        self._lock = SharedLock(self._control)
+        self._size = size
+
+        if create:
+            serializer = get_codec(serializer)
+            self._codec_remote[0] = serializer.codec_id
+        else:
+            if self._codec_remote[0] not in codecs:
+                raise Exception(f'Codec id {self._codec_remote[0]} is not registered in this process')
+            serializer = codecs[self._codec_remote[0]]
+        self._serializer = serializer
+        self._dumps = serializer.dumps
+        self._loads = serializer.loads
+
+        self._table = None
+        if create:
+            slots = 8
+            while slots < capacity:
+                slots *= 2
+            self._table = self._create_table(0, slots, size)
+            self._buf = self._table.buf
+            self._generation = 0
+        else:
+            self._generation = -1
+            self._sync_generation()
+
+        if obj is not None:
+            self.update(obj)
+
+    def __del__(self):
+        if not getattr(self, 'closed', True):
+            self.close()
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def __len__(self):
+        return self._count_remote[0]
+
+    def __getitem__(self, key):
+        key_bytes = self._dumps_key(key)
+        _, offset = self._probe(key_bytes, key_hash(key_bytes))
+        if offset == empty_slot:
+            raise KeyError(key)
+        return self._load_value(offset)
+
+    def __setitem__(self, key, value):
+        self._set(self._dumps_key(key), *self._dumps_value(value))
+
+    def __delitem__(self, key):
+        if not self._delete(self._dumps_key(key)):
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        key_bytes = self._dumps_key(key)
+        return self._probe(key_bytes, key_hash(key_bytes))[1] != empty_slot
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, SharedDict):
+            other = dict(other.items())
+        return dict(self.items()) == other
+
+    def __reduce__(self):
+        return (self.__class__, (None, False, self.name))
+
+    def get(self, key, default = None):
+        key_bytes = self._dumps_key(key)
+        _, offset = self._probe(key_bytes, key_hash(key_bytes))
+        if offset == empty_slot:
+            return default
+        return self._load_value(offset)
+
+    def setdefault(self, key, default = None):
+        key_bytes = self._dumps_key(key)
+        with self._lock:
+            _, offset = self._probe(key_bytes, key_hash(key_bytes))
+            if offset != empty_slot:
+                return self._load_value(offset)
+            self._set(key_bytes, *self._dumps_value(default))
+            return default
+
+    def pop(self, key, *default):
+        key_bytes = self._dumps_key(key)
+        with self._lock:
+            _, offset = self._probe(key_bytes, key_hash(key_bytes))
+            if offset == empty_slot:
+                if default:
+                    return default[0]
+                raise KeyError(key)
+            value = self._load_value(offset)
+            self._delete(key_bytes)
+            return value
+
+    def update(self, *others, **kwargs):
+        with self._lock:
+            for other in others + (kwargs, ):
+                items = other.items() if hasattr(other, 'items') else other
+                for key, value in items:
+                    self._set(self._dumps_key(key), *self._dumps_value(value))
+
+    def clear(self):
+        with self._lock:
+            self._sync_generation()
+            self._rebuild(clear = True)
+
+    # ATOMIC METHODS #
+
+    def incr(self, key, delta = 1):
+        """Add `delta` to the value of `key`, missing keys start from 0. Return the new value."""
+
+        key_bytes = self._dumps_key(key)
+        with self._lock:
+            _, offset = self._probe(key_bytes, key_hash(key_bytes))
+            value = delta if offset == empty_slot else self._load_value(offset) + delta
+            self._store(key_bytes, offset, value)
+            return value
+
+    def compare_and_set(self, key, expected, value):
+        """Set `key` to `value` if its value equals `expected`. Return whether it was set."""
+
+        key_bytes = self._dumps_key(key)
+        with self._lock:
+            _, offset = self._probe(key_bytes, key_hash(key_bytes))
+            if offset == empty_slot or self._load_value(offset) != expected:
+                return False
+            self._store(key_bytes, offset, value)
+            return True
+
+    def get_and_set(self, key, value):
+        """Set `key` to `value`. Return the previous value, None if the key was missing."""
+
+        key_bytes = self._dumps_key(key)
+        with self._lock:
+            _, offset = self._probe(key_bytes, key_hash(key_bytes))
+            previous = None if offset == empty_slot else self._load_value(offset)
+            self._store(key_bytes, offset, value)
+            return previous
+
+    def keys(self):
+        return [key for key, _ in self._entries(values = False)]
+
+    def values(self):
+        return [value for _, value in self._entries()]
+
+    def items(self):
+        return list(self._entries())
+
+    def copy(self):
+        return dict(self.items())
+
+    # HASH TABLE METHODS #
+
+    def _probe(self, key_bytes, hash_):
+        """Find the slot of the key: (slot index, entry offset), the offset is 0 if the key is missing.
+
+        The slot index of a missing key is the slot for insertion: the first deleted slot
+        on the probe sequence or the empty slot which ended it.
+        """
+
+        if self._generation != self._generation_remote[0]:
+            self._sync_generation()
+        buf = self._buf
+        mask = self._slots - 1
+        index = hash_ & mask
+        insert_index = None
+        while True:
+            slot_hash, offset = slot_struct.unpack_from(buf, table_header.size + index * slot_struct.size)
+            if offset == empty_slot:
+                return (index if insert_index is None else insert_index), empty_slot
+            if offset == deleted_slot:
+                if insert_index is None:
+                    insert_index = index
+            elif slot_hash == hash_:
+                # Entries are immutable, the key length of the entry is checked, not of the slot.
+                key_length, _ = entry_header.unpack_from(buf, offset)
+                start = offset + entry_header.size
+                if key_length == len(key_bytes) and buf[start:start + key_length] == key_bytes:
+                    return index, offset
+            index = (index + 1) & mask
+
+    def _load_value(self, offset):
+        key_length, value_length = entry_header.unpack_from(self._buf, offset)
+        start = value_start(offset, key_length, value_length)
+        if value_length in number_structs:
+            return number_structs[value_length].unpack_from(self._buf, start)[0]
+        return self._loads(self._buf[start:start + value_length])
+
+    def _dumps_key(self, key):
+        try:
+            return marshal_key + marshal.dumps(key, marshal_version)
+        except ValueError:
+            return codec_key + self._dumps(key)
+
+    def _loads_key(self, key_bytes):
+        if key_bytes[:1] == marshal_key:
+            return marshal.loads(key_bytes[1:])
+        return self._loads(key_bytes[1:])
+
+    def _dumps_value(self, value):
+        """Serialized value and its length, numbers are packed into 8 bytes."""
+
+        if type(value) is float or (type(value) is int and int_min <= value <= int_max):
+            value_length = float_value if type(value) is float else int_value
+            return number_structs[value_length].pack(value), value_length
+        value_bytes = self._dumps(value)
+        return value_bytes, len(value_bytes)
+
+    def _store(self, key_bytes, offset, value):
+        """Set the value of the key found at entry `offset`, under the lock."""
+
+        value_bytes, value_length = self._dumps_value(value)
+        if offset == empty_slot or not self._store_number(offset, value_bytes, value_length):
+            self._set(key_bytes, value_bytes, value_length)
+
+    def _store_number(self, offset, value_bytes, value_length):
+        """Write a number over the number of the same type of the entry at `offset` by one aligned store.
+
+        Return False if the entry holds a value of another type.
+        """
+
+        key_length, entry_value_length = entry_header.unpack_from(self._buf, offset)
+        if entry_value_length != value_length or value_length not in number_structs:
+            return False
+        start = value_start(offset, key_length, value_length)
+        self._buf[start:start + 8] = value_bytes
+        return True
+
+    def _entries(self, values = True):
+        """Decode live entries of the table, one pass over the slots."""
+
+        self._sync_generation()
+        buf = self._buf
+        entries = []
+        for index in range(self._slots):
+            _, offset = slot_struct.unpack_from(buf, table_header.size + index * slot_struct.size)
+            if offset > deleted_slot:
+                key_length, _ = entry_header.unpack_from(buf, offset)
+                start = offset + entry_header.size
+                key = self._loads_key(buf[start:start + key_length])
+                value = self._load_value(offset) if values else None
+                entries.append((key, value))
+        return entries
+
+    def _set(self, key_bytes, value_bytes, value_length):
+        hash_ = key_hash(key_bytes)
+        entry_size = aligned_entry_size(len(key_bytes), value_length)
+        with self._lock:
+            index, offset = self._probe(key_bytes, hash_)
+            if offset != empty_slot and self._store_number(offset, value_bytes, value_length):
+                return
+            slots, heap_top, used, garbage = table_header.unpack_from(self._buf)
+
+            new_slot = offset == empty_slot and slot_struct.unpack_from(
+                self._buf, table_header.size + index * slot_struct.size)[1] == empty_slot
+            if heap_top + entry_size > self._table.size or (new_slot and 3 * (used + 1) > 2 * slots):
+                self._rebuild(entry_size)
+                index, offset = self._probe(key_bytes, hash_)
+                slots, heap_top, used, garbage = table_header.unpack_from(self._buf)
+                new_slot = offset == empty_slot
+
+            # The entry is written first and published by the store of the slot.
+            buf = self._buf
+            entry_header.pack_into(buf, heap_top, len(key_bytes), value_length)
+            start = heap_top + entry_header.size
+            buf[start:start + len(key_bytes)] = key_bytes
+            start = value_start(heap_top, len(key_bytes), value_length)
+            buf[start:start + len(value_bytes)] = value_bytes
+            slot_struct.pack_into(buf, table_header.size + index * slot_struct.size, hash_, heap_top)
+
+            if offset == empty_slot:
+                self._count_remote[0] += 1
+            else:
+                garbage += self._entry_size_at(offset)
+            table_header.pack_into(buf, 0, slots, heap_top + entry_size, used + new_slot, garbage)
+
+    def _delete(self, key_bytes):
+        with self._lock:
+            index, offset = self._probe(key_bytes, key_hash(key_bytes))
+            if offset == empty_slot:
+                return False
+            buf = self._buf
+            struct.pack_into('<Q', buf, table_header.size + index * slot_struct.size + 8, deleted_slot)
+            slots, heap_top, used, garbage = table_header.unpack_from(buf)
+            table_header.pack_into(buf, 0, slots, heap_top, used, garbage + self._entry_size_at(offset))
+            self._count_remote[0] -= 1
+            return True
+
+    def _entry_size_at(self, offset):
+        return aligned_entry_size(*entry_header.unpack_from(self._buf, offset))
+
+    def _rebuild(self, extra = 0, clear = False):
+        """Copy live entries into the table of the next generation, with room for `extra` heap bytes."""
+
+        old_table = self._table
+        slots, heap_top, used, garbage = table_header.unpack_from(old_table.buf)
+        count = 0 if clear else self._count_remote[0]
+
+        new_slots = 8
+        while 3 * (count + 1) > new_slots:
+            new_slots *= 2
+        heap_start = table_header.size + new_slots * slot_struct.size
+        live = 0 if clear else heap_top - (table_header.size + slots * slot_struct.size) - garbage
+
+        table = self._create_table(self._generation + 1, new_slots, max(2 * (live + extra), self._size))
+        new_heap_top = heap_start
+        for index in range(slots if not clear else 0):
+            slot_hash, offset = slot_struct.unpack_from(old_table.buf, table_header.size + index * slot_struct.size)
+            if offset <= deleted_slot:
+                continue
+            size = self._entry_size_at(offset)
+            table.buf[new_heap_top:new_heap_top + size] = old_table.buf[offset:offset + size]
+            new_index = slot_hash & (new_slots - 1)
+            while slot_struct.unpack_from(table.buf, table_header.size + new_index * slot_struct.size)[1] != empty_slot:
+                new_index = (new_index + 1) & (new_slots - 1)
+            slot_struct.pack_into(table.buf, table_header.size + new_index * slot_struct.size, slot_hash, new_heap_top)
+            new_heap_top += size
+        table_header.pack_into(table.buf, 0, new_slots, new_heap_top, count, 0)
+
+        if clear:
+            self._count_remote[0] = 0
+        # Readers of the previous generation keep its mapping, the segment is gone when they switch.
+        self._generation_remote[0] = self._generation + 1
+        self._generation += 1
+        self._table, self._buf, self._slots = table, table.buf, new_slots
+        self.unlink_shm_by_name(old_table.name)
+        old_table.close()
+
+    def _create_table(self, generation, slots, heap_size):
+        heap_start = table_header.size + slots * slot_struct.size
+        table = SharedMemory(create = True, name = self._table_name(generation), size = heap_start + heap_size)
+        table_header.pack_into(table.buf, 0, slots, heap_start, 0, 0)
+        self._slots = slots
+        return table
+
+    def _sync_generation(self):
+        """Switch to the table of the current generation."""
+
+        while self._generation != self._generation_remote[0]:
+            generation = self._generation_remote[0]
+            try:
+                table = SharedMemory(create = False, name = self._table_name(generation))
+            except FileNotFoundError:
+                # Replaced by the next generation meanwhile.
+                continue
+            if self._table is not None:
+                self._table.close()
+            self._table, self._buf, self._generation = table, table.buf, generation
+            self._slots = table_header.unpack_from(table.buf)[0]
+
+    def _table_name(self, generation):
+        return f'{self.name}_table{generation}'
+
+    # SHARED MEMORY METHODS #
+
+    def close(self):
+        """Close all the instances of shared memory."""
+
+        if self.closed == True:
+            return True
+        del self._generation_remote
+        del self._count_remote
+        del self._codec_remote
+        self._lock.close()
+        self._control.close()
+        self._table.close()
+        self.closed = True
+        return True
+
+    def unlink(self):
+        """Unlink all the instances of shared memory."""
+
+        if self.unlinked == True:
+            return True
+        self.unlink_shm_by_name(self._table_name(self._generation_remote[0]))
+        self._control.unlink()
+        try:
+            os.remove(SharedLock.lock_file_path(self.name))
+        except OSError:
+            pass
+        self.unlinked = True
+        return True
+
+    @staticmethod
+    def unlink_shm_by_name(name):
+        """Delete shared memory by its name."""
+
+        try:
+            shm = SharedMemory(create = False, name = name)
+            shm.unlink()
+            shm.close()
+            return True
+        except Exception:
+            return False
@@ -1,15 +1,490 @@
 from collections import deque, defaultdict, OrderedDict
-import pickle, gc
+import pickle, marshal, array, asyncio, errno, gc, mmap, os, select, struct, tempfile, threading, time, weakref, zlib
 from multiprocessing.shared_memory import SharedMemory
+from multiprocessing import resource_tracker
 from functools import partial
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process part of SharedLock is taken
+    fcntl = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import _posixshmem
+except ImportError:  # Windows: shared memory is gone with its last handle
+    _posixshmem = None
 
 data_types = (set, list, dict, deque, defaultdict, OrderedDict)
+sync_modes = ('always', 'interval', 'manual')
+
+# Op-log record header: payload length and commit marker.
+record_header = struct.Struct('<II')
+# Length of the record which tells readers to continue from the start of the ring buffer.
+wrap_record = 0xFFFFFFFF
+# Full dump header: length of the serialized object and number of out-of-band buffers,
+# each buffer follows the object aligned to `buffer_alignment` and prefixed with its length.
+full_dump_header = struct.Struct('<QQ')
+buffer_header = struct.Struct('<Q')
+buffer_alignment = 64
+# Saved object file: magic, codec id, lengths of the pickled type, of the full dump and of the
+# op-log records following it, and the size of the journal when saved. The full dump is aligned
+# to `buffer_alignment`, each record is prefixed with its length.
+snapshot_header = struct.Struct('<8sQQQQQ')
+snapshot_magic = b'SHOBJ\x00\x00\x01'
+saved_record_header = struct.Struct('<I')
+# Initial op-log size of nested objects, they grow on their own when written often.
+nested_size = 1_000
+# Callable `hook(name, event, values)` called on 'write', 'replay', 'full_dump' and 
+# 'full_load' events of all the shared objects of the process, see `set_metrics_hook`.
+metrics_hook = None
+
+
+def set_metrics_hook(hook):
+    """Export statistics of shared objects by `hook(name, event, values)`, None disables it.
+    
+    Writes call the hook under the lock of the object, so it should only record the values.
+    """
+    
+    global metrics_hook
+    metrics_hook = hook
+
+
+def commit_marker(payload, position):
+    """Commit marker of the op-log record written at `position`."""
+    return zlib.crc32(payload, position & 0xFFFFFFFF)
+
+
+class Codec:
+    """Serializer of op-log records and full dumps, identified in shared memory by `codec_id`.
+    
+    Plain codecs serialize only built-in types: full dumps hold the data as a plain 
+    list, dict or set, and nested objects are not supported.
+    """
+    
+    def __init__(self, codec_id, name, dumps, loads, plain = False):
+        self.codec_id = codec_id
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+        self.plain = plain
+    
+    def __repr__(self):
+        return f'Codec({self.codec_id}, {self.name!r})'
+
+
+codecs = {}
+
+
+def register_codec(codec):
+    """Register `codec`, so objects created with it can be attached by id."""
+    
+    if not 0 < codec.codec_id < 256:
+        raise Exception(f'Codec id {codec.codec_id} is out of range 1..255')
+    if codec.codec_id in codecs and codecs[codec.codec_id].name != codec.name:
+        raise Exception(f'Codec id {codec.codec_id} is already taken by {codecs[codec.codec_id]}')
+    codecs[codec.codec_id] = codec
+    return codec
+
+
+def get_codec(serializer):
+    """Find registered codec by codec, id, name or serializer module."""
+    
+    if isinstance(serializer, Codec):
+        return serializer
+    for codec in codecs.values():
+        if serializer in (codec.codec_id, codec.name) or getattr(serializer, '__name__', None) == codec.name:
+            return codec
+    raise Exception(f'Serializer `{serializer}` is not in the registered codecs {[codec.name for codec in codecs.values()]}')
+
+
+register_codec(Codec(1, 'pickle', partial(pickle.dumps, protocol = pickle.HIGHEST_PROTOCOL), pickle.loads))
+register_codec(Codec(2, 'marshal', marshal.dumps, marshal.loads, plain = True))
+
+if msgpack is not None:
+    
+    def _msgpack_default(obj):
+        if isinstance(obj, tuple):
+            return msgpack.ExtType(1, _msgpack_dumps(list(obj)))
+        if isinstance(obj, set):
+            return msgpack.ExtType(2, _msgpack_dumps(list(obj)))
+        if isinstance(obj, frozenset):
+            return msgpack.ExtType(3, _msgpack_dumps(list(obj)))
+        raise TypeError(f'Object of type `{type(obj).__name__}` is not serializable by msgpack')
+    
+    def _msgpack_ext_hook(code, data):
+        return (tuple, set, frozenset)[code - 1](_msgpack_loads(data))
+    
+    _msgpack_dumps = partial(msgpack.packb, default = _msgpack_default, use_bin_type = True, strict_types = True)
+    _msgpack_loads = partial(msgpack.unpackb, ext_hook = _msgpack_ext_hook, raw = False, strict_map_key = False)
+    
+    register_codec(Codec(3, 'msgpack', _msgpack_dumps, _msgpack_loads, plain = True))
+
+
+class SegmentLock:
+    """Re-entrant inter-process lock held on a file descriptor of a shared memory segment.
+    
+    It is shared by all the handles of the segment in the process, see `SharedLock`.
+    Locks of descriptors inherited by a forked process are shared with the parent, so the
+    forked process opens the segment again on its first acquire.
+    """
+    
+    def __init__(self, shm):
+        self._shm = shm
+        fd = getattr(shm, '_fd', -1)
+        self._fd = os.dup(fd) if fd >= 0 and fcntl is not None else -1
+        self._lock_file = None
+        self._pid = os.getpid()
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self.handles = 0
+    
+    def acquire(self):
+        if self._pid != os.getpid() and self._depth == 0:
+            self._reopen()
+        self._thread_lock.acquire()
+        if self._depth == 0 and self._fd >= 0:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except OSError:
+                # Some platforms do not support flock on shm file descriptors,
+                # fall back to a lock file named after the segment.
+                os.close(self._fd)
+                self._fd = self._open_lock_file()
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+        self._depth += 1
+    
+    def release(self):
+        self._depth -= 1
+        # The lock taken before a fork is released by the parent, not by the forked process.
+        if self._depth == 0 and self._fd >= 0 and self._pid == os.getpid():
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._thread_lock.release()
+    
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+        self._fd = -1
+        self._lock_file = None
+    
+    def _reopen(self):
+        """Take a new file description of the segment or of the lock file in a forked process."""
+        
+        self._pid = os.getpid()
+        self._thread_lock = threading.RLock()
+        if self._fd < 0:
+            return
+        os.close(self._fd)
+        if self._lock_file is not None:
+            self._fd = self._open_lock_file()
+        else:
+            self._fd = _posixshmem.shm_open(self._shm._name, os.O_RDWR, mode = 0o600)
+    
+    def _open_lock_file(self):
+        self._lock_file = os.open(SharedLock.lock_file_path(self._shm.name), os.O_CREAT | os.O_RDWR, 0o600)
+        return self._lock_file
+
+
+# Locks of the segments opened in this process by the name and the inode of the segment.
+# Handles of the same segment share the lock: the locks of separate descriptors would
+# make them wait for each other, even in the same thread.
+segment_locks = {}
+
+
+class SharedLock:
+    """Handle of the re-entrant inter-process lock of a shared memory segment.
+    
+    All the handles of the segment in the process share its `SegmentLock`, which is
+    closed with the last of them.
+    """
+    
+    def __init__(self, shm):
+        fd = getattr(shm, '_fd', -1)
+        stat = os.fstat(fd) if fd >= 0 else None
+        self._key = (shm.name, stat.st_dev, stat.st_ino) if stat is not None else (shm.name, )
+        self._segment_lock = segment_locks.get(self._key)
+        if self._segment_lock is None:
+            self._segment_lock = segment_locks[self._key] = SegmentLock(shm)
+        self._segment_lock.handles += 1
+        self.closed = False
+    
+    def __enter__(self):
+        self.acquire()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.release()
+    
+    def acquire(self):
+        self._segment_lock.acquire()
+    
+    def release(self):
+        self._segment_lock.release()
+    
+    def close(self):
+        """Close the lock of the segment if this is its last handle in the process."""
+        
+        if self.closed:
+            return
+        self.closed = True
+        self._segment_lock.handles -= 1
+        if self._segment_lock.handles == 0:
+            self._segment_lock.close()
+            if segment_locks.get(self._key) is self._segment_lock:
+                del segment_locks[self._key]
+    
+    @staticmethod
+    def lock_file_path(name):
+        """Path of the fallback lock file of shared memory `name`."""
+        return os.path.join(tempfile.gettempdir(), f'{name.lstrip("/")}.lock')
+
+
+# Arena header: bump offset, number of arenas of the object (kept in the first arena) and
+# heads of the free lists of blocks by size class, a block of class k has `min_block_size << k` bytes.
+arena_header = struct.Struct('<QQ32Q')
+arena_header_size = 512
+# Block header: size class of the block, the block is addressed by the offset after it.
+block_header = struct.Struct('<Q')
+min_block_size = 64
+
+
+class ArenaBlock:
+    """Block of an arena which stands for the shared memory segment of a nested object."""
+    
+    def __init__(self, arena, index, offset):
+        self.arena = arena
+        self.index = index
+        self.offset = offset
+        shm = arena.segment(index)
+        size_class, = block_header.unpack_from(shm.buf, offset - block_header.size)
+        self.size = (min_block_size << size_class) - block_header.size
+        # Address of the block in all the arenas of the object.
+        self.address = index * arena.arena_size + offset
+        # Short names keep the segments derived from the name within the limits of shared memory names.
+        self.name = f'{arena.name}@{self.address:x}'
+        self.buf = shm.buf[offset:offset + self.size]
+    
+    def close(self):
+        self.buf.release()
+    
+    def unlink(self):
+        self.arena.free(self.index, self.offset)
+
+
+class Arena:
+    """Shared memory arenas of nested object `name`, its nested objects in arena mode are carved from them.
+    
+    Control blocks and op-logs of nested objects are blocks of power-of-two size classes,
+    freed blocks are kept in free lists for reuse. Arenas are added when the last one is full.
+    Every arena has its lock, shared by the nested objects which live in it.
+    """
+    
+    def __init__(self, name, create = False, arena_size = 1 << 24):
+        self.name = name
+        self._segments = []
+        self._locks = []
+        shm = SharedMemory(create = create, name = f'{name}_arena0', size = arena_size)
+        if create:
+            arena_header.pack_into(shm.buf, 0, arena_header_size, 1, *[0] * 32)
+        self.arena_size = shm.size
+        self._add_segment(shm)
+        # The lock of the first arena guards allocation in all the arenas.
+        self.lock = self._locks[0]
+    
+    def segment(self, index):
+        while len(self._segments) <= index:
+            self._add_segment(SharedMemory(create = False, name = f'{self.name}_arena{len(self._segments)}'))
+        return self._segments[index]
+    
+    def lock_of(self, index):
+        self.segment(index)
+        return self._locks[index]
+    
+    def block(self, name):
+        """Block by its name."""
+        
+        return self.block_at(int(name.rsplit('@', 1)[1], 16))
+    
+    def block_at(self, address):
+        """Block by its address."""
+        return ArenaBlock(self, address // self.arena_size, address % self.arena_size)
+    
+    def allocate(self, size):
+        """Block of at least `size` bytes, None if it does not fit into an arena."""
+        
+        size_class = max(0, (size + block_header.size - 1).bit_length() - min_block_size.bit_length() + 1)
+        block_size = min_block_size << size_class
+        if block_size > self.arena_size - arena_header_size:
+            return None
+        
+        with self.lock:
+            count = arena_header.unpack_from(self._segments[0].buf)[1]
+            for index in range(count):
+                buf = self.segment(index).buf
+                head_offset = 16 + 8 * size_class
+                head, = struct.unpack_from('<Q', buf, head_offset)
+                if head:
+                    struct.pack_into('<Q', buf, head_offset, struct.unpack_from('<Q', buf, head)[0])
+                    buf[head:head + block_size - block_header.size] = bytes(block_size - block_header.size)
+                    return ArenaBlock(self, index, head)
+            
+            index = count - 1
+            top, = struct.unpack_from('<Q', self.segment(index).buf, 0)
+            if top + block_size > self.arena_size:
+                index = count
+                shm = SharedMemory(create = True, name = f'{self.name}_arena{index}', size = self.arena_size)
+                arena_header.pack_into(shm.buf, 0, arena_header_size, 0, *[0] * 32)
+                self.segment(index)
+                shm.close()
+                struct.pack_into('<Q', self._segments[0].buf, 8, count + 1)
+                top = arena_header_size
+            
+            buf = self.segment(index).buf
+            block_header.pack_into(buf, top, size_class)
+            struct.pack_into('<Q', buf, 0, top + block_size)
+            return ArenaBlock(self, index, top + block_header.size)
+    
+    def free(self, index, offset):
+        """Put the block back to the free list of its size class."""
+        
+        with self.lock:
+            buf = self.segment(index).buf
+            size_class, = block_header.unpack_from(buf, offset - block_header.size)
+            head_offset = 16 + 8 * size_class
+            struct.pack_into('<Q', buf, offset, struct.unpack_from('<Q', buf, head_offset)[0])
+            struct.pack_into('<Q', buf, head_offset, offset)
+    
+    def unlink(self):
+        """Unlink all the arenas."""
+        
+        unlink_segments([f'{self.name}_arena{index}' for index in range(arena_header.unpack_from(self._segments[0].buf)[1])])
+    
+    def _add_segment(self, shm):
+        self._segments.append(shm)
+        self._locks.append(SharedLock(shm))
+
+
+# Arenas of nested objects in arena mode opened in this process by name.
+arenas = {}
+
+
+def get_arena(name):
+    """Cached arenas of nested object `name`."""
+    
+    if name not in arenas:
+        arenas[name] = Arena(name)
+    return arenas[name]
+
+
+def unlink_segments(names):
+    """Unlink shared memory segments by name without mapping them, missing segments are skipped."""
+    
+    if _posixshmem is None:
+        return
+    for name in names:
+        try:
+            _posixshmem.shm_unlink(f'/{name}')
+        except FileNotFoundError:
+            continue
+        # Every process which mapped a segment registered it with the resource tracker,
+        # registering again makes unregistering safe for segments this process never mapped.
+        resource_tracker.register(f'/{name}', 'shared_memory')
+        resource_tracker.unregister(f'/{name}', 'shared_memory')
+        try:
+            os.remove(SharedLock.lock_file_path(name))
+        except OSError:
+            pass
+
+
+class Manifest:
+    """Append-only list of the names of shared memory segments of nested object `name` and its nested objects.
+    
+    Teardown unlinks the segments by name without attaching the objects. Names are
+    zero-terminated, they fill a chain of segments `{name}`, `{name}1`, ... of doubling size.
+    """
+    
+    # Used bytes of the segment and number of segments in the chain (kept in the first segment).
+    header = struct.Struct('<QQ')
+    
+    def __init__(self, name, create = False, size = 1 << 16):
+        self.name = name
+        self._segments = [SharedMemory(create = create, name = name, size = size)]
+        if create:
+            self.header.pack_into(self._segments[0].buf, 0, self.header.size, 1)
+        self._lock = SharedLock(self._segments[0])
+    
+    def __reduce__(self):
+        return (get_manifest, (self.name, ))
+    
+    def add(self, name):
+        self.extend([name])
+    
+    def extend(self, names):
+        data = b''.join(name.encode('utf-8') + b'\x00' for name in names)
+        with self._lock:
+            count = self.header.unpack_from(self._segments[0].buf)[1]
+            shm = self._segment(count - 1)
+            used, _ = self.header.unpack_from(shm.buf)
+            if used + len(data) > shm.size:
+                shm = SharedMemory(create = True, name = f'{self.name}{count}',
+                                   size = max(2 * shm.size, self.header.size + len(data)))
+                self.header.pack_into(shm.buf, 0, self.header.size, 0)
+                self._segments.append(shm)
+                struct.pack_into('<Q', self._segments[0].buf, 8, count + 1)
+                used = self.header.size
+            shm.buf[used:used + len(data)] = data
+            struct.pack_into('<Q', shm.buf, 0, used + len(data))
+    
+    def names(self):
+        names = []
+        for index in range(self.header.unpack_from(self._segments[0].buf)[1]):
+            shm = self._segment(index)
+            used, _ = self.header.unpack_from(shm.buf)
+            names.extend(bytes(shm.buf[self.header.size:used]).decode('utf-8').split('\x00')[:-1])
+        return names
+    
+    def unlink(self):
+        """Unlink all the segments of the manifest and close them."""
+        
+        count = self.header.unpack_from(self._segments[0].buf)[1]
+        self._lock.close()
+        for shm in self._segments:
+            shm.close()
+        unlink_segments([self.name] + [f'{self.name}{index}' for index in range(1, count)])
+        manifests.pop(self.name, None)
+    
+    def _segment(self, index):
+        while len(self._segments) <= index:
+            self._segments.append(SharedMemory(create = False, name = f'{self.name}{len(self._segments)}'))
+        return self._segments[index]
+
+
+# Manifests of nested objects opened in this process by name.
+manifests = {}
+
+
+def get_manifest(name):
+    """Cached manifest `name`."""
+    
+    if name not in manifests:
+        manifests[name] = Manifest(name)
+    return manifests[name]
 
 
 def apply_changes_dec(func):
     
     def wrapper(self, *args, **kwargs):
-        self.apply_changes()
+        if self._sync == 'always':
+            if self._update_stream_position != self._update_stream_position_remote[0]:
+                self.apply_changes()
+        elif self._sync == 'interval':
+            if time.perf_counter_ns() >= self._next_sync:
+                self.refresh()
         res = func(self, *args, **kwargs)
         return res
     wrapper.__name__ = func.__name__
@@ -21,44 +496,241 @@ def write_changes_dec(func):
     
     def wrapper(self, *args, **kwargs):
         
+        varnames = func.__code__.co_varnames
+        
         if self._is_nested:
-            varnames = func.__code__.co_varnames
-            
             if 'item' in varnames:
                 item_index = varnames.index('item') - 1
-                item = args[item_index]
-                
-                if isinstance(item, data_types):
-                    item = SharedObject(
-                        obj = item,
-                        create = True,
-                        size = self.size,
-                        is_nested = True,
-                        shm_register = self._shm_register
-                    )
-                    self._shm_register.add(item.name)
-                    args = list(args)
-                    args[item_index] = item
+                args = list(args)
+                args[item_index] = self._share_item(args[item_index])
         
-        res = func(self, *args, **kwargs)
-        self._write_changes(func.__name__, *args, **kwargs)
+        # Bulk arguments are materialized once, so the very same items are
+        # applied locally and written to the op-log as a single record.
+        if 'other' in varnames:
+            other_index = varnames.index('other') - 1
+            if other_index < len(args):
+                args = list(args)
+                args[other_index] = self._share_items(args[other_index])
+        elif 'others' in varnames:
+            if isinstance(self.data, dict):
+                other = {}
+                for item in args:
+                    other.update(self._share_items(item))
+                other.update(self._share_items(kwargs))
+                args, kwargs = (other,), {}
+            else:
+                args = [self._share_items(item) for item in args]
+        
+        with self._lock:
+            self.apply_changes()
+            if self._pin is not None:
+                self._unpin_data()
+            res = func(self, *args, **kwargs)
+            self._write_changes(func.__name__, *args, **kwargs)
         return res
     wrapper.__name__ = func.__name__
 
     return wrapper
 
 
+def write_result_dec(func):
+    """Write the record returned by an op which is expensive or not deterministic to replay.
+    
+    The op returns its result and the record `(func_name, *args)` which reproduces the
+    change in linear time, like a permutation or a delta, instead of the op itself,
+    or None if it changed nothing.
+    """
+    
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            self.apply_changes()
+            if self._pin is not None:
+                self._unpin_data()
+            res, record = func(self, *args, **kwargs)
+            if record is not None:
+                self._write_changes(*record)
+        return res
+    wrapper.__name__ = func.__name__
+    
+    return wrapper
+
+
+# Ops merged into a single bulk op inside of `SharedObject.batch`: op -> (bulk op, items of the op).
+bulk_ops = {
+    'append'                    : ('extend',              lambda args: [args[0]]),
+    'extend'                    : ('extend',              lambda args: args[0]),
+    'appendleft'                : ('extendleft',          lambda args: [args[0]]),
+    'extendleft'                : ('extendleft',          lambda args: args[0]),
+    'add'                       : ('update',              lambda args: [args[0]]),
+    'update'                    : ('update',              lambda args: [item for other in args for item in other]),
+    'discard'                   : ('difference_update',   lambda args: [args[0]]),
+    'difference_update'         : ('difference_update',   lambda args: [item for other in args for item in other]),
+}
+dict_bulk_ops = {
+    '__setitem__'               : ('update',              lambda args: {args[0]: args[1]}),
+    'update'                    : ('update',              lambda args: args[0]),
+}
+
+batch_record = '__batch__'
+# Record of the new order of list items by their old indexes, packed as unsigned ints.
+permute_record = '__permute__'
+
+# Op-log record opcodes: a record is one opcode byte followed by the arguments of the op,
+# marshalled when they are of built-in types or serialized by the codec (opcode | codec_args).
+# Other ops and ops with keyword arguments are serialized by the codec after opcode 0.
+opcodes = (
+    None, '__setitem__', '__delitem__', 'append', 'appendleft', 'clear', 'extend', 'extendleft',
+    'insert', 'pop', 'popleft', 'popitem', 'remove', 'reverse', 'rotate', 'sort', 'setdefault',
+    'move_to_end', 'update', 'add', 'discard', 'difference_update', 'intersection_update',
+    'symmetric_difference_update', batch_record, permute_record,
+)
+opcode_ids = {func_name: opcode for opcode, func_name in enumerate(opcodes) if func_name}
+codec_args = 0x80
+
+
+def encode_record(codec, func_name, args, kwargs):
+    """Encode op-log record of op `func_name`."""
+    
+    opcode = opcode_ids.get(func_name)
+    if opcode is None or kwargs:
+        return b'\x00' + codec.dumps((func_name, args, kwargs))
+    try:
+        return bytes((opcode,)) + marshal.dumps(args)
+    except ValueError:
+        return bytes((opcode | codec_args,)) + codec.dumps(args)
+
+
+def decode_record(codec, record):
+    """Decode op-log record into op name, arguments and keyword arguments."""
+    
+    opcode = record[0]
+    if opcode == 0:
+        return codec.loads(record[1:])
+    if opcode & codec_args:
+        return opcodes[opcode ^ codec_args], codec.loads(record[1:]), {}
+    return opcodes[opcode], marshal.loads(record[1:]), {}
+
+
+# Methods of the data which do not change it, available on snapshots.
+snapshot_methods = frozenset((
+    'copy', 'count', 'index', 'get', 'items', 'keys', 'values', 'difference', 'intersection',
+    'isdisjoint', 'issubset', 'issuperset', 'symmetric_difference', 'union',
+))
+
+
+class Snapshot:
+    """Read-only view of the data of a shared object at stream `position`.
+    
+    The view holds the data of the object itself, the object copies its data before 
+    changing it while the view is alive. Nested objects are live, not snapshots.
+    """
+    
+    def __init__(self, data, position, pin):
+        self._data = data
+        self.position = position
+        # Shared by the views of the same data, the object copies its data while it is alive.
+        self._pin = pin
+    
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self._data!r}, position={self.position})'
+    
+    def __getitem__(self, key):
+        return self._data[key]
+    
+    def __contains__(self, key):
+        return key in self._data
+    
+    def __len__(self):
+        return len(self._data)
+    
+    def __iter__(self):
+        return iter(self._data)
+    
+    def __reversed__(self):
+        return reversed(self._data)
+    
+    def __eq__(self, other):
+        return self._data == (other._data if isinstance(other, Snapshot) else other)
+    
+    def __getattr__(self, name):
+        if name in snapshot_methods:
+            return getattr(self._data, name)
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+
+class Pin:
+    """Token of the snapshots of the same data, see `SharedObject.snapshot`."""
+
+
+# Handles of nested objects attached in this process by name, shared by all the parents.
+handles = weakref.WeakValueDictionary()
+# Handles of root objects unpickled in this process by name and object id, they stay attached
+# and synced, so passing an object to tasks of a process pool attaches it once per worker.
+# Handles of objects which were unlinked or replaced since are closed on the next unpickling.
+attached = {}
+if hasattr(os, 'register_at_fork'):
+    # Forked processes attach handles of their own instead of the inherited ones.
+    os.register_at_fork(after_in_child = handles.clear)
+    os.register_at_fork(after_in_child = attached.clear)
+    os.register_at_fork(after_in_child = arenas.clear)
+    os.register_at_fork(after_in_child = manifests.clear)
+
+
+def attach_handle(name, shm_register = None, object_id = None):
+    """Cached lazy handle of shared object `name`, it maps the segments on first access.
+    
+    Handles of root objects are kept by `object_id` until the object is unlinked.
+    """
+    
+    if object_id is not None and (shm_register is None or shm_register.name == f'{name}_manifest'):
+        for key, handle in list(attached.items()):
+            # An object created under the same name before is gone.
+            if (key[0] == name and key[1] != object_id) or handle._is_unlinked():
+                handle.close()
+            if handle.closed:
+                del attached[key]
+        handle = attached.get((name, object_id))
+        if handle is None:
+            handle = SharedObject(create = False, name = name, shm_register = shm_register, lazy = True)
+            handle._object_id = object_id
+            attached[(name, object_id)] = handle
+        return handle
+    
+    handle = handles.get(name)
+    if handle is None or handle.closed:
+        handle = SharedObject(create = False, name = name, shm_register = shm_register, lazy = True)
+        handles[name] = handle
+    return handle
+
+
 class SharedObject:
     """Wrapper for python mutable container objects which uses shared memory as a backend."""
     
     # DUNDER METHODS #
     
     def __init__(self, obj = None, create = None, name = None, size = 10_000,
-                 serializer = pickle, is_nested = None, shm_register = None, control_shm_size = 1000):
+                 serializer = 'pickle', is_nested = None, shm_register = None, control_shm_size = 1000,
+                 snapshot_ops = None, snapshot_bytes = None, out_of_band = False,
+                 sync = 'always', sync_interval = 1000, max_size = 1 << 28, min_dump_interval = 100_000,
+                 lazy = False, arena = False, arena_size = 1 << 24, journal = None):
+        
+        if lazy and not create:
+            # Handle of an existing object: the segments are mapped and the data is
+            # synced on first access, see `__getattr__`.
+            self.name = name
+            self.closed = False
+            self.unlinked = False
+            self._shm_register = shm_register
+            self._lazy_init = dict(name = name, shm_register = shm_register, sync = sync, sync_interval = sync_interval,
+                                   max_size = max_size, min_dump_interval = min_dump_interval)
+            return
         
         if obj is None and create == True:
             raise Exception('If create == True, obj is need to be specified')
         
+        if sync not in sync_modes:
+            raise Exception(f'Sync mode `{sync}` is not in the supported modes {list(sync_modes)}')
+        
         if obj is not None:
             if not isinstance(obj, data_types):
                 raise Exception(f'Object type `{type(obj).__name__}` is not in the supported types {[data_type.__name__ for data_type in data_types]}')
@@ -67,22 +739,107 @@ class SharedObject:
         self._full_dump_counter = 0
         self.closed = False
         
-        self._control = SharedMemory(create = create, name = name, size = control_shm_size)
+        # Descriptor of the journal of the object, opened by every writer, see `load`.
+        self._journal = None
+        # Weak reference to the pin of the snapshots of data, see `snapshot`.
+        self._pin = None
+        
+        # Statistics of this process, see `stats`.
+        self._records_replayed = 0
+        self._replay_ns = 0
+        self._full_loads = 0
+        self._full_load_ns = 0
+        
+        # Reads sync with shared memory on every call ('always'), at most once per
+        # `sync_interval` microseconds ('interval') or on `refresh` only ('manual'),
+        # writes always sync first.
+        self._sync = sync
+        self._sync_interval = sync_interval
+        self._next_sync = 0
+        
+        # In arena mode nested objects are blocks of the arenas of the root object,
+        # they are passed the arenas when created and find them by name when attached.
+        self._arena = None
+        if isinstance(arena, Arena):
+            self._arena = arena
+        elif not create and name is not None and '@' in name:
+            self._arena = get_arena(name.rsplit('@', 1)[0])
+        
+        if self._arena is None:
+            self._control = SharedMemory(create = create, name = name, size = control_shm_size)
+        elif create:
+            self._control = self._arena.allocate(control_shm_size)
+        else:
+            self._control = self._arena.block(name)
+        self._in_arena = isinstance(self._control, ArenaBlock)
         self.name = self._control.name
 
-        self._update_stream_position_remote = self._control.buf[  0:   4]
-        self._full_dump_counter_remote      = self._control.buf[  4:   8]
-        self._is_nested_remote              = self._control.buf[  8:  10]
-        self._full_dump_memory_name_remote  = self._control.buf[ 10: 265]
-        self._obj_type_remote               = self._control.buf[265:1000]
+        # The op-log is a ring buffer, positions are absolute offsets in the stream:
+        # records live between head and tail (update stream position), the full dump
+        # holds the state of the object at the full dump position.
+        # Numeric fields are native-endian words, so they are read and written by one index access.
+        self._update_stream_position_remote = self._control.buf[  0:   8].cast('Q')
+        self._update_stream_head_remote     = self._control.buf[  8:  16].cast('Q')
+        self._full_dump_position_remote     = self._control.buf[ 16:  24].cast('Q')
+        self._sequence_remote               = self._control.buf[ 24:  32].cast('Q')
+        self._full_dump_ops_remote          = self._control.buf[ 32:  40].cast('Q')
+        self._buffer_size_remote            = self._control.buf[ 40:  48].cast('Q')
+        self._full_dump_counter_remote      = self._control.buf[ 48:  52].cast('I')
+        self._is_nested_remote              = self._control.buf[ 52:  53]
+        self._codec_remote                  = self._control.buf[ 53:  54]
+        self._arena_remote                  = self._control.buf[ 54:  55]
+        # Set when the object is unlinked, so handles attached by other processes let go of it.
+        self._unlinked_remote               = self._control.buf[ 55:  56]
+        self._waiters_count_remote          = self._control.buf[ 56:  64].cast('Q')
+        self._waiters_remote                = self._control.buf[ 64: 192].cast('Q')
+        self._full_dump_incarnation_remote  = self._control.buf[192: 200].cast('Q')
+        self._full_dump_slots_remote        = self._control.buf[200: 216].cast('Q')
+        self._buffer_generation_remote      = self._control.buf[216: 224].cast('Q')
+        self._buffer_address_remote         = self._control.buf[224: 232].cast('Q')
+        # Statistics of the object: ops written, op-log bytes, full dumps, their bytes and nanoseconds.
+        self._stats_remote                  = self._control.buf[232: 272].cast('Q')
+        # Random id which tells apart objects created under the same name.
+        self._object_id_remote              = self._control.buf[272: 280].cast('Q')
+        # Limits of the op-log growth set by the creator: bytes and microseconds.
+        self._max_size_remote               = self._control.buf[280: 288].cast('Q')
+        self._min_dump_interval_remote      = self._control.buf[288: 296].cast('Q')
+        # Size of the journal with the ops written so far, saved by any process, see `save`,
+        # and the length of its path, which follows the obj type.
+        self._journal_size_remote           = self._control.buf[296: 304].cast('Q')
+        self._journal_path_length_remote    = self._control.buf[304: 312].cast('Q')
+        self._full_dump_memory_name_remote  = self._control.buf[312: 535]
+        self._obj_type_remote               = self._control.buf[535:]
         
-        self._serializer = serializer
+        if self._in_arena:
+            self._lock = self._arena.lock_of(self._control.index)
+        else:
+            self._lock = SharedLock(self._control)
+        self._snapshot_ops = snapshot_ops
+        self._snapshot_bytes = snapshot_bytes
+        self._out_of_band = out_of_band
 
-        self._buffer = SharedMemory(create = create, name = f'{self.name}_memory', size = size)
-        self.size = self._buffer.size
+        # The op-log grows into a new buffer of the next generation when the ring fills
+        # up more often than every `min_dump_interval` microseconds, up to `max_size`.
+        # Both are set by the creator, writers of all the processes keep to them.
+        if create:
+            self._max_size_remote[0] = max_size
+            self._min_dump_interval_remote[0] = min_dump_interval
+        self._max_size = self._max_size_remote[0]
+        self._min_dump_interval = self._min_dump_interval_remote[0]
+        self._last_pressure_dump = 0
+        self._buffer_generation = self._buffer_generation_remote[0]
+        self._buffer = self._open_buffer(create, self._buffer_generation, size)
+        if create:
+            self._buffer_size_remote[0] = self._buffer.size
+        self.size = self._buffer_size_remote[0]
         
         self.unlinked = False
         self._full_dump_memory = None
+        self._full_dump_segments = {}
+        self._retired_full_dump_memory = []
+        self._batch = None
+        self._waiter = None
+        self._waiter_fds = {}
 
         if create:
     
@@ -93,38 +850,61 @@ class SharedObject:
             else:
                 obj_type = type(obj)
 
-            obj_type_remote = self._serializer.dumps(obj_type)
+            # The type is always pickled, attachers learn the codec of data from it.
+            obj_type_remote = pickle.dumps(obj_type)
                 
-            if 265 + len(obj_type_remote) > self._control.size:
-                raise Exception(f'Not enough shared memory to save obj type, increase `control_shm_size` to {265+len(obj_type_remote)}')
+            if 535 + 4 + len(obj_type_remote) > self._control.size:
+                raise Exception(f'Not enough shared memory to save obj type, increase `control_shm_size` to {535+4+len(obj_type_remote)}')
             
             self._obj_type_remote[:4] = len(obj_type_remote).to_bytes(4, 'little')
             self._obj_type_remote[4:4+len(obj_type_remote)] = obj_type_remote
+            self._object_id_remote[0] = int.from_bytes(os.urandom(8), 'little')
             
             if isinstance(obj, set):
                 is_nested = False
             
+            serializer = get_codec(serializer)
+            if is_nested and serializer.plain:
+                raise Exception(f'Codec `{serializer.name}` does not support nested objects')
+            if out_of_band and serializer.name != 'pickle':
+                raise Exception('Out-of-band buffers are supported by `pickle` codec only')
+            
             if is_nested:
                 self._is_nested_remote[:1] = b'1'
+            self._codec_remote[0] = serializer.codec_id
+            
+            if arena == True and is_nested:
+                self._arena = arenas[self.name] = Arena(self.name, create = True, arena_size = arena_size)
+                self._arena_remote[0] = 1
         else:
             
             obj_type_length = int.from_bytes(bytes(self._obj_type_remote[:4]), 'little')
             obj_type = pickle.loads(self._obj_type_remote[4:4+obj_type_length])
             
             is_nested = self._is_nested_remote[:1] == b'1'
+            if self._codec_remote[0] not in codecs:
+                raise Exception(f'Codec id {self._codec_remote[0]} is not registered in this process')
+            serializer = codecs[self._codec_remote[0]]
+            
+            if self._arena is None and self._arena_remote[0]:
+                self._arena = get_arena(self.name)
+        
+        self._serializer = serializer
+        self._object_id = self._object_id_remote[0]
         
         self._obj_type = obj_type
         self._is_nested = is_nested
 
+        # The manifest of the root object records the segments of all the nested objects.
         if self._is_nested:
             if shm_register is not None: 
                 self._shm_register = shm_register
+            elif create:
+                self._shm_register = manifests[f'{self.name}_manifest'] = Manifest(f'{self.name}_manifest', create = True)
             else:
-                if create:
-                    self._shm_register = SharedObject(obj=set(), create=True, name=f'{self.name}_register',
-                                                    is_nested=False)
-                else:
-                    self._shm_register = SharedObject(create=False, name=f'{self.name}_register')
+                self._shm_register = get_manifest(f'{self.name}_manifest')
+            if create:
+                self._shm_register.extend(shm.name for shm in (self._control, self._buffer) if isinstance(shm, SharedMemory))
         else:
             self._shm_register = None
         
@@ -138,6 +918,9 @@ class SharedObject:
         else:
             self.apply_changes()
         
+        if journal is not None:
+            self._open_journal(journal)
+        
     def __del__(self):
         if not self.closed:
             self.close()
@@ -176,9 +959,18 @@ class SharedObject:
     def __iter__(self):
         return iter(self.data)
     
-    @apply_changes_dec
     def __reduce__(self):
-        return (partial(self.__class__, name = self.name, shm_register = self._shm_register), ())
+        return (attach_handle, (self.name, self._shm_register, self.__dict__.get('_object_id')))
+    
+    def __getattr__(self, name):
+        # Called only for missing attributes: a lazy handle attaches on first access.
+        lazy_init = self.__dict__.pop('_lazy_init', None)
+        if lazy_init is None or (name.startswith('__') and name.endswith('__')):
+            if lazy_init is not None:
+                self._lazy_init = lazy_init
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        self.__init__(**lazy_init)
+        return getattr(self, name)
     
     @apply_changes_dec
     def __eq__(self, other):
@@ -217,9 +1009,9 @@ class SharedObject:
         return self.data.count(item)
     
     @apply_changes_dec
+    @write_changes_dec
     def extend(self, other):
-        for item in other:
-            self.append(item)
+        self.data.extend(other)
     
     @apply_changes_dec
     def index(self, item, start=0, stop=9223372036854775807):
@@ -231,9 +1023,13 @@ class SharedObject:
         self.data.insert(index, item)
     
     @apply_changes_dec
-    @write_changes_dec
+    @write_result_dec
     def pop(self, *args):
-        return self.data.pop(*args)
+        if isinstance(self.data, set):
+            # Sets pop an arbitrary item, it may differ in other processes.
+            item = self.data.pop()
+            return item, ('discard', item)
+        return self.data.pop(*args), ('pop', *args)
     
     @apply_changes_dec
     @write_changes_dec
@@ -246,9 +1042,16 @@ class SharedObject:
         self.data.reverse()
     
     @apply_changes_dec
-    @write_changes_dec
+    @write_result_dec
     def sort(self, key=None, reverse=False):
-        self.data.sort(key=key, reverse=reverse)
+        # Readers apply the permutation instead of sorting again, `key` is not serialized.
+        data = self.data
+        if not isinstance(data, list):
+            raise AttributeError(f"'{type(data).__name__}' object has no attribute 'sort'")
+        order = sorted(range(len(data)), key=data.__getitem__ if key is None else lambda i: key(data[i]),
+                       reverse=reverse)
+        self._permute(order)
+        return None, (permute_record, array.array('I', order).tobytes())
 
     # DEQUE METHODS #
     
@@ -258,9 +1061,9 @@ class SharedObject:
         self.data.appendleft(item)
     
     @apply_changes_dec
+    @write_changes_dec
     def extendleft(self, other):
-        for item in other:
-            self.appendleft(item)
+        self.data.extendleft(other)
     
     @apply_changes_dec
     @write_changes_dec
@@ -291,13 +1094,9 @@ class SharedObject:
         return self.data.values()
     
     @apply_changes_dec
-    def update(self, other):
-        if isinstance(self.data, (dict, defaultdict, OrderedDict)):
-            for key, item in other.items():
-                self[key] = item
-        else:
-            for item in other:
-                self.add(item)
+    @write_changes_dec
+    def update(self, *others, **kwargs):
+        self.data.update(*others, **kwargs)
         
     @apply_changes_dec
     @write_changes_dec
@@ -307,7 +1106,33 @@ class SharedObject:
     @apply_changes_dec
     @write_changes_dec
     def setdefault(self, key, item=None):
-        self.data.setdefault(key, item)
+        return self.data.setdefault(key, item)
+    
+    # Read-modify-write ops of a value under the lock, written as the value they set.
+    
+    @apply_changes_dec
+    @write_result_dec
+    def incr(self, key, delta=1):
+        item = self.data.get(key, 0) + delta
+        self.data[key] = item
+        return item, ('__setitem__', key, item)
+    
+    @apply_changes_dec
+    @write_result_dec
+    def compare_and_set(self, key, expected, item):
+        if key not in self.data or self.data[key] != expected:
+            return False, None
+        item = self._share_item(item)
+        self.data[key] = item
+        return True, ('__setitem__', key, item)
+    
+    @apply_changes_dec
+    @write_result_dec
+    def get_and_set(self, key, item):
+        previous = self.data.get(key)
+        item = self._share_item(item)
+        self.data[key] = item
+        return previous, ('__setitem__', key, item)
     
     # ORDEREDDICT METHODS #
     
@@ -342,9 +1167,16 @@ class SharedObject:
         return self.data.intersection(*args)
     
     @apply_changes_dec
-    @write_changes_dec
+    @write_result_dec
     def intersection_update(self, *args):
+        args = [other if isinstance(other, (set, frozenset)) else set(other) for other in args]
+        removed = [item for item in self.data if not all(item in other for other in args)]
+        # Readers discard the removed items unless the other sets are smaller.
+        if len(removed) <= sum(len(other) for other in args):
+            self.data.difference_update(removed)
+            return None, ('difference_update', removed)
         self.data.intersection_update(*args)
+        return None, ('intersection_update', *args)
     
     @apply_changes_dec
     def isdisjoint(self, other):
@@ -371,134 +1203,1030 @@ class SharedObject:
     def union(self, *args):
         return self.data.union(*args)
     
+    # CHANGE NOTIFICATION METHODS #
+    
+    def wait_for_change(self, timeout = None):
+        """Block until the object is changed in shared memory and apply the changes.
+        
+        Returns False if `timeout` seconds passed without changes.
+        """
+        
+        fd = self._register_waiter()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self._drain_waiter()
+            if self._update_stream_position != self._update_stream_position_remote[0]:
+                self.refresh()
+                return True
+            
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            if remaining == 0:
+                return False
+            select.select([fd], [], [], remaining)
+    
+    async def changes(self):
+        """Asynchronously iterate over the stream positions of the object as it is changed in shared memory."""
+        
+        fd = self._register_waiter()
+        event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        loop.add_reader(fd, event.set)
+        try:
+            while True:
+                event.clear()
+                self._drain_waiter()
+                if self._update_stream_position != self._update_stream_position_remote[0]:
+                    self.refresh()
+                    yield self._update_stream_position
+                else:
+                    await event.wait()
+        finally:
+            loop.remove_reader(fd)
+    
+    def _register_waiter(self):
+        """Create FIFO of this object waiting for changes and register it in the control segment."""
+        
+        if self._waiter is not None:
+            return self._waiter[0]
+        
+        token = int.from_bytes(os.urandom(4), 'little') | 1
+        path = self._waiter_path(os.getpid(), token)
+        os.mkfifo(path, 0o600)
+        read_fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+        # The own writing end keeps the FIFO from reporting end of file between notifications.
+        write_fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+        
+        waiter = os.getpid() << 32 | token
+        with self._lock:
+            for slot, slot_waiter in enumerate(self._waiters_remote):
+                if slot_waiter == 0:
+                    self._waiters_remote[slot] = waiter
+                    self._waiters_count_remote[0] += 1
+                    break
+            else:
+                os.close(read_fd)
+                os.close(write_fd)
+                os.remove(path)
+                raise Exception(f'All {len(self._waiters_remote)} waiter slots of `{self.name}` are taken')
+        
+        self._waiter = (read_fd, write_fd, slot, waiter, path)
+        return read_fd
+    
+    def _unregister_waiter(self):
+        """Remove FIFO of this object from the control segment."""
+        
+        if self._waiter is None:
+            return
+        
+        read_fd, write_fd, slot, waiter, path = self._waiter
+        with self._lock:
+            if self._waiters_remote[slot] == waiter:
+                self._waiters_remote[slot] = 0
+                self._waiters_count_remote[0] -= 1
+        os.close(read_fd)
+        os.close(write_fd)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        self._waiter = None
+    
+    def _drain_waiter(self):
+        """Read pending notifications from FIFO of this object."""
+        
+        try:
+            while os.read(self._waiter[0], 4096):
+                pass
+        except BlockingIOError:
+            pass
+    
+    def _notify_waiters(self):
+        """Wake up the objects waiting for changes, called under the writer lock."""
+        
+        if self._waiters_count_remote[0] == 0:
+            return
+        
+        for slot, waiter in enumerate(self._waiters_remote):
+            if waiter == 0:
+                continue
+            
+            if slot in self._waiter_fds and self._waiter_fds[slot][0] != waiter:
+                os.close(self._waiter_fds.pop(slot)[1])
+            try:
+                if slot not in self._waiter_fds:
+                    fd = os.open(self._waiter_path(waiter >> 32, waiter & 0xFFFFFFFF), os.O_WRONLY | os.O_NONBLOCK)
+                    self._waiter_fds[slot] = (waiter, fd)
+                os.write(self._waiter_fds[slot][1], b'\x00')
+            except BlockingIOError:
+                # The FIFO is full of notifications which are not read yet.
+                pass
+            except OSError as e:
+                if e.errno not in (errno.ENOENT, errno.ENXIO, errno.EPIPE):
+                    raise
+                # The waiting process is gone.
+                if slot in self._waiter_fds:
+                    os.close(self._waiter_fds.pop(slot)[1])
+                self._waiters_remote[slot] = 0
+                self._waiters_count_remote[0] -= 1
+    
+    def _close_waiter_fds(self):
+        for _, fd in self._waiter_fds.values():
+            os.close(fd)
+        self._waiter_fds = {}
+    
+    def _waiter_path(self, pid, token):
+        return os.path.join(tempfile.gettempdir(), f'{self.name.lstrip("/")}.{pid}.{token}.fifo')
+    
+    # STATISTICS METHODS #
+    
+    def stats(self):
+        """Statistics of the object shared by all the processes and of this process.
+        
+        Shared: ops written, op-log bytes written, full dumps, their total bytes and nanoseconds.
+        This process: records replayed and nanoseconds spent on them, full dumps loaded and 
+        nanoseconds spent on them, bytes of the op-log not applied yet (lag behind the writers).
+        """
+        
+        ops_written, op_log_bytes, full_dumps, full_dump_bytes, full_dump_ns = self._stats_remote
+        return {
+            'ops_written': ops_written,
+            'op_log_bytes': op_log_bytes,
+            'full_dumps': full_dumps,
+            'full_dump_bytes': full_dump_bytes,
+            'full_dump_ns': full_dump_ns,
+            'records_replayed': self._records_replayed,
+            'replay_ns': self._replay_ns,
+            'full_loads': self._full_loads,
+            'full_load_ns': self._full_load_ns,
+            'lag_bytes': self._update_stream_position_remote[0] - self._update_stream_position,
+        }
+    
+    # PERSISTENCE METHODS #
+    
+    def save(self, path):
+        """Save the object to file `path`: its full dump and the op-log records which follow it.
+        
+        The file is replaced atomically, writers wait until it is written. If the object
+        has a journal, its size is saved too, so `load` replays only the ops written later.
+        Objects with nested objects are not supported.
+        """
+        
+        if self._is_nested:
+            raise Exception('Saving objects with nested objects is not supported')
+        
+        with self._lock:
+            self.apply_changes()
+            if self._full_dump_counter_remote[0] == 0 or self._full_dump_position_remote[0] < self._update_stream_head_remote[0]:
+                self.dump_full_object()
+            
+            name = bytes(self._full_dump_memory_name_remote).decode('utf-8').strip().strip('\x00')
+            incarnation = self._full_dump_incarnation_remote[0]
+            if incarnation:
+                full_dump_memory = self._open_full_dump_memory(name, incarnation)
+            else:
+                full_dump_memory = SharedMemory(create = False, name = name)
+            dump_length = self._full_dump_length(full_dump_memory)
+            records, _ = self._read_records(self._full_dump_position_remote[0], self._update_stream_position, decode = False)
+            obj_type = pickle.dumps(self._obj_type)
+            journal_offset = self._journal_size_remote[0]
+            
+            temp_path = f'{path}.tmp'
+            with open(temp_path, 'wb') as file:
+                file.write(snapshot_header.pack(snapshot_magic, self._serializer.codec_id, len(obj_type), dump_length,
+                                                sum(saved_record_header.size + len(record) for record in records), journal_offset))
+                file.write(obj_type)
+                file.write(bytes(-file.tell() % buffer_alignment))
+                with full_dump_memory.buf[:dump_length] as dump:
+                    file.write(dump)
+                for record in records:
+                    file.write(saved_record_header.pack(len(record)))
+                    file.write(record)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, path)
+            
+            if not incarnation:
+                full_dump_memory.close()
+    
+    @classmethod
+    def load(cls, path, name = None, journal = None, **kwargs):
+        """Create shared object `name` from file `path` written by `save`.
+        
+        The full dump is copied from the memory-mapped file straight into shared memory,
+        then the saved op-log records and the ops appended to `journal` after the save
+        are replayed, up to the last one written completely. The journal path is kept
+        in the control segment, so the writers of all the processes go on appending
+        their ops to `journal`, whether they were given it or not.
+        """
+        
+        with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                magic, codec_id, obj_type_length, dump_length, records_length, journal_offset = snapshot_header.unpack_from(view)
+                if magic != snapshot_magic:
+                    raise Exception(f'File `{path}` is not a saved shared object')
+                pos = snapshot_header.size
+                obj_type = pickle.loads(view[pos:pos+obj_type_length])
+                pos += obj_type_length
+                pos += -pos % buffer_alignment
+                
+                sh_obj = cls(obj = obj_type(), create = True, name = name, serializer = codec_id, is_nested = False, **kwargs)
+                sh_obj._restore_full_dump(view[pos:pos+dump_length])
+                pos += dump_length
+                
+                records = []
+                end = pos + records_length
+                while pos < end:
+                    length, = saved_record_header.unpack_from(view, pos)
+                    pos += saved_record_header.size
+                    records.append(bytes(view[pos:pos+length]))
+                    pos += length
+            finally:
+                view.release()
+        
+        if journal is not None:
+            journal_records, journal_end = cls._read_journal(journal, journal_offset)
+            records += journal_records
+            # A record torn by a crash would hide the records appended after it.
+            if os.path.exists(journal) and os.path.getsize(journal) > journal_end:
+                os.truncate(journal, journal_end)
+        
+        with sh_obj._lock:
+            for record in records:
+                func_name, args, op_kwargs = decode_record(sh_obj._serializer, record)
+                sh_obj._replay(func_name, args, op_kwargs)
+                sh_obj._write_changes(func_name, *args, **op_kwargs)
+        
+        if journal is not None:
+            sh_obj._open_journal(journal)
+        return sh_obj
+    
+    def _open_journal(self, path = None):
+        """Append the ops written by this process to the journal of the object, set to `path` if it has none."""
+        
+        with self._lock:
+            start = 4 + int.from_bytes(bytes(self._obj_type_remote[:4]), 'little')
+            length = self._journal_path_length_remote[0]
+            if path is not None:
+                path_remote = os.path.abspath(path).encode('utf-8')
+                if length and bytes(self._obj_type_remote[start:start+length]) != path_remote:
+                    raise Exception(f'Object `{self.name}` is journaled to another file than `{path}`')
+                if 535 + start + len(path_remote) > self._control.size:
+                    raise Exception(f'Not enough shared memory to save journal path, increase `control_shm_size` to {535+start+len(path_remote)}')
+                self._obj_type_remote[start:start+len(path_remote)] = path_remote
+                self._journal_path_length_remote[0] = length = len(path_remote)
+            path = bytes(self._obj_type_remote[start:start+length]).decode('utf-8')
+            self._journal = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            self._journal_size_remote[0] = max(self._journal_size_remote[0], os.fstat(self._journal).st_size)
+    
+    def _restore_full_dump(self, dump):
+        """Publish full dump `dump` in the format of `dump_full_object` and load it."""
+        
+        with self._lock:
+            self.apply_changes()
+            if full_dump_header.unpack_from(dump)[1]:
+                full_dump_memory, incarnation = SharedMemory(create = True, size = len(dump)), 0
+            else:
+                full_dump_memory, incarnation = self._full_dump_slot_memory((self._full_dump_counter_remote[0] + 1) % 2, len(dump))
+            full_dump_memory.buf[:len(dump)] = dump
+            if not incarnation:
+                full_dump_memory.close()
+            self._publish_full_dump(full_dump_memory, incarnation, self._update_stream_position)
+            # The records before the dump do not hold the data, attaching processes load the dump.
+            self._set_update_stream_head(self._update_stream_position)
+            self._load_full_object(force = True)
+    
+    @staticmethod
+    def _full_dump_length(full_dump_memory):
+        """Length of the full dump in its segment, including out-of-band buffers."""
+        
+        length, buffers_number = full_dump_header.unpack_from(full_dump_memory.buf)
+        pos = full_dump_header.size + length
+        for _ in range(buffers_number):
+            pos += -pos % buffer_alignment
+            buffer_length, = buffer_header.unpack_from(full_dump_memory.buf, pos)
+            pos += buffer_header.size + buffer_length
+        return pos
+    
+    @staticmethod
+    def _read_journal(path, offset):
+        """Op-log records appended to journal `path` from `offset` on, up to the first torn one,
+        and the end of the last complete record."""
+        
+        if not os.path.exists(path):
+            return [], 0
+        with open(path, 'rb') as file:
+            file.seek(offset)
+            data = file.read()
+        
+        records = []
+        pos = 0
+        while pos + record_header.size <= len(data):
+            length, marker = record_header.unpack_from(data, pos)
+            record = data[pos+record_header.size:pos+record_header.size+length]
+            if len(record) != length or marker != commit_marker(record, 0):
+                break
+            records.append(record)
+            pos += record_header.size + length
+        return records, offset + pos
+    
     # SHARED MEMORY METHODS #
     
+    @contextmanager
+    def batch(self):
+        """Context in which changes are applied locally and written to shared memory as a single record.
+        
+        The writer lock is held for the whole context, consecutive appends, adds,
+        discards and dict assignments are merged into one bulk op.
+        """
+        
+        with self._lock:
+            if self._batch is not None:
+                yield self
+                return
+            
+            self.apply_changes()
+            self._batch = []
+            try:
+                yield self
+            finally:
+                records, self._batch = self._coalesce(self._batch), None
+                if len(records) == 1:
+                    func_name, args, kwargs = records[0]
+                    self._write_changes(func_name, *args, **kwargs)
+                elif records:
+                    self._write_changes(batch_record, records)
+    
+    @apply_changes_dec
+    def snapshot(self):
+        """Read-only view of the data at the current stream position which later changes do not affect.
+        
+        Taking a snapshot copies nothing: the data is copied, shallowly, only when it 
+        is changed while a snapshot of it is alive.
+        """
+        
+        pin = self._pin() if self._pin is not None else None
+        if pin is None:
+            pin = Pin()
+            self._pin = weakref.ref(pin)
+        return Snapshot(self.data, self._update_stream_position, pin)
+    
+    def _unpin_data(self):
+        """Copy the data before it is changed if a snapshot of it is alive."""
+        
+        if self._pin() is not None:
+            self.data = self.data.copy()
+        self._pin = None
+    
+    def _coalesce(self, records):
+        """Merge consecutive ops of a batch into bulk ops."""
+        
+        ops = dict_bulk_ops if isinstance(self.data, dict) else bulk_ops
+        
+        coalesced = []
+        for func_name, args, kwargs in records:
+            if func_name not in ops or kwargs:
+                coalesced.append((func_name, args, kwargs))
+                continue
+            
+            bulk_name, get_items = ops[func_name]
+            if coalesced and coalesced[-1][0] == bulk_name and coalesced[-1][2] is None:
+                items = coalesced[-1][1][0]
+                if isinstance(items, dict):
+                    items.update(get_items(args))
+                else:
+                    items.extend(get_items(args))
+            else:
+                # Bulk records open for merging are marked with `None` kwargs.
+                items = dict(get_items(args)) if isinstance(self.data, dict) else list(get_items(args))
+                coalesced.append((bulk_name, (items,), None))
+        
+        return [(func_name, args, kwargs or {}) for func_name, args, kwargs in coalesced]
+    
+    def _replay(self, func_name, args, kwargs):
+        """Apply a single op-log record to local data."""
+        
+        if func_name == batch_record:
+            for record in args[0]:
+                self._replay(*record)
+        elif func_name == permute_record:
+            self._permute(memoryview(args[0]).cast('I'))
+        else:
+            self.data.__getattribute__(func_name)(*args, **kwargs)
+    
+    def _permute(self, order):
+        """Reorder list items, item `i` of the new order is the item at index `order[i]`."""
+        
+        data = self.data
+        data[:] = [data[i] for i in order]
+    
+    def _to_plain(self, data):
+        """Convert data to built-in type for plain codecs."""
+        
+        if isinstance(data, dict):
+            return data if type(data) is dict else dict(data)
+        if isinstance(data, set):
+            return data
+        return data if type(data) is list else list(data)
+    
+    def _from_plain(self, plain):
+        """Restore data of the object type from built-in type loaded by plain codecs."""
+        
+        data = self._obj_type()
+        if type(data) is type(plain):
+            return plain
+        if isinstance(data, (list, deque)):
+            data.extend(plain)
+        else:
+            data.update(plain)
+        return data
+    
+    def _share_item(self, item):
+        """Replace nested container `item` with a nested shared object."""
+        
+        if self._is_nested and isinstance(item, data_types):
+            item = SharedObject(
+                obj = item,
+                create = True,
+                size = nested_size,
+                is_nested = True,
+                max_size = self._max_size,
+                min_dump_interval = self._min_dump_interval,
+                arena = self._arena,
+                shm_register = self._shm_register
+            )
+            handles[item.name] = item
+        return item
+    
+    def _share_items(self, other):
+        """Materialize bulk argument `other`, replacing nested containers with nested shared objects."""
+        
+        if isinstance(self.data, dict):
+            other = dict(other)
+            if self._is_nested:
+                other = {key: self._share_item(item) for key, item in other.items()}
+            return other
+        if self._is_nested:
+            return [self._share_item(item) for item in other]
+        return list(other)
+    
+    def refresh(self):
+        """Apply changes to object from shared memory regardless of the sync mode."""
+        
+        self.apply_changes()
+        if self._sync == 'interval':
+            self._next_sync = time.perf_counter_ns() + self._sync_interval * 1000
+    
     def apply_changes(self):
-        """Apply changes to object from shared memory stream."""
-
-        if self._full_dump_counter < int.from_bytes(self._full_dump_counter_remote, 'little'):
-            self._load_full_object(force = True)
+        """Apply changes to object from shared memory stream.
+        
+        The stream position is the version of the object: every change moves it,
+        so a reader which is up to date returns after a single comparison.
+        Readers never take the writer lock: records are decoded up to the published
+        stream position and stop at the first record without a valid commit marker.
+        Writers move the head before overwriting records, so decoded records are
+        discarded if the head passed them meanwhile and the full dump is loaded instead.
+        """
 
-        if self._update_stream_position < int.from_bytes(self._update_stream_position_remote, 'little'):
+        while True:
+            end_position = self._update_stream_position_remote[0]
+            if self._update_stream_position >= end_position:
+                return
+            
+            if self._update_stream_position < self._update_stream_head_remote[0]:
+                self._load_full_object(force = True)
+                continue
+            
+            if self._buffer_generation != self._buffer_generation_remote[0]:
+                self._remap_buffer()
+            
+            try:
+                records, pos = self._read_records(self._update_stream_position, end_position)
+            except Exception:
+                if self._update_stream_position >= self._update_stream_head_remote[0]:
+                    raise
+                continue
+            
+            if self._update_stream_position < self._update_stream_head_remote[0]:
+                continue
             
-            pos = self._update_stream_position
-            while pos < int.from_bytes(self._update_stream_position_remote, 'little'):
-                length = int.from_bytes(bytes(self._buffer.buf[pos:pos+4]), 'little')
-                pos += 4
-                func_name, args, kwargs = self._serializer.loads(bytes(self._buffer.buf[pos:pos+length]))
-                self.data.__getattribute__(func_name)(*args, **kwargs)
-                pos += length
-                self._update_stream_position = pos
+            start = time.perf_counter_ns()
+            if self._pin is not None and records:
+                self._unpin_data()
+            for func_name, args, kwargs in records:
+                self._replay(func_name, args, kwargs)
+            self._update_stream_position = pos
+            
+            elapsed = time.perf_counter_ns() - start
+            self._records_replayed += len(records)
+            self._replay_ns += elapsed
+            if metrics_hook is not None:
+                metrics_hook(self.name, 'replay', {'records': len(records), 'ns': elapsed})
+            return
+    
+    def _read_records(self, pos, end_position, decode = True):
+        """Decode committed op-log records between stream positions `pos` and `end_position`,
+        or copy their payloads without `decode`."""
+        
+        records = []
+        while pos < end_position:
+            offset = pos % self.size
+            if offset + record_header.size > self.size:
+                pos += self.size - offset
+                continue
+            
+            length, marker = record_header.unpack_from(self._buffer.buf, offset)
+            if length == wrap_record:
+                if marker != commit_marker(b'', pos):
+                    break
+                pos += self.size - offset
+                continue
+            
+            payload = self._buffer.buf[offset+record_header.size:offset+record_header.size+length]
+            if len(payload) != length or marker != commit_marker(payload, pos):
+                break
+            records.append(decode_record(self._serializer, payload) if decode else bytes(payload))
+            pos += record_header.size + length
+        return records, pos
+    
+    def _next_record_position(self, pos):
+        """Stream position of the record following the one at `pos`."""
+        
+        offset = pos % self.size
+        if offset + record_header.size > self.size:
+            return pos + self.size - offset
+        length, _ = record_header.unpack_from(self._buffer.buf, offset)
+        if length == wrap_record:
+            return pos + self.size - offset
+        return pos + record_header.size + length
     
     def _load_full_object(self, force = False):
         """Load full dump of data from shared memory."""
         
-        full_dump_counter = int.from_bytes(self._full_dump_counter_remote, 'little')
+        full_dump_counter = self._full_dump_counter_remote[0]
+        
+        if not (force or (self._full_dump_counter < full_dump_counter)):
+            raise Exception("Cannot load full dump, no new data available")
         
-        if force or (self._full_dump_counter < full_dump_counter):
+        start = time.perf_counter_ns()
+        while True:
+            sequence = self._sequence_remote[0]
+            if sequence % 2:
+                time.sleep(0)
+                continue
+            
             name = bytes(self._full_dump_memory_name_remote).decode('utf-8').strip().strip('\x00')
-            full_dump_memory = SharedMemory(create = False, name = name)
-
-            length = int.from_bytes(bytes(full_dump_memory.buf[:4]), 'little')
-            self.data = self._serializer.loads(bytes(full_dump_memory.buf[4:4+length]))
+            full_dump_counter = self._full_dump_counter_remote[0]
+            full_dump_position = self._full_dump_position_remote[0]
+            incarnation = self._full_dump_incarnation_remote[0]
+            
+            if sequence != self._sequence_remote[0]:
+                continue
+            
+            try:
+                if incarnation:
+                    full_dump_memory = self._open_full_dump_memory(name, incarnation)
+                else:
+                    full_dump_memory = SharedMemory(create = False, name = name)
+            except FileNotFoundError:
+                # Already replaced and unlinked by the next dump.
+                continue
+            
+            try:
+                data, buffers_number = self._read_full_dump(full_dump_memory)
+            except Exception:
+                if sequence == self._sequence_remote[0]:
+                    raise
+                data = None
+            
+            # The segment may have been reused by the next dump while it was read.
+            if sequence != self._sequence_remote[0]:
+                del data
+                if not incarnation:
+                    self._retire_full_dump_memory(full_dump_memory)
+                continue
+            
+            self.data = data
+            self._pin = None
             self._full_dump_counter = full_dump_counter
-            self._update_stream_position = 0
-
-            full_dump_memory.close()
+            self._update_stream_position = full_dump_position
+            
+            self._close_full_dump_memory()
+            if buffers_number:
+                self._full_dump_memory = full_dump_memory
+            elif not incarnation:
+                full_dump_memory.close()
+            
+            elapsed = time.perf_counter_ns() - start
+            self._full_loads += 1
+            self._full_load_ns += elapsed
+            if metrics_hook is not None:
+                metrics_hook(self.name, 'full_load', {'ns': elapsed})
+            return
+    
+    def _read_full_dump(self, full_dump_memory):
+        """Deserialize data from full dump segment."""
+        
+        length, buffers_number = full_dump_header.unpack_from(full_dump_memory.buf)
+        pos = full_dump_header.size + length
+        if buffers_number:
+            # Out-of-band buffers are referenced in place, the mapping stays open
+            # until the loaded data does not use it anymore.
+            buffers = []
+            for _ in range(buffers_number):
+                pos += -pos % buffer_alignment
+                buffer_length, = buffer_header.unpack_from(full_dump_memory.buf, pos)
+                pos += buffer_header.size
+                buffers.append(full_dump_memory.buf[pos:pos+buffer_length].toreadonly())
+                pos += buffer_length
+            data = self._serializer.loads(full_dump_memory.buf[full_dump_header.size:full_dump_header.size+length],
+                                          buffers = buffers)
         else:
-            raise Exception("Cannot load full dump, no new data available")
+            data = self._serializer.loads(full_dump_memory.buf[full_dump_header.size:full_dump_header.size+length])
+            if self._serializer.plain:
+                data = self._from_plain(data)
+        return data, buffers_number
+    
+    def _open_full_dump_memory(self, name, incarnation):
+        """Mapping of reused full dump segment `name`, kept open until the segment is recreated."""
+        
+        if name in self._full_dump_segments:
+            cached_incarnation, full_dump_memory = self._full_dump_segments[name]
+            if cached_incarnation == incarnation:
+                return full_dump_memory
+            del self._full_dump_segments[name]
+            self._retire_full_dump_memory(full_dump_memory)
+        
+        full_dump_memory = SharedMemory(create = False, name = name)
+        self._full_dump_segments[name] = (incarnation, full_dump_memory)
+        return full_dump_memory
+    
+    def _full_dump_slot_memory(self, slot, size):
+        """Segment of full dump slot with at least `size` bytes, grown geometrically when recreated."""
+        
+        name = self._dump_slot_name(slot)
+        incarnation = self._full_dump_slots_remote[slot]
+        if incarnation:
+            full_dump_memory = self._open_full_dump_memory(name, incarnation)
+            if full_dump_memory.size >= size:
+                return full_dump_memory, incarnation
+            size = max(size, 2 * full_dump_memory.size)
+            del self._full_dump_segments[name]
+            self._retire_full_dump_memory(full_dump_memory)
+            self.unlink_shm_by_name(name)
+        
+        
+        incarnation = self._full_dump_counter_remote[0] + 1
+        full_dump_memory = SharedMemory(create = True, name = name, size = size)
+        if not self._full_dump_slots_remote[slot]:
+            self._record_segment(full_dump_memory)
+        self._full_dump_segments[name] = (incarnation, full_dump_memory)
+        self._full_dump_slots_remote[slot] = incarnation
+        return full_dump_memory, incarnation
+    
+    def _record_segment(self, shm):
+        """Record the segment of a nested object in the manifest for teardown, arena blocks go with the arenas."""
+        
+        if self._shm_register is not None and isinstance(shm, SharedMemory):
+            self._shm_register.add(shm.name)
+    
+    def _retire_full_dump_memory(self, full_dump_memory):
+        self._retired_full_dump_memory.append(full_dump_memory)
+        self._close_full_dump_memory()
+    
+    def _close_full_dump_memory(self):
+        """Close the mappings of previous full dumps which are not used by the data anymore."""
+        
+        if self._full_dump_memory is not None:
+            self._retired_full_dump_memory.append(self._full_dump_memory)
+            self._full_dump_memory = None
+        
+        retired_full_dump_memory = []
+        for full_dump_memory in self._retired_full_dump_memory:
+            try:
+                full_dump_memory.close()
+            except BufferError:
+                retired_full_dump_memory.append(full_dump_memory)
+        self._retired_full_dump_memory = retired_full_dump_memory
     
     def _write_changes(self, func_name, *args, **kwargs):
         """Write applied changes to data to shared memory."""
         
-        marshalled = self._serializer.dumps((func_name, args, kwargs))
-        length = len(marshalled)
-
-        start_position = int.from_bytes(self._update_stream_position_remote, 'little')
-        end_position = start_position + 4 + length
-        
-        if end_position > self.size:
-            self.dump_full_object()
+        if self._batch is not None:
+            self._batch.append((func_name, args, kwargs))
             return
+        
+        with self._lock:
+            if self._buffer_generation != self._buffer_generation_remote[0]:
+                self._remap_buffer()
+            
+            marshalled = encode_record(self._serializer, func_name, args, kwargs)
+            length = len(marshalled)
+            if self._journal is None and self._journal_path_length_remote[0]:
+                self._open_journal()
+            if self._journal is not None:
+                os.write(self._journal, record_header.pack(length, commit_marker(marshalled, 0)) + marshalled)
+                self._journal_size_remote[0] = os.lseek(self._journal, 0, os.SEEK_CUR)
 
-        marshalled = length.to_bytes(4, 'little') + marshalled
-
-        self._buffer.buf[start_position:end_position] = marshalled
+            start_position = self._update_stream_position_remote[0]
+            offset = start_position % self.size
+            padding = self.size - offset if offset + record_header.size + length > self.size else 0
+            end_position = start_position + padding + record_header.size + length
+            
+            head = self._update_stream_head_remote[0]
+            oversized = end_position - start_position > self.size
+            pressure = oversized or (end_position - head > self.size and
+                                     end_position - self.size > self._full_dump_position_remote[0])
+            
+            if oversized or (pressure and self._grow_size() > self.size):
+                # The record is skipped over in the stream, so every reader loads
+                # the full dump which already holds the change.
+                self.dump_full_object(end_position)
+                if not oversized or self._grow_size() > self.size:
+                    self._grow_buffer(self._grow_size())
+                self._last_pressure_dump = time.perf_counter_ns()
+                self._set_update_stream_head(end_position)
+                self._set_update_stream_position(end_position)
+                self._count_write(0)
+                return
+            
+            if end_position - head > self.size:
+                # The oldest records are overwritten, they have to stay available
+                # up to the full dump for the readers which are behind.
+                if pressure:
+                    self.dump_full_object(end_position)
+                    self._last_pressure_dump = time.perf_counter_ns()
+                while end_position - head > self.size:
+                    head = self._next_record_position(head)
+                self._set_update_stream_head(head)
+            
+            if padding >= record_header.size:
+                record_header.pack_into(self._buffer.buf, offset, wrap_record, commit_marker(b'', start_position))
+            
+            # The payload goes first and the header with the commit marker last,
+            # the record becomes visible to readers only when the position is bumped.
+            offset = (start_position + padding) % self.size
+            self._buffer.buf[offset+record_header.size:offset+record_header.size+length] = marshalled
+            record_header.pack_into(self._buffer.buf, offset, length, commit_marker(marshalled, start_position + padding))
 
-        self._update_stream_position = end_position
-        self._update_stream_position_remote[:] = end_position.to_bytes(4, 'little')
+            self._set_update_stream_position(end_position)
+            self._count_write(end_position - start_position)
+            
+            full_dump_ops = self._full_dump_ops_remote[0] + 1
+            self._full_dump_ops_remote[0] = full_dump_ops
+            
+            full_dump_position = self._full_dump_position_remote[0]
+            if (self._snapshot_ops is not None and full_dump_ops >= self._snapshot_ops) or \
+               (self._snapshot_bytes is not None and end_position - full_dump_position >= self._snapshot_bytes):
+                if end_position > full_dump_position:
+                    self.dump_full_object()
     
-    def dump_full_object(self):
-        """Dump full data to shared memory."""
+    def _count_write(self, nbytes):
+        """Count an op written with `nbytes` of the op-log, under the lock."""
         
-        self.apply_changes()
+        self._stats_remote[0] += 1
+        self._stats_remote[1] += nbytes
+        if metrics_hook is not None:
+            metrics_hook(self.name, 'write', {'ops': 1, 'bytes': nbytes})
+    
+    def _grow_size(self):
+        """Size of the op-log when the ring fills up too often, the current size otherwise."""
         
-        prev_dump_name = bytes(self._full_dump_memory_name_remote).decode('utf-8').strip().strip('\x00')
+        if time.perf_counter_ns() - self._last_pressure_dump < self._min_dump_interval * 1000:
+            return max(self.size, min(2 * self.size, self._max_size))
+        return self.size
+    
+    def _grow_buffer(self, size):
+        """Move the op-log to a buffer of the next generation with `size` bytes.
+        
+        Must be called right after a full dump at the end of the stream: the new 
+        buffer starts empty and readers which are behind load the full dump.
+        """
         
-        marshalled = self._serializer.dumps(self.data)
-        length = len(marshalled)
+        generation = self._buffer_generation + 1
+        buffer = self._open_buffer(True, generation, size)
+        self._record_segment(buffer)
+        self._buffer_size_remote[0] = buffer.size
+        self._buffer_generation_remote[0] = generation
+        self._buffer.unlink()
+        self._buffer.close()
+        self._buffer, self._buffer_generation, self.size = buffer, generation, buffer.size
+    
+    def _remap_buffer(self):
+        """Open the op-log buffer of the current generation."""
+        
+        generation = self._buffer_generation_remote[0]
+        try:
+            buffer = self._open_buffer(False, generation)
+        except FileNotFoundError:
+            # Replaced by the next generation meanwhile.
+            return
+        self._buffer.close()
+        self._buffer, self._buffer_generation, self.size = buffer, generation, buffer.size
+    
+    def _open_buffer(self, create, generation, size = 0):
+        """Op-log buffer of `generation`: a block of the arena for nested objects in arena mode
+        if it fits into an arena, a segment otherwise."""
+        
+        if self._in_arena:
+            if create:
+                block = self._arena.allocate(size)
+                self._buffer_address_remote[0] = 0 if block is None else block.address
+                if block is not None:
+                    return block
+            elif self._buffer_address_remote[0]:
+                return self._arena.block_at(self._buffer_address_remote[0])
+        return SharedMemory(create = create, name = self._buffer_name(generation), size = size)
+    
+    def _buffer_name(self, generation):
+        if self._in_arena:
+            return f'{self.name}m{generation}'
+        return f'{self.name}_memory{generation}' if generation else f'{self.name}_memory'
+    
+    def _dump_slot_name(self, slot):
+        return f'{self.name}d{slot}' if self._in_arena else f'{self.name}_dump{slot}'
+    
+    def _set_update_stream_position(self, position):
+        self._update_stream_position = position
+        self._update_stream_position_remote[0] = position
+        self._notify_waiters()
+    
+    def _set_update_stream_head(self, position):
+        self._update_stream_head_remote[0] = position
+    
+    def dump_full_object(self, position = None):
+        """Dump full data to shared memory.
+        
+        The dump holds the state of the object at stream `position`, the current 
+        stream position by default.
+        """
+        
+        with self._lock:
+            self.apply_changes()
+            
+            if position is None:
+                position = self._update_stream_position
+            
+            start = time.perf_counter_ns()
+            buffers = []
+            if self._out_of_band:
+                marshalled = self._serializer.dumps(self.data, protocol = 5, buffer_callback = buffers.append)
+                buffers = [buffer.raw() for buffer in buffers]
+            elif self._serializer.plain:
+                marshalled = self._serializer.dumps(self._to_plain(self.data))
+            else:
+                marshalled = self._serializer.dumps(self.data)
+            length = len(marshalled)
+            
+            size = full_dump_header.size + length
+            for buffer in buffers:
+                size += -size % buffer_alignment + buffer_header.size + buffer.nbytes
 
-        full_dump_memory = SharedMemory(create = True, size = length + 4)
+            if buffers:
+                # Readers reference out-of-band buffers in place, so they get a fresh segment.
+                full_dump_memory, incarnation = SharedMemory(create = True, size = size), 0
+            else:
+                full_dump_memory, incarnation = self._full_dump_slot_memory((self._full_dump_counter_remote[0] + 1) % 2, size)
 
-        if length + 4 > full_dump_memory.size:
-            raise
+            full_dump_header.pack_into(full_dump_memory.buf, 0, length, len(buffers))
+            pos = full_dump_header.size
+            full_dump_memory.buf[pos:pos+length] = marshalled
+            pos += length
+            for buffer in buffers:
+                pos += -pos % buffer_alignment
+                buffer_header.pack_into(full_dump_memory.buf, pos, buffer.nbytes)
+                pos += buffer_header.size
+                full_dump_memory.buf[pos:pos+buffer.nbytes] = buffer
+                pos += buffer.nbytes
+            del buffers
 
-        full_dump_memory.buf[:4] = length.to_bytes(4, 'little')
-        full_dump_memory.buf[4:4+length] = marshalled
+            if not incarnation:
+                full_dump_memory.close()
+            self._publish_full_dump(full_dump_memory, incarnation, position)
+            
+            elapsed = time.perf_counter_ns() - start
+            self._stats_remote[2] += 1
+            self._stats_remote[3] += size
+            self._stats_remote[4] += elapsed
+            if metrics_hook is not None:
+                metrics_hook(self.name, 'full_dump', {'bytes': size, 'ns': elapsed})
 
-        full_dump_memory.close()
+            return full_dump_memory
+    
+    def _publish_full_dump(self, full_dump_memory, incarnation, position):
+        """Make written full dump segment the full dump of the object at stream `position`, under the lock."""
+        
+        prev_dump_name = bytes(self._full_dump_memory_name_remote).decode('utf-8').strip().strip('\x00')
+        
+        # Seqlock: an odd sequence tells readers that the dump is being published.
+        sequence = self._sequence_remote[0]
+        sequence += 1 + sequence % 2
+        self._sequence_remote[0] = sequence
 
-        self._full_dump_memory_name_remote[:] = full_dump_memory.name.encode('utf-8').ljust(255)
+        self._full_dump_memory_name_remote[:] = full_dump_memory.name.encode('utf-8').ljust(len(self._full_dump_memory_name_remote))
+        self._full_dump_incarnation_remote[0] = incarnation
+        self._full_dump_position_remote[0] = position
+        self._full_dump_ops_remote[0] = 0
 
         self._full_dump_counter += 1
-        current = int.from_bytes(self._full_dump_counter_remote, 'little')
-        self._full_dump_counter_remote[:] = int(current + 1).to_bytes(4, 'little')
-
-        self._update_stream_position = 0
-        self._update_stream_position_remote[:] = b'\x00\x00\x00\x00'
+        self._full_dump_counter_remote[0] += 1
+        
+        self._sequence_remote[0] = sequence + 1
 
-        if prev_dump_name and prev_dump_name != full_dump_memory.name:
+        if prev_dump_name and prev_dump_name not in (full_dump_memory.name, self._dump_slot_name(0), self._dump_slot_name(1)):
             self.unlink_shm_by_name(prev_dump_name)
-
-        self._full_dump_memory = full_dump_memory
-
-        return full_dump_memory
     
     def close(self):
         """Close all the instances of shared memory."""
         
         if self.closed == True:
             return True
-        self._close_all_shm_objects()
+        if '_lazy_init' not in self.__dict__:
+            self._close_all_shm_objects()
         self.closed = True
         return True
     
+    def _is_unlinked(self):
+        """Whether the object was unlinked by any process, False for handles which are not attached yet."""
+        
+        if self.closed or '_lazy_init' in self.__dict__:
+            return False
+        return bool(self._unlinked_remote[0])
+    
+    def _detach(self):
+        """Close the shared memory of the handle, it attaches again on next access."""
+        
+        if self.closed or '_lazy_init' in self.__dict__:
+            return
+        lazy_init = dict(name = self.name, shm_register = self._shm_register, sync = self._sync, sync_interval = self._sync_interval,
+                         max_size = self._max_size, min_dump_interval = self._min_dump_interval)
+        self.close()
+        self.__dict__.clear()
+        self.__init__(lazy = True, **lazy_init)
+    
     def _close_all_shm_objects(self):
         """Close all the instances of shared memory."""
         
+        self._unregister_waiter()
+        self._close_waiter_fds()
+        if self._journal is not None:
+            os.close(self._journal)
+            self._journal = None
         self._del_remotes()
-        gc.collect()
-        if self._full_dump_memory:
-            self._full_dump_memory.close()
-        self._control.close()
+        if not self._in_arena:
+            self._lock.close()
+        try:
+            self._control.close()
+        except BufferError:
+            # Views of the control segment are kept alive by reference cycles.
+            gc.collect()
+            self._control.close()
         self._buffer.close()
         if len(self.data) > 0 and self._is_nested:
             if isinstance(self.data, (list, deque)):
                 for item in self.data:
                     if isinstance(item, SharedObject):
-                        item.close()
+                        item._detach()
             else:
                 for item in self.data.values():
                     if isinstance(item, SharedObject):
-                        item.close()
+                        item._detach()
+        
+        if self._full_dump_memory is not None:
+            # The data references out-of-band buffers of the full dump.
+            self.data = self._obj_type()
+        for _, full_dump_memory in self._full_dump_segments.values():
+            self._retired_full_dump_memory.append(full_dump_memory)
+        self._full_dump_segments = {}
+        self._close_full_dump_memory()
     
     def _del_remotes(self):
         """Delete all the saved parts of control shared memory."""
         
         del self._update_stream_position_remote
+        del self._update_stream_head_remote
+        del self._full_dump_position_remote
+        del self._full_dump_ops_remote
+        del self._buffer_size_remote
         del self._full_dump_counter_remote
         del self._is_nested_remote
+        del self._waiters_count_remote
+        del self._waiters_remote
+        del self._codec_remote
+        del self._max_size_remote
+        del self._min_dump_interval_remote
+        del self._journal_size_remote
+        del self._journal_path_length_remote
         del self._full_dump_memory_name_remote
+        del self._full_dump_incarnation_remote
+        del self._full_dump_slots_remote
+        del self._buffer_generation_remote
+        del self._buffer_address_remote
+        del self._stats_remote
+        del self._object_id_remote
+        del self._arena_remote
+        del self._unlinked_remote
+        del self._sequence_remote
         del self._obj_type_remote
     
     def unlink(self):
@@ -511,27 +2239,28 @@ class SharedObject:
         return True
     
     def _unlink_all_shm_objects(self):
-        """Unlink all the instances of shared memory."""
+        """Unlink all the instances of shared memory.
         
-        self._unlink_shm_object_by_name(self.name, self._shm_register)
-        if self._is_nested:
-            if self._shm_register is not None:
-                if len(self._shm_register) > 0:
-                    for name in self._shm_register.data:
-                        self._unlink_shm_object_by_name(name, self._shm_register)
-                self._shm_register.close()
-                self._unlink_shm_object_by_name(f'{self.name}_register')
-    
-    def _unlink_shm_object_by_name(self, name, shm_register = None):
-        """Unlink all the instances of shared memory related to particular object."""
-        
-        shm_object = SharedObject(create = False, name = name, shm_register = shm_register)
-        shm_object._control.unlink()
-        shm_object._buffer.unlink()
-        if int.from_bytes(shm_object._full_dump_counter_remote, 'little') > 0:
-            name = bytes(shm_object._full_dump_memory_name_remote).decode('utf-8').strip().strip('\x00')
-            SharedObject.unlink_shm_by_name(name)
-        shm_object.close()
+        Nested objects are unlinked with all the other objects of the root object by the 
+        names in the manifest, without attaching them.
+        """
+        
+        self._unlinked_remote[0] = 1
+        names = [self._dump_slot_name(0), self._dump_slot_name(1)]
+        if self._full_dump_counter_remote[0] > 0:
+            names.append(bytes(self._full_dump_memory_name_remote).decode('utf-8').strip().strip('\x00'))
+        for shm in (self._buffer, self._control):
+            if isinstance(shm, ArenaBlock):
+                shm.unlink()
+            else:
+                names.append(shm.name)
+        
+        if self._shm_register is not None:
+            names.extend(self._shm_register.names())
+            self._shm_register.unlink()
+        unlink_segments(names)
+        if self._arena is not None:
+            self._arena.unlink()
         
     @staticmethod
     def unlink_shm_by_name(name):
@@ -0,0 +1,259 @@
+import os, struct, time
+from queue import Empty, Full
+from multiprocessing.shared_memory import SharedMemory
+
+from SharedObject import SharedLock, codecs, get_codec, commit_marker
+
+
+# Header: head and tail positions, number of slots, payload bytes of a slot and codec id.
+# The slots follow the header aligned to a cache line.
+slots_offset = 64
+# Slot: sequence number, payload length and commit marker of the payload which follows.
+slot_header = struct.Struct('<QII')
+# Longest sleep between polls of a blocked `put` or `get`.
+max_poll_interval = 0.001
+
+
+class SharedQueue:
+    """Multi-producer, multi-consumer FIFO queue in a ring of fixed-size slots in shared memory.
+
+    Unlike `popleft` of a deque SharedObject, which is replayed by every process, each
+    item is taken by exactly one consumer. Items are serialized by the codec and have to
+    fit into `item_size` bytes, the queue holds up to `maxsize` items.
+
+    Producers and consumers claim slots by moving the tail and the head under the lock
+    and copy payloads outside of it: the sequence number of a slot tells whether it is
+    free for the producer of position `pos` (`pos`) or holds its item (`pos + 1`).
+    Blocked calls poll the slots with a backoff of up to `max_poll_interval` seconds.
+    """
+
+    def __init__(self, obj = None, create = None, name = None, maxsize = 1024, item_size = 1024,
+                 serializer = 'pickle'):
+
+        self.closed = False
+        self.unlinked = False
+
+        if create:
+            self._slot_size = slot_header.size + item_size + -item_size % 8
+            self._shm = SharedMemory(create = True, name = name, size = slots_offset + maxsize * self._slot_size)
+        else:
+            self._shm = SharedMemory(create = False, name = name)
+        self.name = self._shm.name
+
+        self._head_remote       = self._shm.buf[ 0:  8].cast('Q')
+        self._tail_remote       = self._shm.buf[ 8: 16].cast('Q')
+        self._maxsize_remote    = self._shm.buf[16: 24].cast('Q')
+        self._item_size_remote  = self._shm.buf[24: 32].cast('Q')
+        self._codec_remote      = self._shm.buf[32: 33]
+
+        if create:
+            serializer = get_codec(serializer)
+            self._maxsize_remote[0] = maxsize
+            self._item_size_remote[0] = item_size
+            self._codec_remote[0] = serializer.codec_id
+        else:
+            if self._codec_remote[0] not in codecs:
+                raise Exception(f'Codec id {self._codec_remote[0]} is not registered in this process')
+            serializer = codecs[self._codec_remote[0]]
+        self._dumps = serializer.dumps
+        self._loads = serializer.loads
+
+        self.maxsize = self._maxsize_remote[0]
+        self.item_size = self._item_size_remote[0]
+        self._slot_size = slot_header.size + self.item_size + -self.item_size % 8
+        self._buf = self._shm.buf
+        # Sequence numbers of the slots, one word per slot size.
+        self._sequences = self._shm.buf[slots_offset:].cast('Q')
+        self._lock = SharedLock(self._shm)
+
+        if create:
+            for slot in range(self.maxsize):
+                self._sequences[slot * self._slot_size // 8] = slot
+            if obj is not None:
+                self.put_many(obj, block = False)
+
+    def __del__(self):
+        if not getattr(self, 'closed', True):
+            self.close()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(name={self.name!r}, qsize={self.qsize()}, maxsize={self.maxsize})'
+
+    def __len__(self):
+        return self.qsize()
+
+    def __reduce__(self):
+        return (self.__class__, (None, False, self.name))
+
+    def qsize(self):
+        """Number of items put and not taken yet, including the ones being copied."""
+
+        return self._tail_remote[0] - self._head_remote[0]
+
+    def empty(self):
+        return self.qsize() == 0
+
+    def full(self):
+        return self.qsize() >= self.maxsize
+
+    def put(self, item, block = True, timeout = None):
+        """Put `item` into the queue, waiting up to `timeout` seconds for a free slot if `block`.
+
+        Raises `queue.Full` if there is no free slot.
+        """
+
+        self.put_many([item], block, timeout)
+
+    def put_nowait(self, item):
+        self.put(item, block = False)
+
+    def put_many(self, items, block = True, timeout = None):
+        """Put `items` into the queue in order, each one into the next free slot.
+
+        Without `block` either all the items are put or `queue.Full` is raised. With `block`
+        the items are put as slots become free, the ones put before `timeout` passed stay
+        in the queue when `queue.Full` is raised.
+        """
+
+        payloads = [self._dumps(item) for item in items]
+        for payload in payloads:
+            if len(payload) > self.item_size:
+                raise Exception(f'Item of {len(payload)} bytes does not fit into a slot of {self.item_size} bytes, increase `item_size`')
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        attempt = 0
+        while payloads:
+            with self._lock:
+                position = self._tail_remote[0]
+                count = self._free_slots(position, len(payloads))
+                if count < len(payloads) and not block:
+                    count = 0
+                self._tail_remote[0] = position + count
+
+            for payload in payloads[:count]:
+                self._write_slot(position, payload)
+                position += 1
+            payloads = payloads[count:]
+
+            if payloads:
+                if not block:
+                    raise Full
+                attempt = 0 if count else attempt + 1
+                if not self._wait(attempt, deadline):
+                    raise Full
+
+    def get(self, block = True, timeout = None):
+        """Take the oldest item out of the queue, waiting up to `timeout` seconds for one if `block`.
+
+        Raises `queue.Empty` if there is no item.
+        """
+
+        return self.get_many(1, block, timeout)[0]
+
+    def get_nowait(self):
+        return self.get(block = False)
+
+    def get_many(self, max_items, block = True, timeout = None):
+        """Take up to `max_items` oldest items out of the queue, at least one.
+
+        With `block` waits up to `timeout` seconds for the first item, raises `queue.Empty`
+        if there is none.
+        """
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        attempt = 0
+        while True:
+            with self._lock:
+                position = self._head_remote[0]
+                count = self._ready_slots(position, max_items)
+                self._head_remote[0] = position + count
+
+            if count:
+                return [self._read_slot(position + i) for i in range(count)]
+            if not block:
+                raise Empty
+            attempt += 1
+            if not self._wait(attempt, deadline):
+                raise Empty
+
+    def _free_slots(self, position, max_items):
+        """Number of consecutive slots from `position` on which producers may claim, under the lock."""
+
+        count = 0
+        while count < max_items and self._sequence(position + count) == position + count:
+            count += 1
+        return count
+
+    def _ready_slots(self, position, max_items):
+        """Number of consecutive slots from `position` on holding published items, under the lock."""
+
+        count = 0
+        while count < max_items and self._sequence(position + count) == position + count + 1:
+            count += 1
+        return count
+
+    def _sequence(self, position):
+        return self._sequences[position % self.maxsize * self._slot_size // 8]
+
+    def _write_slot(self, position, payload):
+        """Copy `payload` into the slot claimed for `position` and publish it to consumers."""
+
+        offset = slots_offset + position % self.maxsize * self._slot_size
+        self._buf[offset+slot_header.size:offset+slot_header.size+len(payload)] = payload
+        struct.pack_into('<II', self._buf, offset + 8, len(payload), commit_marker(payload, position))
+        self._sequences[(offset - slots_offset) // 8] = position + 1
+
+    def _read_slot(self, position):
+        """Decode the item of the slot claimed for `position` and free the slot for producers."""
+
+        offset = slots_offset + position % self.maxsize * self._slot_size
+        while True:
+            _, length, marker = slot_header.unpack_from(self._buf, offset)
+            payload = bytes(self._buf[offset+slot_header.size:offset+slot_header.size+length])
+            # The payload may become visible after the sequence number on weakly ordered CPUs.
+            if marker == commit_marker(payload, position):
+                break
+            time.sleep(0)
+        self._sequences[(offset - slots_offset) // 8] = position + self.maxsize
+        return self._loads(payload)
+
+    @staticmethod
+    def _wait(attempt, deadline):
+        """Sleep before the next poll, returns False when `deadline` has passed."""
+
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        interval = 0 if attempt < 4 else min(1e-6 * 2 ** attempt, max_poll_interval)
+        if deadline is not None:
+            interval = min(interval, max(deadline - time.monotonic(), 0))
+        time.sleep(interval)
+        return True
+
+    # SHARED MEMORY METHODS #
+
+    def close(self):
+        """Close the shared memory."""
+
+        if self.closed == True:
+            return True
+        del self._buf
+        for remote in (self._head_remote, self._tail_remote, self._maxsize_remote,
+                       self._item_size_remote, self._codec_remote, self._sequences):
+            remote.release()
+        self._lock.close()
+        self._shm.close()
+        self.closed = True
+        return True
+
+    def unlink(self):
+        """Unlink the shared memory."""
+
+        if self.unlinked == True:
+            return True
+        self._shm.unlink()
+        try:
+            os.remove(SharedLock.lock_file_path(self.name))
+        except OSError:
+            pass
+        self.unlinked = True
+        return True
@@ -0,0 +1,56 @@
+"""Arena mode benchmark of nested SharedObject: creation time, shared memory segments, open file descriptors and /dev/shm usage per number of children.
+
+Run from the repository root:
+
+    PYTHONPATH=. python tests/benchmarks/bench_arena.py
+"""
+import argparse
+import os
+import time
+
+from SharedObject import SharedObject
+
+
+def shm_segments():
+    return set(os.listdir('/dev/shm')) if os.path.isdir('/dev/shm') else set()
+
+
+def shm_usage(names):
+    """Number and allocated bytes of shared memory segments `names`, Linux only."""
+    return len(names), sum(os.stat(os.path.join('/dev/shm', name)).st_blocks * 512 for name in names)
+
+
+def open_fds():
+    return len(os.listdir('/proc/self/fd')) if os.path.isdir('/proc/self/fd') else 0
+
+
+def run(arena, children):
+    name = f'bench_arena_{int(arena)}'
+    fds, segments = open_fds(), shm_segments()
+    start = time.perf_counter_ns()
+    sh_obj = SharedObject(obj = {f'k{i}': [i] for i in range(children)}, create = True, name = name,
+                          is_nested = True, arena = arena)
+    elapsed = time.perf_counter_ns() - start
+    segments, usage = shm_usage(shm_segments() - segments)
+    result = {'arena': arena, 'children': children, 'ms_create': elapsed / 1e6, 'segments': segments,
+              'fds': open_fds() - fds, 'shm_kb': usage / 1024}
+    
+    sh_obj.unlink()
+    sh_obj.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--children', type = int, nargs = '+', default = [1000])
+    args = parser.parse_args()
+    
+    for children in args.children:
+        for arena in (False, True):
+            result = run(arena, children)
+            print(f"arena={str(result['arena']):>5} {result['children']:>8} children: {result['ms_create']:10.1f} ms/create "
+                  f"{result['segments']:8} segments {result['fds']:8} fds {result['shm_kb']:10.1f} KB in /dev/shm")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Counter benchmark: increments per second of one key by N processes, by `incr` of SharedDict and SharedObject and by a read and a write of SharedObject.
+
+A read and a write is not atomic, `lost` is the number of increments lost by it.
+
+Run from the repository root:
+
+    PYTHONPATH=. python tests/benchmarks/bench_counters.py --processes 1 4
+"""
+import argparse
+import multiprocessing
+import time
+
+from SharedDict import SharedDict
+from SharedObject import SharedObject
+
+kinds = ('SharedDict', 'SharedObject', 'read_write')
+
+
+def attach(kind, name):
+    return SharedDict(create = False, name = name) if kind == 'SharedDict' else SharedObject(create = False, name = name)
+
+
+def increment(kind, name, ops, start_event):
+    counters = attach(kind, name)
+    counters['hits']
+    start_event.wait()
+    if kind == 'read_write':
+        for _ in range(ops):
+            counters['hits'] = counters['hits'] + 1
+    else:
+        for _ in range(ops):
+            counters.incr('hits')
+    counters.close()
+
+
+def run(kind, processes, ops):
+    name = f'bench_counters_{kind}'
+    if kind == 'SharedDict':
+        counters = SharedDict(obj = {'hits': 0}, create = True, name = name)
+    else:
+        counters = SharedObject(obj = {'hits': 0}, create = True, name = name, size = 1_000_000, is_nested = False)
+    start_event = multiprocessing.Event()
+    workers = [multiprocessing.Process(target = increment, args = (kind, name, ops, start_event)) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+
+    time.sleep(0.5)
+    start = time.perf_counter()
+    start_event.set()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    lost = processes * ops - counters['hits']
+    counters.unlink()
+    counters.close()
+    return {'kind': kind, 'processes': processes, 'ops': processes * ops, 'lost': lost,
+            'ops_per_second': processes * ops / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--processes', type = int, nargs = '+', default = [1, 4])
+    parser.add_argument('--ops', type = int, default = 5000, help = 'increments per process')
+    args = parser.parse_args()
+
+    for processes in args.processes:
+        for kind in kinds:
+            result = run(kind, processes, args.ops)
+            print(f"{result['kind']:>12} {result['processes']:>3} processes: {result['ops_per_second']:>10,.0f} ops/s, "
+                  f"{result['lost']} lost")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Full dump benchmark of SharedObject: latency of dumping and of loading the dump in an attached reader.
+
+Run from the repository root:
+
+    PYTHONPATH=. python tests/benchmarks/bench_full_dump.py
+"""
+import argparse
+import time
+
+from SharedObject import SharedObject
+
+
+def run(items, dumps):
+    name = f'bench_dump_{items}'
+    writer = SharedObject(obj = {key: str(key) for key in range(items)}, create = True, name = name,
+                          size = 1_000_000, is_nested = False)
+    reader = SharedObject(create = False, name = name)
+
+    dump_elapsed = load_elapsed = 0
+    for i in range(dumps):
+        writer[i % items] = str(i)
+        start = time.perf_counter_ns()
+        writer.dump_full_object()
+        dump_elapsed += time.perf_counter_ns() - start
+
+        start = time.perf_counter_ns()
+        reader._load_full_object()
+        load_elapsed += time.perf_counter_ns() - start
+
+    writer.unlink()
+    writer.close()
+    reader.close()
+    return {'items': items, 'dumps': dumps, 'us_per_dump': dump_elapsed / dumps / 1000,
+            'us_per_load': load_elapsed / dumps / 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--items', type = int, nargs = '+', default = [10, 1000, 100_000])
+    parser.add_argument('--dumps', type = int, default = 200)
+    args = parser.parse_args()
+
+    for items in args.items:
+        result = run(items, args.dumps)
+        print(f"{result['items']:>8} items: {result['us_per_dump']:10.1f} us/dump {result['us_per_load']:10.1f} us/load")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Attach benchmark of SharedObject: time to attach a dict of lists, nested or flat, in a fresh process and to read one child.
+
+Run from the repository root:
+
+    PYTHONPATH=. python tests/benchmarks/bench_nested_attach.py
+"""
+import argparse
+import multiprocessing
+import time
+
+from SharedObject import SharedObject
+
+
+def attach(name, queue):
+    start = time.perf_counter_ns()
+    sh_obj = SharedObject(create = False, name = name)
+    attached = time.perf_counter_ns()
+    sh_obj['k0'][0]
+    read = time.perf_counter_ns()
+    queue.put(((attached - start) / 1e6, (read - attached) / 1e6))
+    sh_obj.close()
+
+
+def run(children, nested = True):
+    name = f'bench_attach_{children}'
+    writer = SharedObject(obj = {f'k{i}': [i] for i in range(children)}, create = True, name = name,
+                          size = 10_000_000, is_nested = nested)
+    writer.dump_full_object()
+    
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target = attach, args = (name, queue))
+    process.start()
+    ms_attach, ms_first_read = queue.get()
+    process.join()
+    
+    writer.unlink()
+    writer.close()
+    return {'children': children, 'nested': nested, 'ms_attach': ms_attach, 'ms_first_read': ms_first_read}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--children', type = int, nargs = '+', default = [100, 1000])
+    parser.add_argument('--flat', action = 'store_true', help = 'children are plain lists')
+    args = parser.parse_args()
+    
+    for children in args.children:
+        result = run(children, nested = not args.flat)
+        print(f"{result['children']:>8} children: {result['ms_attach']:10.1f} ms/attach {result['ms_first_read']:10.3f} ms/first read")
+
+
+if __name__ == '__main__':
+    main()
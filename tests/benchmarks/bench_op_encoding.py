@@ -0,0 +1,59 @@
+"""Op-log bytes per op and write throughput of SharedObject for list, deque, dict and set workloads.
+
+Run from the repository root:
+
+    PYTHONPATH=. python tests/benchmarks/bench_op_encoding.py
+"""
+import argparse
+import time
+from collections import deque
+
+from SharedObject import SharedObject
+
+
+workloads = {
+    'list'  : ([],      lambda sh_obj, i: sh_obj.append(i)),
+    'deque' : (deque(), lambda sh_obj, i: sh_obj.popleft() if i % 2 else sh_obj.appendleft(i)),
+    'dict'  : ({},      lambda sh_obj, i: sh_obj.__setitem__(i, str(i))),
+    'set'   : (set(),   lambda sh_obj, i: sh_obj.add(f'key{i}')),
+}
+
+
+def run(workload, ops):
+    obj, op = workloads[workload]
+    sh_obj = SharedObject(obj = obj, create = True, name = f'bench_encoding_{workload}',
+                          size = 100 * ops, is_nested = False)
+    reader = SharedObject(create = False, name = f'bench_encoding_{workload}')
+    start_position = sh_obj._update_stream_position
+    
+    start = time.perf_counter()
+    for i in range(ops):
+        op(sh_obj, i)
+    elapsed = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    reader.apply_changes()
+    replay_elapsed = time.perf_counter() - start
+    
+    result = {'workload': workload, 'ops': ops, 'bytes_per_op': (sh_obj._update_stream_position - start_position) / ops,
+              'ops_per_second': ops / elapsed, 'replay_ops_per_second': ops / replay_elapsed}
+    reader.close()
+    sh_obj.unlink()
+    sh_obj.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--ops', type = int, default = 50_000)
+    parser.add_argument('--workloads', nargs = '+', default = list(workloads))
+    args = parser.parse_args()
+    
+    for workload in args.workloads:
+        result = run(workload, args.ops)
+        print(f"{result['workload']:>6}: {result['bytes_per_op']:6.1f} bytes/op, {result['ops_per_second']:>10,.0f} ops/s, "
+              f"{result['replay_ops_per_second']:>10,.0f} replayed ops/s")
+
+
+if __name__ == '__main__':
+    main()
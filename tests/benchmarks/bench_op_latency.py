@@ -0,0 +1,61 @@
+"""Single-op latency of the wrapped methods of SharedObject for list, deque, dict, set and OrderedDict.
+
+Run from the repository root:
+
+    PYTHONPATH=. python tests/benchmarks/bench_op_latency.py
+"""
+import argparse
+import time
+from collections import deque, OrderedDict
+
+from SharedObject import SharedObject
+
+
+# Method -> (initial object, op called with the object and the op number).
+# Ops which remove items are paired with ops which add them back, so the size stays constant.
+methods = {
+    'list.append'               : ([],                      lambda sh_obj, i: sh_obj.append(i)),
+    'list.__setitem__'          : ([0] * 100,               lambda sh_obj, i: sh_obj.__setitem__(i % 100, i)),
+    'list.insert/pop'           : ([0] * 100,               lambda sh_obj, i: sh_obj.pop() if i % 2 else sh_obj.insert(50, i)),
+    'list.extend'               : ([],                      lambda sh_obj, i: sh_obj.extend((i, i, i, i))),
+    'list.__getitem__'          : ([0] * 100,               lambda sh_obj, i: sh_obj[i % 100]),
+    'deque.appendleft/popleft'  : (deque(),                 lambda sh_obj, i: sh_obj.popleft() if i % 2 else sh_obj.appendleft(i)),
+    'deque.rotate'              : (deque(range(100)),       lambda sh_obj, i: sh_obj.rotate(1)),
+    'dict.__setitem__'          : ({},                      lambda sh_obj, i: sh_obj.__setitem__(i % 1000, i)),
+    'dict.update'               : ({},                      lambda sh_obj, i: sh_obj.update({i % 1000: i, -i % 1000: i})),
+    'dict.setdefault'           : ({},                      lambda sh_obj, i: sh_obj.setdefault(i % 1000, i)),
+    'dict.__getitem__'          : ({i: i for i in range(1000)}, lambda sh_obj, i: sh_obj[i % 1000]),
+    'set.add/discard'           : (set(),                   lambda sh_obj, i: sh_obj.discard(i - 1) if i % 2 else sh_obj.add(i)),
+    'set.__contains__'          : (set(range(1000)),        lambda sh_obj, i: i % 1000 in sh_obj),
+    'OrderedDict.move_to_end'   : (OrderedDict.fromkeys(range(100)), lambda sh_obj, i: sh_obj.move_to_end(i % 100)),
+}
+
+
+def run(method, ops):
+    obj, op = methods[method]
+    name = f'bench_latency_{list(methods).index(method)}'
+    sh_obj = SharedObject(obj = obj, create = True, name = name, size = 1_000_000, is_nested = False)
+
+    start = time.perf_counter_ns()
+    for i in range(ops):
+        op(sh_obj, i)
+    elapsed = time.perf_counter_ns() - start
+
+    sh_obj.unlink()
+    sh_obj.close()
+    return {'method': method, 'ops': ops, 'ns_per_op': elapsed / ops}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--ops', type = int, default = 20_000)
+    parser.add_argument('--methods', nargs = '+', default = list(methods))
+    args = parser.parse_args()
+
+    for method in args.methods:
+        result = run(method, args.ops)
+        print(f"{result['method']:>26}: {result['ns_per_op']:10.1f} ns/op")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Process pool benchmark: tasks per second when every task is passed a SharedObject dict as an argument.
+
+Run from the repository root:
+
+    PYTHONPATH=. python tests/benchmarks/bench_pool_tasks.py
+"""
+import argparse
+import multiprocessing
+import time
+
+from SharedObject import SharedObject
+
+
+def task(sh_obj, key):
+    return sh_obj[key]
+
+
+def run(keys, tasks, workers):
+    name = f'bench_pool_{keys}'
+    sh_obj = SharedObject(obj = {key: key for key in range(keys)}, create = True, name = name,
+                          size = 1_000_000, is_nested = False)
+    sh_obj.dump_full_object()
+
+    with multiprocessing.Pool(workers) as pool:
+        pool.starmap(task, [(sh_obj, 0)] * workers)
+        start = time.perf_counter()
+        results = pool.starmap(task, [(sh_obj, i % keys) for i in range(tasks)], chunksize = 1)
+        elapsed = time.perf_counter() - start
+    assert results == [i % keys for i in range(tasks)]
+
+    sh_obj.unlink()
+    sh_obj.close()
+    return {'keys': keys, 'tasks': tasks, 'workers': workers, 'tasks_per_second': tasks / elapsed,
+            'us_per_task': elapsed / tasks * 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--keys', type = int, nargs = '+', default = [100, 100_000])
+    parser.add_argument('--tasks', type = int, default = 2000)
+    parser.add_argument('--workers', type = int, default = 2)
+    args = parser.parse_args()
+
+    for keys in args.keys:
+        result = run(keys, args.tasks, args.workers)
+        print(f"{result['keys']:>8} keys: {result['tasks_per_second']:>10,.0f} tasks/s {result['us_per_task']:10.1f} us/task")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Read latency benchmark of SharedObject dict lookups for each sync mode.
+
+Run from the repository root:
+
+    PYTHONPATH=. python tests/benchmarks/bench_read_latency.py
+"""
+import argparse
+import time
+
+from SharedObject import SharedObject, sync_modes
+
+
+def run(sync, keys, reads, write_every):
+    name = f'bench_read_{sync}'
+    writer = SharedObject(obj = {key: key for key in range(keys)}, create = True, name = name,
+                          size = 1_000_000, is_nested = False)
+    reader = SharedObject(create = False, name = name, sync = sync, sync_interval = 100)
+    
+    start = time.perf_counter_ns()
+    for i in range(reads):
+        reader[i % keys]
+        if write_every and i % write_every == 0:
+            writer[i % keys] = i
+    elapsed = time.perf_counter_ns() - start
+    
+    writer.unlink()
+    writer.close()
+    reader.close()
+    return {'sync': sync, 'reads': reads, 'write_every': write_every, 'ns_per_read': elapsed / reads}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--keys', type = int, default = 1000)
+    parser.add_argument('--reads', type = int, default = 200_000)
+    parser.add_argument('--write-every', type = int, nargs = '+', default = [0, 100],
+                        help = 'a concurrent change every N reads, 0 for read-only')
+    args = parser.parse_args()
+    
+    data = {key: key for key in range(args.keys)}
+    start = time.perf_counter_ns()
+    for i in range(args.reads):
+        data[i % args.keys]
+    print(f'{"dict":>10}: {(time.perf_counter_ns() - start) / args.reads:8.1f} ns/read')
+    
+    for write_every in args.write_every:
+        for sync in sync_modes:
+            result = run(sync, args.keys, args.reads, write_every)
+            print(f"{result['sync']:>10}: {result['ns_per_read']:8.1f} ns/read (write every {write_every or '-'})")
+
+
+if __name__ == '__main__':
+    main()
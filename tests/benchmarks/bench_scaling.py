@@ -0,0 +1,93 @@
+"""Scaling benchmark of SharedObject: aggregate throughput of 1 to N reader processes with a concurrent writer, and of 1 to N writer processes.
+
+Run from the repository root:
+
+    PYTHONPATH=. python tests/benchmarks/bench_scaling.py --processes 1 2 4 8
+"""
+import argparse
+import multiprocessing
+import os
+import time
+
+from SharedObject import SharedObject
+from bench_write_contention import run as run_writers
+
+
+def reader(name, keys, reads, start_event, queue):
+    sh_obj = SharedObject(create = False, name = name)
+    start_event.wait()
+    start = time.perf_counter()
+    for i in range(reads):
+        sh_obj[i % keys]
+    queue.put(time.perf_counter() - start)
+    sh_obj.close()
+
+
+def writer(name, keys, start_event, stop_event, queue):
+    sh_obj = SharedObject(create = False, name = name)
+    start_event.wait()
+    writes = 0
+    while not stop_event.is_set():
+        sh_obj[writes % keys] = writes
+        writes += 1
+    queue.put(writes)
+    sh_obj.close()
+
+
+def run_readers(readers, keys, reads):
+    name = f'bench_scaling_readers_{readers}'
+    sh_obj = SharedObject(obj = {key: key for key in range(keys)}, create = True, name = name,
+                          size = 1_000_000, is_nested = False)
+    start_event, stop_event = multiprocessing.Event(), multiprocessing.Event()
+    queue, writer_queue = multiprocessing.Queue(), multiprocessing.Queue()
+    processes = [multiprocessing.Process(target = reader, args = (name, keys, reads, start_event, queue)) for _ in range(readers)]
+    writer_process = multiprocessing.Process(target = writer, args = (name, keys, start_event, stop_event, writer_queue))
+    for process in processes + [writer_process]:
+        process.start()
+
+    time.sleep(0.5)
+    start = time.perf_counter()
+    start_event.set()
+    elapsed = [queue.get() for _ in range(readers)]
+    wall = time.perf_counter() - start
+    stop_event.set()
+    writes = writer_queue.get()
+    for process in processes + [writer_process]:
+        process.join()
+
+    sh_obj.unlink()
+    sh_obj.close()
+    return {'processes': readers, 'ops': readers * reads, 'seconds': wall,
+            'ops_per_second': readers * reads / wall, 'ns_per_read': sum(elapsed) / (readers * reads) * 1e9,
+            'concurrent_writes': writes}
+
+
+def default_processes():
+    """Powers of two up to the number of cores, and the number of cores."""
+
+    cores = os.cpu_count() or 1
+    processes = [1]
+    while processes[-1] * 2 < cores:
+        processes.append(processes[-1] * 2)
+    return processes + [cores] if cores > 1 else processes
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--processes', type = int, nargs = '+', default = default_processes())
+    parser.add_argument('--keys', type = int, default = 1000)
+    parser.add_argument('--reads', type = int, default = 100_000, help = 'lookups per reader')
+    parser.add_argument('--ops', type = int, default = 2000, help = 'appends per writer')
+    args = parser.parse_args()
+
+    for processes in args.processes:
+        result = run_readers(processes, args.keys, args.reads)
+        print(f"{result['processes']:>4} readers: {result['ops_per_second']:>12,.0f} reads/s, "
+              f"{result['ns_per_read']:8.1f} ns/read, {result['concurrent_writes']:>8} concurrent writes")
+    for processes in args.processes:
+        result = run_writers(processes, args.ops, 1_000_000)
+        print(f"{result['writers']:>4} writers: {result['ops_per_second']:>12,.0f} ops/s")
+
+
+if __name__ == '__main__':
+    main()
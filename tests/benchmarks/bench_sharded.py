@@ -0,0 +1,74 @@
+"""Sharded dict benchmark: write throughput of 1 to N writer processes setting keys of a SharedObject dict and of a ShardedSharedDict.
+
+Every writer sets its own keys, so the writers of the sharded dict mostly take
+the locks of different shards while the ones of the SharedObject all take one lock.
+
+Run from the repository root:
+
+    PYTHONPATH=. python tests/benchmarks/bench_sharded.py --writers 1 2 4 8
+"""
+import argparse
+import multiprocessing
+import os
+import time
+
+from SharedObject import SharedObject
+from ShardedSharedObject import ShardedSharedDict
+from bench_scaling import default_processes
+
+
+def attach(kind, name):
+    return ShardedSharedDict(create = False, name = name) if kind == 'ShardedSharedDict' else SharedObject(create = False, name = name)
+
+
+def writer(kind, name, index, ops, start_event):
+    sh_dict = attach(kind, name)
+    start_event.wait()
+    for i in range(ops):
+        sh_dict[(index, i)] = i
+    sh_dict.close()
+
+
+def run(kind, writers, ops, shards = None):
+    name = f'bench_sharded_{kind}_{writers}'
+    if kind == 'ShardedSharedDict':
+        sh_dict = ShardedSharedDict(obj = {}, create = True, name = name, shards = shards, size = 1_000_000)
+    else:
+        sh_dict = SharedObject(obj = {}, create = True, name = name, size = 1_000_000, is_nested = False)
+    start_event = multiprocessing.Event()
+    processes = [multiprocessing.Process(target = writer, args = (kind, name, index, ops, start_event))
+                 for index in range(writers)]
+    for process in processes:
+        process.start()
+
+    time.sleep(0.5)
+    start = time.perf_counter()
+    start_event.set()
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+
+    total = len(sh_dict)
+    assert total == writers * ops, f'lost writes: {total} != {writers * ops}'
+    sh_dict.unlink()
+    sh_dict.close()
+    return {'kind': kind, 'writers': writers, 'ops': writers * ops, 'seconds': elapsed,
+            'ops_per_second': writers * ops / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--writers', type = int, nargs = '+', default = default_processes())
+    parser.add_argument('--ops', type = int, default = 2000, help = 'writes per writer')
+    parser.add_argument('--shards', type = int, help = f'shards of the sharded dict, {os.cpu_count()} by default')
+    args = parser.parse_args()
+
+    for writers in args.writers:
+        for kind in ('ShardedSharedDict', 'SharedObject'):
+            result = run(kind, writers, args.ops, args.shards)
+            print(f"{result['kind']:>17} {result['writers']:>3} writers: {result['ops']:>8} ops in "
+                  f"{result['seconds']:.3f}s, {result['ops_per_second']:>10,.0f} ops/s")
+
+
+if __name__ == '__main__':
+    main()
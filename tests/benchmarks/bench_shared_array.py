@@ -0,0 +1,55 @@
+"""SharedArray benchmark against a SharedObject list of equal length: element writes, reads seen by another process handle and slice reads.
+
+Run from the repository root:
+
+    PYTHONPATH=. python tests/benchmarks/bench_shared_array.py
+"""
+import argparse
+import time
+
+from SharedArray import SharedArray
+from SharedObject import SharedObject
+
+
+def run(kind, length, ops):
+    name = f'bench_array_{kind}'
+    if kind == 'SharedArray':
+        writer = SharedArray('d', length, create = True, name = name)
+        reader = SharedArray(create = False, name = name)
+    else:
+        writer = SharedObject(obj = [0.0] * length, create = True, name = name, size = 1_000_000, is_nested = False)
+        reader = SharedObject(create = False, name = name)
+
+    start = time.perf_counter_ns()
+    for i in range(ops):
+        writer[i % length] = float(i)
+        reader[i % length]
+    write_read = time.perf_counter_ns() - start
+
+    start = time.perf_counter_ns()
+    for i in range(ops // 100):
+        reader[:]
+    slice_read = time.perf_counter_ns() - start
+
+    writer.unlink()
+    writer.close()
+    reader.close()
+    return {'kind': kind, 'length': length, 'ns_per_write_read': write_read / ops,
+            'us_per_slice_read': slice_read / (ops // 100) / 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--length', type = int, nargs = '+', default = [1000, 100_000])
+    parser.add_argument('--ops', type = int, default = 20_000)
+    args = parser.parse_args()
+
+    for length in args.length:
+        for kind in ('SharedArray', 'SharedObject'):
+            result = run(kind, length, args.ops)
+            print(f"{result['kind']:>12} {result['length']:>8} items: {result['ns_per_write_read']:10.1f} ns/write+read "
+                  f"{result['us_per_slice_read']:10.1f} us/slice read")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Shared cache benchmark: lookups per second and hit ratio of N processes caching a skewed key set in SharedCache and in an LRU OrderedDict SharedObject.
+
+The OrderedDict SharedObject logs a `move_to_end` op on every hit and an insert and a
+`popitem` on every miss of a full cache, SharedCache only sets a reference bit on a hit.
+
+Run from the repository root:
+
+    PYTHONPATH=. python tests/benchmarks/bench_shared_cache.py --processes 1 4
+"""
+import argparse
+import multiprocessing
+import random
+import time
+from collections import OrderedDict
+
+from SharedCache import SharedCache
+from SharedObject import SharedObject
+
+kinds = ('SharedCache', 'SharedObject')
+
+
+def lookup(kind, name, keys, lookups, maxsize, seed, start_event, done):
+    rng = random.Random(seed)
+    # Zipf-like popularity: key k is looked up about 1 / (k + 1) times as often as key 0.
+    sequence = [min(int(keys ** rng.random()) - 1, keys - 1) for _ in range(lookups)]
+    if kind == 'SharedCache':
+        cache = SharedCache(create = False, name = name)
+    else:
+        cache = SharedObject(create = False, name = name)
+    start_event.wait()
+    hits = 0
+    for key in sequence:
+        if kind == 'SharedCache':
+            value = cache.get(key)
+            if value is None:
+                cache[key] = key
+            else:
+                hits += 1
+        elif key in cache:
+            cache.move_to_end(key)
+            hits += 1
+        else:
+            cache[key] = key
+            if len(cache) > maxsize:
+                cache.popitem(False)
+    done.put(hits)
+    cache.close()
+
+
+def run(kind, processes, keys, lookups, maxsize):
+    name = f'bench_cache_{kind}'
+    if kind == 'SharedCache':
+        cache = SharedCache(create = True, name = name, maxsize = maxsize, item_size = 64)
+    else:
+        cache = SharedObject(obj = OrderedDict(), create = True, name = name, size = 1_000_000, is_nested = False)
+    start_event, done = multiprocessing.Event(), multiprocessing.Queue()
+    workers = [multiprocessing.Process(target = lookup, args = (kind, name, keys, lookups, maxsize, seed, start_event, done))
+               for seed in range(processes)]
+    for worker in workers:
+        worker.start()
+
+    time.sleep(0.5)
+    start = time.perf_counter()
+    start_event.set()
+    hits = sum(done.get() for _ in workers)
+    elapsed = time.perf_counter() - start
+    for worker in workers:
+        worker.join()
+
+    cache.unlink()
+    cache.close()
+    return {'kind': kind, 'processes': processes, 'lookups': processes * lookups, 'hit_ratio': hits / (processes * lookups),
+            'lookups_per_second': processes * lookups / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--processes', type = int, nargs = '+', default = [1, 4])
+    parser.add_argument('--keys', type = int, default = 10_000)
+    parser.add_argument('--lookups', type = int, default = 20_000, help = 'lookups per process')
+    parser.add_argument('--maxsize', type = int, default = 1000)
+    args = parser.parse_args()
+
+    for processes in args.processes:
+        for kind in kinds:
+            result = run(kind, processes, args.keys, args.lookups, args.maxsize)
+            print(f"{result['kind']:>12} {result['processes']:>3} processes: {result['lookups_per_second']:>10,.0f} lookups/s, "
+                  f"hit ratio {result['hit_ratio']:.2f}")
+
+
+if __name__ == '__main__':
+    main()
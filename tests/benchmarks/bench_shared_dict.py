@@ -0,0 +1,58 @@
+"""SharedDict benchmark against a SharedObject dict: attach time, lookup latency and per-process memory.
+
+Run from the repository root:
+
+    PYTHONPATH=. python tests/benchmarks/bench_shared_dict.py
+"""
+import argparse
+import time
+import tracemalloc
+
+from SharedDict import SharedDict
+from SharedObject import SharedObject
+
+
+def run(kind, keys, reads):
+    name = f'bench_dict_{kind}'
+    obj = {f'key{key}': [key] * 10 for key in range(keys)}
+    if kind == 'SharedDict':
+        writer = SharedDict(obj = obj, create = True, name = name, size = 1_000_000)
+    else:
+        writer = SharedObject(obj = obj, create = True, name = name, size = 1_000_000, is_nested = False)
+        writer.dump_full_object()
+    del obj
+
+    tracemalloc.start()
+    start = time.perf_counter_ns()
+    reader = SharedDict(create = False, name = name) if kind == 'SharedDict' else SharedObject(create = False, name = name)
+    attach = time.perf_counter_ns() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter_ns()
+    for i in range(reads):
+        reader[f'key{i % keys}']
+    lookup = time.perf_counter_ns() - start
+
+    writer.unlink()
+    writer.close()
+    reader.close()
+    return {'kind': kind, 'keys': keys, 'ms_per_attach': attach / 1e6, 'ns_per_lookup': lookup / reads,
+            'attach_memory_kb': memory / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--keys', type = int, nargs = '+', default = [1000, 100_000])
+    parser.add_argument('--reads', type = int, default = 100_000)
+    args = parser.parse_args()
+
+    for keys in args.keys:
+        for kind in ('SharedDict', 'SharedObject'):
+            result = run(kind, keys, args.reads)
+            print(f"{result['kind']:>12} {result['keys']:>8} keys: {result['ms_per_attach']:10.2f} ms/attach "
+                  f"{result['ns_per_lookup']:10.1f} ns/lookup {result['attach_memory_kb']:10.1f} KB/process")
+
+
+if __name__ == '__main__':
+    main()
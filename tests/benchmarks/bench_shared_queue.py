@@ -0,0 +1,92 @@
+"""SharedQueue benchmark: items per second from producer processes to consumer processes, single and batched.
+
+A deque SharedObject is measured with one producer and one consumer only, with more
+consumers every one of them would take every item.
+
+Run from the repository root:
+
+    PYTHONPATH=. python tests/benchmarks/bench_shared_queue.py
+"""
+import argparse
+import multiprocessing
+import time
+from collections import deque
+
+from SharedObject import SharedObject
+from SharedQueue import SharedQueue
+
+
+def produce(kind, name, items, batch, start_event):
+    queue = SharedQueue(create = False, name = name) if kind == 'SharedQueue' else SharedObject(create = False, name = name)
+    start_event.wait()
+    for i in range(0, items, batch):
+        if kind == 'SharedQueue':
+            queue.put_many(range(i, min(i + batch, items)))
+        else:
+            queue.extend(range(i, min(i + batch, items)))
+    queue.close()
+
+
+def consume(kind, name, items, batch, done):
+    queue = SharedQueue(create = False, name = name) if kind == 'SharedQueue' else SharedObject(create = False, name = name)
+    taken = 0
+    while taken < items:
+        if kind == 'SharedQueue':
+            taken += len(queue.get_many(min(batch, items - taken), timeout = 10))
+        elif len(queue):
+            queue.popleft()
+            taken += 1
+    done.put(taken)
+    queue.close()
+
+
+def run(kind, producers, consumers, items, batch):
+    name = f'bench_queue_{kind}'
+    if kind == 'SharedQueue':
+        queue = SharedQueue(create = True, name = name, maxsize = 1024, item_size = 64)
+    else:
+        queue = SharedObject(obj = deque(), create = True, name = name, size = 1_000_000, is_nested = False)
+        consumers = 1
+
+    start_event, done = multiprocessing.Event(), multiprocessing.Queue()
+    per_producer, per_consumer = items // producers, items // consumers
+    processes = [multiprocessing.Process(target = produce, args = (kind, name, per_producer, batch, start_event))
+                 for _ in range(producers)]
+    processes += [multiprocessing.Process(target = consume, args = (kind, name, per_consumer, batch, done))
+                  for _ in range(consumers)]
+    for process in processes:
+        process.start()
+
+    time.sleep(0.5)
+    start = time.perf_counter()
+    start_event.set()
+    taken = sum(done.get() for _ in range(consumers))
+    elapsed = time.perf_counter() - start
+    for process in processes:
+        process.join()
+
+    queue.unlink()
+    queue.close()
+    return {'kind': kind, 'producers': producers, 'consumers': consumers, 'batch': batch, 'items': taken,
+            'items_per_second': taken / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--items', type = int, default = 20_000)
+    parser.add_argument('--processes', type = int, nargs = '+', default = [1, 2, 4], help = 'producers and consumers each')
+    parser.add_argument('--batch', type = int, nargs = '+', default = [1, 32])
+    args = parser.parse_args()
+
+    for batch in args.batch:
+        for processes in args.processes:
+            for kind in ('SharedQueue', 'SharedObject'):
+                if kind == 'SharedObject' and processes > 1:
+                    continue
+                result = run(kind, processes, processes, args.items, batch)
+                print(f"{result['kind']:>12} {result['producers']}x{result['consumers']} batch {result['batch']:>3}: "
+                      f"{result['items_per_second']:>12,.0f} items/s")
+
+
+if __name__ == '__main__':
+    main()
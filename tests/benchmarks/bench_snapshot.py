@@ -0,0 +1,57 @@
+"""Snapshot benchmark of SharedObject: time and extra memory of a full scan of a dict over `snapshot` and over `copy`, with and without writes during the scan.
+
+Run from the repository root:
+
+    PYTHONPATH=. python tests/benchmarks/bench_snapshot.py
+"""
+import argparse
+import time
+import tracemalloc
+
+from SharedObject import SharedObject
+
+
+def run(kind, keys, write_every):
+    name = f'bench_snapshot_{kind}'
+    writer = SharedObject(obj = {key: key for key in range(keys)}, create = True, name = name,
+                          size = 10_000_000, is_nested = False)
+    reader = SharedObject(create = False, name = name)
+    len(reader)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    view = reader.snapshot() if kind == 'snapshot' else reader.copy()
+    total = 0
+    for i, (key, value) in enumerate(view.items()):
+        total += value
+        if write_every and i % write_every == 0:
+            writer[key] = value
+            reader.get(key)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    del view
+    reader.close()
+    writer.unlink()
+    writer.close()
+    return {'kind': kind, 'keys': keys, 'write_every': write_every, 'ms_per_scan': elapsed * 1000, 'peak_kb': peak / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--keys', type = int, nargs = '+', default = [100_000])
+    parser.add_argument('--write-every', type = int, nargs = '+', default = [0, 1000],
+                        help = 'a change during the scan every N items, 0 for none')
+    args = parser.parse_args()
+
+    for keys in args.keys:
+        for write_every in args.write_every:
+            for kind in ('snapshot', 'copy'):
+                result = run(kind, keys, write_every)
+                print(f"{result['kind']:>8} {result['keys']:>8} keys (write every {write_every or '-'}): "
+                      f"{result['ms_per_scan']:8.1f} ms/scan {result['peak_kb']:10.1f} KB peak")
+
+
+if __name__ == '__main__':
+    main()
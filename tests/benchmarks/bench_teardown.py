@@ -0,0 +1,59 @@
+"""Teardown benchmark of nested SharedObject: time to unlink and close a dict of nested lists, in the creating process and in an attached one.
+
+Run from the repository root:
+
+    PYTHONPATH=. python tests/benchmarks/bench_teardown.py
+"""
+import argparse
+import multiprocessing
+import time
+
+from SharedObject import SharedObject
+
+
+def attached_teardown(name, queue):
+    sh_obj = SharedObject(create = False, name = name)
+    start = time.perf_counter_ns()
+    sh_obj.unlink()
+    sh_obj.close()
+    queue.put((time.perf_counter_ns() - start) / 1e6)
+
+
+def run(children, arena, attached):
+    name = f'bench_teardown_{children}'
+    start = time.perf_counter_ns()
+    sh_obj = SharedObject(obj = {f'k{i}': [i] for i in range(children)}, create = True, name = name,
+                          size = 10_000_000, is_nested = True, arena = arena)
+    ms_create = (time.perf_counter_ns() - start) / 1e6
+    
+    if attached:
+        sh_obj.dump_full_object()
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target = attached_teardown, args = (name, queue))
+        process.start()
+        ms_teardown = queue.get()
+        process.join()
+        sh_obj.close()
+    else:
+        start = time.perf_counter_ns()
+        sh_obj.unlink()
+        sh_obj.close()
+        ms_teardown = (time.perf_counter_ns() - start) / 1e6
+    return {'children': children, 'arena': arena, 'attached': attached, 'ms_create': ms_create, 'ms_teardown': ms_teardown}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--children', type = int, nargs = '+', default = [10_000, 100_000])
+    parser.add_argument('--no-arena', action = 'store_true', help = 'two segments per child, mind the limit of open files')
+    args = parser.parse_args()
+    
+    for children in args.children:
+        for attached in (False, True):
+            result = run(children, not args.no_arena, attached)
+            print(f"{result['children']:>8} children ({'attached' if attached else 'creator'}): "
+                  f"{result['ms_create']:10.1f} ms/create {result['ms_teardown']:10.1f} ms/teardown")
+
+
+if __name__ == '__main__':
+    main()
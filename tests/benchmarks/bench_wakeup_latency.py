@@ -0,0 +1,62 @@
+"""Wake-up latency of a consumer process blocked in SharedObject.wait_for_change.
+
+Run from the repository root:
+
+    PYTHONPATH=. python tests/benchmarks/bench_wakeup_latency.py
+"""
+import argparse
+import multiprocessing
+import statistics
+import time
+
+from SharedObject import SharedObject
+
+
+def consumer(name, changes, latencies, ready_event):
+    sh_obj = SharedObject(create = False, name = name)
+    ready_event.set()
+    received = []
+    while len(received) < changes:
+        sh_obj.wait_for_change()
+        now = time.perf_counter_ns()
+        received.extend(now - timestamp for timestamp in sh_obj.data[len(received):])
+    latencies.extend(received)
+    sh_obj.close()
+
+
+def run(changes, interval):
+    name = 'bench_wakeup'
+    sh_obj = SharedObject(obj = [], create = True, name = name, size = 1_000_000, is_nested = False)
+    
+    manager = multiprocessing.Manager()
+    latencies = manager.list()
+    ready_event = multiprocessing.Event()
+    process = multiprocessing.Process(target = consumer, args = (name, changes, latencies, ready_event))
+    process.start()
+    ready_event.wait()
+    time.sleep(0.2)
+    
+    for _ in range(changes):
+        sh_obj.append(time.perf_counter_ns())
+        time.sleep(interval)
+    process.join()
+    
+    sh_obj.unlink()
+    sh_obj.close()
+    latencies = sorted(latencies)
+    return {'changes': changes, 'p50_us': statistics.median(latencies) / 1000,
+            'p99_us': latencies[int(len(latencies) * 0.99) - 1] / 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--changes', type = int, default = 1000)
+    parser.add_argument('--interval', type = float, default = 0.001, help = 'seconds between changes')
+    args = parser.parse_args()
+    
+    result = run(args.changes, args.interval)
+    print(f"{result['changes']} changes: p50 {result['p50_us']:.1f} us, p99 {result['p99_us']:.1f} us")
+
+
+if __name__ == '__main__':
+    main()
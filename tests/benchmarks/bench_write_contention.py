@@ -0,0 +1,58 @@
+"""Write contention benchmark: N writer processes appending to one SharedObject list.
+
+Run from the repository root:
+
+    PYTHONPATH=. python tests/benchmarks/bench_write_contention.py --writers 1 4 16 64
+"""
+import argparse
+import multiprocessing
+import time
+
+from SharedObject import SharedObject
+
+
+def writer(name, ops, start_event):
+    sh_obj = SharedObject(create = False, name = name)
+    start_event.wait()
+    for i in range(ops):
+        sh_obj.append(i)
+    sh_obj.close()
+
+
+def run(writers, ops, size):
+    name = f'bench_contention_{writers}'
+    sh_obj = SharedObject(obj = [], create = True, name = name, size = size, is_nested = False)
+    start_event = multiprocessing.Event()
+    processes = [multiprocessing.Process(target = writer, args = (name, ops, start_event)) for _ in range(writers)]
+    for process in processes:
+        process.start()
+    
+    time.sleep(0.5)
+    start = time.perf_counter()
+    start_event.set()
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+    
+    total = len(sh_obj)
+    assert total == writers * ops, f'lost writes: {total} != {writers * ops}'
+    sh_obj.unlink()
+    sh_obj.close()
+    return {'writers': writers, 'ops': writers * ops, 'seconds': elapsed, 'ops_per_second': writers * ops / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--writers', type = int, nargs = '+', default = [1, 4, 16, 64])
+    parser.add_argument('--ops', type = int, default = 1000, help = 'appends per writer')
+    parser.add_argument('--size', type = int, default = 1_000_000, help = 'op-log buffer size')
+    args = parser.parse_args()
+    
+    for writers in args.writers:
+        result = run(writers, args.ops, args.size)
+        print(f"{result['writers']:>4} writers: {result['ops']:>8} ops in {result['seconds']:.3f}s, "
+              f"{result['ops_per_second']:,.0f} ops/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""Benchmark suite of SharedObject, SharedArray, SharedDict, SharedQueue, ShardedSharedDict and SharedCache: runs the benchmarks of this directory and writes the results as JSON.
+
+Run from the repository root, or by `make do_benchmark`:
+
+    PYTHONPATH=. python tests/benchmarks/run_benchmarks.py --output bench.json
+    PYTHONPATH=. python tests/benchmarks/run_benchmarks.py --output bench.json --compare baseline.json
+
+Every case is the keyword arguments of the `run` function of a benchmark script, the
+JSON holds the cases with their results, so runs of the same profile can be compared.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import bench_arena
+import bench_counters
+import bench_full_dump
+import bench_nested_attach
+import bench_op_encoding
+import bench_op_latency
+import bench_pool_tasks
+import bench_read_latency
+import bench_scaling
+import bench_sharded
+import bench_shared_array
+import bench_shared_cache
+import bench_shared_dict
+import bench_shared_queue
+import bench_snapshot
+import bench_teardown
+import bench_wakeup_latency
+import bench_write_contention
+
+
+def cases(profile):
+    """Benchmark name -> (run function, list of keyword arguments) of `profile`."""
+
+    quick = profile == 'quick'
+    processes = bench_scaling.default_processes()
+    return {
+        'op_latency': (bench_op_latency.run,
+                       [dict(method = method, ops = 2000 if quick else 20_000) for method in bench_op_latency.methods]),
+        'replay': (bench_op_encoding.run,
+                   [dict(workload = workload, ops = 5000 if quick else 50_000) for workload in bench_op_encoding.workloads]),
+        'read_latency': (bench_read_latency.run,
+                         [dict(sync = sync, keys = 1000, reads = 20_000 if quick else 200_000, write_every = write_every)
+                          for write_every in (0, 100) for sync in ('always', 'interval', 'manual')]),
+        'full_dump': (bench_full_dump.run,
+                      [dict(items = items, dumps = 20 if quick else 200) for items in (10, 1000, 100_000)]),
+        'attach': (bench_nested_attach.run,
+                   [dict(children = children, nested = nested) for nested in (False, True) for children in (100, 1000)]),
+        'pool_tasks': (bench_pool_tasks.run,
+                       [dict(keys = keys, tasks = 500 if quick else 5000, workers = 2) for keys in (100, 100_000)]),
+        'scaling_readers': (bench_scaling.run_readers,
+                            [dict(readers = readers, keys = 1000, reads = 10_000 if quick else 100_000) for readers in processes]),
+        'scaling_writers': (bench_write_contention.run,
+                            [dict(writers = writers, ops = 200 if quick else 2000, size = 1_000_000) for writers in processes]),
+        'sharded_writers': (bench_sharded.run,
+                            [dict(kind = kind, writers = writers, ops = 200 if quick else 2000)
+                             for writers in processes for kind in ('ShardedSharedDict', 'SharedObject')]),
+        'counters': (bench_counters.run,
+                     [dict(kind = kind, processes = processes, ops = 1000 if quick else 10_000)
+                      for processes in (1, 4) for kind in bench_counters.kinds]),
+        'wakeup_latency': (bench_wakeup_latency.run,
+                           [dict(changes = 100 if quick else 1000, interval = 0.001)]),
+        'shared_array': (bench_shared_array.run,
+                         [dict(kind = kind, length = length, ops = 2000 if quick else 20_000)
+                          for length in (1000, 100_000) for kind in ('SharedArray', 'SharedObject')]),
+        'shared_dict': (bench_shared_dict.run,
+                        [dict(kind = kind, keys = keys, reads = 10_000 if quick else 100_000)
+                         for keys in (1000, 100_000) for kind in ('SharedDict', 'SharedObject')]),
+        'shared_queue': (bench_shared_queue.run,
+                         [dict(kind = kind, producers = processes, consumers = processes, items = 2000 if quick else 20_000, batch = batch)
+                          for batch in (1, 32) for processes in (1, 2) for kind in ('SharedQueue', 'SharedObject')
+                          if kind == 'SharedQueue' or processes == 1]),
+        'shared_cache': (bench_shared_cache.run,
+                         [dict(kind = kind, processes = processes, keys = keys, lookups = 2000 if quick else 20_000, maxsize = 1000)
+                          for keys in (500, 10_000) for processes in (1, 4) for kind in bench_shared_cache.kinds]),
+        'snapshot': (bench_snapshot.run,
+                     [dict(kind = kind, keys = 10_000 if quick else 100_000, write_every = write_every)
+                      for write_every in (0, 1000) for kind in ('snapshot', 'copy')]),
+        'arena': (bench_arena.run,
+                  [dict(arena = arena, children = 100 if quick else 1000) for arena in (False, True)]),
+        'teardown': (bench_teardown.run,
+                     [dict(children = 1000 if quick else 10_000, arena = arena, attached = attached)
+                      for arena in (False, True) for attached in (False, True)]),
+    }
+
+
+def metadata(profile):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output = True, text = True,
+                                cwd = os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'profile': profile, 'commit': commit, 'date': datetime.datetime.now().isoformat(timespec = 'seconds'),
+            'python': platform.python_version(), 'platform': platform.platform(), 'cpu_count': os.cpu_count()}
+
+
+def run(profile, benchmarks):
+    results = []
+    for benchmark, (run_case, case_kwargs) in cases(profile).items():
+        if benchmarks and benchmark not in benchmarks:
+            continue
+        for kwargs in case_kwargs:
+            start = time.perf_counter()
+            result = run_case(**kwargs)
+            print(f'{benchmark:>16} {json.dumps(kwargs)}: {json.dumps(result)} ({time.perf_counter() - start:.1f}s)', flush = True)
+            results.append({'benchmark': benchmark, 'params': kwargs, 'result': result})
+    return results
+
+
+def compare(results, baseline):
+    """Print the ratio of each numeric metric to the one of the same case in `baseline`."""
+
+    baseline_results = {(case['benchmark'], json.dumps(case['params'], sort_keys = True)): case['result']
+                        for case in baseline['results']}
+    for case in results:
+        baseline_result = baseline_results.get((case['benchmark'], json.dumps(case['params'], sort_keys = True)))
+        if baseline_result is None:
+            continue
+        for metric, value in case['result'].items():
+            baseline_value = baseline_result.get(metric)
+            if metric in case['params'] or isinstance(value, bool) or not isinstance(value, (int, float)) or not baseline_value:
+                continue
+            print(f"{case['benchmark']:>16} {json.dumps(case['params'])} {metric}: "
+                  f"{baseline_value:,.3f} -> {value:,.3f} ({value / baseline_value:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--profile', choices = ('quick', 'full'), default = 'quick')
+    parser.add_argument('--benchmarks', nargs = '+', choices = list(cases('quick')), help = 'all by default')
+    parser.add_argument('--output', help = 'JSON file of the results')
+    parser.add_argument('--compare', help = 'JSON file of earlier results of the same profile')
+    args = parser.parse_args()
+
+    report = {'metadata': metadata(args.profile), 'results': run(args.profile, args.benchmarks)}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent = 2)
+    if args.compare:
+        with open(args.compare) as file:
+            compare(report['results'], json.load(file))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+from ShardedSharedObject import ShardedSharedDict, ShardedSharedSet
+import multiprocessing
+import pickle
+import pytest
+
+
+def _write(name, start, n):
+    sh_dict = ShardedSharedDict(create=False, name=name)
+    for i in range(start, start + n):
+        sh_dict[i] = i * 2
+    sh_dict.close()
+
+
+def test_sharded_shared_dict():
+    """Testing dict methods of the sharded dict and writes of several processes."""
+
+    sh_dict1 = ShardedSharedDict(obj={'a': 1, 'b': 2}, create=True, name='sharded_dict', shards=4, size=100_000)
+    sh_dict2 = ShardedSharedDict(create=False, name='sharded_dict')
+    assert sh_dict2.shards == 4
+    assert sh_dict2 == {'a': 1, 'b': 2}
+
+    sh_dict1['c'] = [3]
+    sh_dict1.update({'d': 4}, e=5)
+    assert sh_dict2['c'] == [3] and 'e' in sh_dict2 and 'f' not in sh_dict2
+    assert sh_dict2.setdefault('a', 10) == 1 and sh_dict2.setdefault('f', 6) == 6
+    assert sh_dict1.pop('f') == 6 and sh_dict1.pop('f', None) is None
+    with pytest.raises(KeyError):
+        sh_dict1.pop('f')
+    del sh_dict2['e']
+    assert sh_dict1.get('e') is None and len(sh_dict1) == 4
+    assert sorted(sh_dict1) == ['a', 'b', 'c', 'd']
+    assert sorted(sh_dict1.values(), key=str) == [1, 2, 4, [3]]
+    assert sh_dict2.incr('a') == 2 and sh_dict1.compare_and_set('a', 2, 1)
+    assert sh_dict1.get_and_set('b', 2) == 2
+
+    # Equal keys which are different objects go to the same shard.
+    key = 'key12345'
+    sh_dict1[(key, 1)] = 'v'
+    assert sh_dict2.get(('key' + str(12345), 1)) == 'v'
+    sh_dict2[('key' + str(12345), 1)] = 'w'
+    assert sh_dict1[(key, 1)] == 'w' and len(sh_dict1) == 5
+    del sh_dict1[(key, 1)]
+
+    sh_dict3 = pickle.loads(pickle.dumps(sh_dict1))
+    assert sh_dict3.copy() == {'a': 1, 'b': 2, 'c': [3], 'd': 4}
+
+    processes = [multiprocessing.Process(target=_write, args=('sharded_dict', i * 100, 100)) for i in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert len(sh_dict2) == 404 and sh_dict2[399] == 798
+    assert all(len(shard) for shard in sh_dict2._shards)
+
+    sh_dict1.clear()
+    assert len(sh_dict2) == 0
+
+    sh_dict1.unlink()
+    sh_dict1.close()
+    sh_dict2.close()
+
+
+def test_sharded_shared_set():
+    """Testing set methods of the sharded set."""
+
+    sh_set1 = ShardedSharedSet(obj={1, 2, 'a'}, create=True, name='sharded_set', shards=3, size=100_000)
+    sh_set2 = ShardedSharedSet(create=False, name='sharded_set')
+    assert sh_set2 == {1, 2, 'a'}
+
+    sh_set1.add((3, 4))
+    sh_set1.update({5, 6}, [7])
+    sh_set2.discard(1)
+    sh_set2.difference_update([2, 5])
+    with pytest.raises(KeyError):
+        sh_set2.remove(1)
+    sh_set2.remove(6)
+    assert sh_set1.copy() == {'a', (3, 4), 7}
+
+    popped = {sh_set1.pop() for _ in range(3)}
+    assert popped == {'a', (3, 4), 7} and len(sh_set2) == 0
+    with pytest.raises(KeyError):
+        sh_set2.pop()
+
+    sh_set1.unlink()
+    sh_set1.close()
+    sh_set2.close()
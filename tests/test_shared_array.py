@@ -0,0 +1,99 @@
+from SharedArray import SharedArray
+import multiprocessing
+import pytest
+
+
+def _extend_range(name, n):
+    sh_arr = SharedArray(create=False, name=name)
+    for i in range(n):
+        sh_arr.append(i)
+    sh_arr.close()
+
+
+def test_shared_array():
+    """Testing typed array reads and writes in place."""
+
+    sh_arr1 = SharedArray('d', 5, create=True, name='arr_obj', capacity=10)
+    sh_arr2 = SharedArray(create=False, name='arr_obj')
+    assert sh_arr1 == sh_arr2 == [0.0] * 5
+
+    sh_arr1[1] = 2.5
+    sh_arr2[2:4] = [3, 4]
+    assert sh_arr1 == sh_arr2 == [0.0, 2.5, 3.0, 4.0, 0.0]
+    assert list(sh_arr2[1:3]) == [2.5, 3.0]
+
+    sh_arr2.append(5)
+    sh_arr1.extend([6, 7])
+    assert len(sh_arr1) == len(sh_arr2) == 8
+    assert sh_arr1 == sh_arr2 == [0.0, 2.5, 3.0, 4.0, 0.0, 5.0, 6.0, 7.0]
+
+    with pytest.raises(Exception):
+        sh_arr1.extend([1, 2, 3])
+
+    sh_arr2.close()
+    sh_arr1.unlink()
+    sh_arr1.close()
+
+
+def test_shared_array_without_numpy(monkeypatch):
+    """Testing the memoryview fallback when NumPy is not installed."""
+
+    monkeypatch.setattr('SharedArray.numpy', None)
+
+    sh_arr1 = SharedArray('q', create=True, name='arr_plain', obj=range(5), capacity=8)
+    sh_arr2 = SharedArray(create=False, name='arr_plain')
+    sh_arr1[::2] = [10, 20, 30]
+    sh_arr2.append(5)
+    assert sh_arr1 == sh_arr2 == [10, 1, 20, 3, 30, 5]
+    assert sh_arr2[1:3] == [1, 20]
+    assert sh_arr2.shape == (6, )
+
+    with pytest.raises(Exception):
+        sh_arr1.ndarray
+
+    sh_arr2.close()
+    sh_arr1.unlink()
+    sh_arr1.close()
+
+
+def test_shared_array_numpy():
+    """Testing zero-copy NumPy views of multi-dimensional arrays."""
+
+    numpy = pytest.importorskip('numpy')
+
+    array = numpy.arange(12, dtype='i4').reshape(4, 3)
+    sh_arr1 = SharedArray(obj=array, create=True, name='arr_numpy', capacity=6)
+    sh_arr2 = SharedArray(create=False, name='arr_numpy')
+    assert sh_arr2.shape == (4, 3)
+    assert (numpy.asarray(sh_arr2) == array).all()
+
+    view = sh_arr1.ndarray
+    view[:, 0] *= 10
+    array[:, 0] *= 10
+    del view
+    assert (sh_arr2[:] == array).all()
+
+    sh_arr2.append([1, 1, 1])
+    assert sh_arr1.shape == (5, 3)
+    assert sh_arr1[4].tolist() == [1, 1, 1]
+
+    sh_arr2.close()
+    sh_arr1.unlink()
+    sh_arr1.close()
+
+
+def test_shared_array_concurrent_appends():
+    """Testing that concurrent appends do not lose items."""
+
+    sh_arr = SharedArray('q', 0, create=True, name='arr_conc', capacity=1200)
+    processes = [multiprocessing.Process(target=_extend_range, args=('arr_conc', 300)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+
+    assert sorted(sh_arr) == sorted(list(range(300)) * 4)
+
+    sh_arr.unlink()
+    sh_arr.close()
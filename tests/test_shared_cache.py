@@ -0,0 +1,137 @@
+from SharedCache import SharedCache, shared_memoize
+import multiprocessing
+import pickle
+import pytest
+import time
+
+
+@shared_memoize('memo_cache')
+def _square(x, offset=0):
+    return x * x + offset
+
+
+def _call_square(results):
+    results.put([_square(i) for i in range(10)] + [_square.cache_stats()['hits']])
+
+
+def test_shared_cache():
+    """Testing lookups, CLOCK eviction and the counters of the shared cache."""
+
+    sh_cache1 = SharedCache(obj={'a': 1}, create=True, name='cache_clock', maxsize=4, item_size=64)
+    sh_cache2 = pickle.loads(pickle.dumps(sh_cache1))
+    assert sh_cache2['a'] == 1 and 'a' in sh_cache2 and len(sh_cache2) == 1
+
+    sh_cache1.update({'b': [2], 'c': 3, 'd': None})
+    assert sh_cache2.get('z', 0) == 0
+    with pytest.raises(KeyError):
+        sh_cache2['z']
+    sh_cache2['a'] = 10
+
+    # Items which were hit since the last sweep stay when the full cache evicts.
+    assert sh_cache1['a'] == 10 and sh_cache1['b'] == [2]
+    sh_cache2['e'] = 5
+    assert 'c' not in sh_cache1 and sh_cache1['a'] == 10 and sh_cache1['b'] == [2]
+    sh_cache2['f'] = 6
+    assert 'd' not in sh_cache1 and sh_cache1['e'] == 5 and sh_cache1['f'] == 6
+    assert len(sh_cache1) == 4
+
+    del sh_cache1['e']
+    with pytest.raises(KeyError):
+        del sh_cache2['e']
+    with pytest.raises(Exception):
+        sh_cache1['big'] = 'x' * 100
+
+    stats = sh_cache2.stats()
+    assert stats['evictions'] == 2 and stats['size'] == 3 and stats['maxsize'] == 4
+    assert stats['hits'] == 7 and stats['misses'] == 2
+
+    for i in range(100):
+        sh_cache1[i] = i
+        assert sh_cache2[i] == i
+    assert len(sh_cache2) == 4 and sh_cache1.stats()['evictions'] == 2 + 99
+    sh_cache2.clear()
+    assert len(sh_cache1) == 0 and 99 not in sh_cache1
+
+    sh_cache1.unlink()
+    del sh_cache1
+    del sh_cache2
+
+
+class _AlwaysReferenced:
+    """Reference bits which lookups of other processes set again as soon as the sweep clears them."""
+
+    def __getitem__(self, slot):
+        return 1
+
+    def __setitem__(self, slot, value):
+        pass
+
+
+def test_shared_cache_bounded_eviction():
+    """Testing that a write to the full cache evicts even if every item keeps being hit."""
+
+    sh_cache = SharedCache(obj={i: i for i in range(3)}, create=True, name='cache_bounded', maxsize=3, item_size=64)
+    refs, sh_cache._refs = sh_cache._refs, _AlwaysReferenced()
+    sh_cache['new'] = 1
+    assert sh_cache['new'] == 1 and len(sh_cache) == 3
+    assert sh_cache.stats()['evictions'] == 1
+
+    sh_cache._refs = refs
+    sh_cache.unlink()
+    del sh_cache
+
+
+def test_shared_cache_equal_keys():
+    """Testing that equal keys which pickle differently hit the same item."""
+
+    sh_cache = SharedCache(create=True, name='cache_keys', maxsize=8, item_size=64)
+    a, b = 'ab' * 3, ''.join(['ab'] * 3)
+    assert pickle.dumps((a, a)) != pickle.dumps((a, b))
+    sh_cache[(a, a)] = 1
+    sh_cache[1] = 'one'
+    assert sh_cache[(a, b)] == 1 and sh_cache.get((b, a)) == 1
+    assert sh_cache[True] == 'one' and sh_cache[1.0] == 'one' and (1.0, a) not in sh_cache
+    sh_cache[(1.0, b)] = 2
+    assert sh_cache[(True, a)] == 2 and len(sh_cache) == 3
+
+    sh_cache.unlink()
+    del sh_cache
+
+
+def test_shared_cache_ttl():
+    """Testing that expired items are missed and evicted first."""
+
+    sh_cache = SharedCache(create=True, name='cache_ttl', maxsize=2, ttl=0.05)
+    sh_cache['a'] = 1
+    assert sh_cache['a'] == 1
+    time.sleep(0.1)
+    assert sh_cache.get('a') is None
+    sh_cache['b'] = 2
+    sh_cache['c'] = 3
+    assert sh_cache['b'] == 2 and sh_cache['c'] == 3
+    assert sh_cache.stats()['expirations'] == 1
+
+    sh_cache.unlink()
+    del sh_cache
+
+
+def test_shared_memoize():
+    """Testing that results computed by one process are reused by the others."""
+
+    sh_cache = SharedCache(create=True, name='memo_cache', maxsize=64)
+    assert [_square(i) for i in range(10)] == [i * i for i in range(10)]
+    assert _square(3, offset=1) == 10
+    assert sh_cache.stats()['misses'] == 11
+
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_call_square, args=(results, )) for _ in range(3)]
+    for process in processes:
+        process.start()
+    outputs = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    assert all(output[:10] == [i * i for i in range(10)] for output in outputs)
+    assert sh_cache.stats()['hits'] == 30 and sh_cache.stats()['misses'] == 11
+
+    sh_cache.unlink()
+    del sh_cache
@@ -0,0 +1,138 @@
+from SharedDict import SharedDict, table_header
+import multiprocessing
+import pickle
+import pytest
+
+
+def _set_range(name, start, n):
+    sh_dict = SharedDict(create=False, name=name)
+    for i in range(start, start + n):
+        sh_dict[i] = str(i)
+    sh_dict.close()
+
+
+def _incr(name, n):
+    sh_dict = SharedDict(create=False, name=name)
+    for _ in range(n):
+        sh_dict.incr('hits')
+        sh_dict.incr('bytes', 0.5)
+    sh_dict.close()
+
+
+def test_shared_dict():
+    """Testing dict attributes of the shared hash table."""
+
+    obj = {'a': 1, 'b': [1, 2]}
+    sh_dict1 = SharedDict(obj=obj, create=True, name='dict_table', size=200)
+    sh_dict2 = SharedDict(create=False, name='dict_table')
+    assert obj == sh_dict1 == sh_dict2
+
+    for i in range(1000):
+        obj[i % 100] = 'x' * (i % 7)
+        sh_dict1[i % 100] = 'x' * (i % 7)
+    assert obj == sh_dict1 == sh_dict2
+    assert sh_dict2._generation > 0
+
+    del obj['a']
+    del sh_dict2['a']
+    assert 'a' not in sh_dict1
+    assert sh_dict1.get('a', 0) == 0
+    with pytest.raises(KeyError):
+        sh_dict1['a']
+
+    assert obj.pop(5) == sh_dict1.pop(5)
+    assert obj.setdefault('c', 3) == sh_dict2.setdefault('c', 3)
+    obj.update({'d': 4}, e=5)
+    sh_dict1.update({'d': 4}, e=5)
+    assert obj == sh_dict1 == sh_dict2
+    assert len(obj) == len(sh_dict1) == len(sh_dict2)
+    assert sorted(obj, key=str) == sorted(sh_dict2, key=str)
+
+    # Equal keys of built-in types are the same key, whichever objects they are made of.
+    a, b = 'key' + str(1), 'key' + str(1)
+    sh_dict1[(a, a)] = 1
+    assert sh_dict2.get((a, b)) == 1 and sh_dict2.get(('key1', 'key1')) == 1
+    sh_dict2[(a, b)] = 2
+    assert sh_dict1[(a, a)] == 2 and ('key1', 'key1') in sh_dict1
+    del sh_dict1[(b, b)]
+
+    sh_dict3 = pickle.loads(pickle.dumps(sh_dict2))
+    assert obj == sh_dict3
+
+    sh_dict1.clear()
+    assert sh_dict2 == {} and len(sh_dict3) == 0
+
+    sh_dict1.unlink()
+    del sh_dict1
+    del sh_dict2
+    del sh_dict3
+
+
+def test_shared_dict_concurrent_writers():
+    """Testing that concurrent inserts, with table rebuilds, do not lose keys."""
+
+    sh_dict = SharedDict(obj={}, create=True, name='dict_conc', size=1_000)
+    processes = [multiprocessing.Process(target=_set_range, args=('dict_conc', 500 * i, 500)) for i in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+
+    assert sh_dict == {i: str(i) for i in range(2000)}
+
+    sh_dict.unlink()
+    del sh_dict
+
+
+def test_shared_dict_atomic_ops():
+    """Testing counters and swaps, numbers are changed in place in their slots."""
+
+    sh_dict1 = SharedDict(obj={'n': 1, 'x': 'a'}, create=True, name='dict_atomic', size=1_000)
+    sh_dict2 = SharedDict(create=False, name='dict_atomic')
+
+    heap_top = table_header.unpack_from(sh_dict1._buf)[1]
+    assert sh_dict1.incr('n') == 2 and sh_dict2.incr('n', 3) == 5
+    assert sh_dict2.compare_and_set('n', 5, 10) and not sh_dict1.compare_and_set('n', 5, 20)
+    assert sh_dict1.get_and_set('n', 7) == 10 and sh_dict2['n'] == 7
+    assert table_header.unpack_from(sh_dict1._buf)[1] == heap_top
+
+    # Values of other types and numbers which change type get new entries.
+    assert sh_dict1.incr('n', 0.5) == 7.5 and sh_dict2.incr('n', 0.25) == 7.75
+    assert sh_dict1.incr('x', 'b') == 'ab' and sh_dict2.incr('new') == 1
+    assert sh_dict1.get_and_set('missing', 2 ** 70) is None and sh_dict2.incr('missing') == 2 ** 70 + 1
+    assert not sh_dict1.compare_and_set('absent', None, 1) and 'absent' not in sh_dict2
+    assert sh_dict2 == {'n': 7.75, 'x': 'ab', 'new': 1, 'missing': 2 ** 70 + 1}
+
+    processes = [multiprocessing.Process(target=_incr, args=('dict_atomic', 500)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert sh_dict1['hits'] == 2000 and sh_dict1['bytes'] == 1000.0
+
+    sh_dict1.unlink()
+    del sh_dict1
+    del sh_dict2
+
+
+def _incr_inherited(sh_dict, n):
+    for _ in range(n):
+        sh_dict.incr('hits')
+
+
+def test_shared_dict_fork_inherited():
+    """Testing atomic ops of a dict inherited by forked processes."""
+
+    sh_dict = SharedDict(obj={}, create=True, name='dict_fork')
+    sh_dict.incr('hits')
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=_incr_inherited, args=(sh_dict, 500)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert sh_dict['hits'] == 1 + 4 * 500
+
+    sh_dict.unlink()
+    del sh_dict
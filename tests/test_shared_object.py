@@ -1,4 +1,10 @@
-from SharedObject import SharedObject
+from SharedObject import SharedObject, get_codec, encode_record, decode_record, set_metrics_hook
+import asyncio
+import multiprocessing
+import os
+import pickle
+import pytest
+import threading
 from collections import deque, defaultdict, OrderedDict
 
 
@@ -188,6 +194,7 @@ def test_default_dict_shared_object():
     del sh_obj1
     del sh_obj2
 
+
 def test_ordered_dict_object():
     """Testing OrderedDict attributes."""
 
@@ -221,4 +228,737 @@ def test_ordered_dict_object():
 
     sh_obj1.unlink()
     del sh_obj1
-    del sh_obj2
\ No newline at end of file
+    del sh_obj2
+
+
+def _append_range(name, n):
+    sh_obj = SharedObject(create=False, name=name)
+    for i in range(n):
+        sh_obj.append(i)
+    sh_obj.close()
+
+
+def test_concurrent_writers():
+    """Testing that concurrent writers do not lose or corrupt records."""
+
+    sh_obj = SharedObject(obj=[], create=True, name='conc_obj', size=2_000, is_nested=False)
+    processes = [multiprocessing.Process(target=_append_range, args=('conc_obj', 300)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+
+    assert len(sh_obj) == 4 * 300
+    assert sorted(sh_obj) == sorted(list(range(300)) * 4)
+
+    sh_obj.unlink()
+    del sh_obj
+
+
+def _append_inherited(sh_obj, n):
+    for i in range(n):
+        sh_obj.append(i)
+
+
+def test_fork_inherited_lock():
+    """Testing that forked processes writing to an inherited object exclude each other."""
+
+    sh_obj = SharedObject(obj=[], create=True, name='fork_obj', size=10_000, is_nested=False)
+    sh_obj.append(-1)
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=_append_inherited, args=(sh_obj, 300)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    _append_inherited(sh_obj, 300)
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+
+    assert len(sh_obj) == 1 + 5 * 300
+
+    sh_obj.unlink()
+    del sh_obj
+
+
+def _write_both(sh_obj1, sh_obj2):
+    with sh_obj1.batch():
+        sh_obj1.append(1)
+        sh_obj2.append(2)
+
+
+def test_handles_share_lock():
+    """Testing that handles of the same object in a process do not wait for each other."""
+
+    sh_obj1 = SharedObject(obj=[], create=True, name='handles_lock_obj', is_nested=False)
+    sh_obj2 = SharedObject(create=False, name='handles_lock_obj')
+    thread = threading.Thread(target=_write_both, args=(sh_obj1, sh_obj2), daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+    assert sorted(sh_obj2) == [1, 2]
+
+    # The lock stays with the handles which are still open.
+    sh_obj1.close()
+    process = multiprocessing.Process(target=_append_range, args=('handles_lock_obj', 300))
+    process.start()
+    _append_inherited(sh_obj2, 300)
+    process.join()
+    assert process.exitcode == 0 and len(sh_obj2) == 2 + 2 * 300
+
+    sh_obj2.unlink()
+    del sh_obj1
+    del sh_obj2
+
+
+def test_batch_shared_object():
+    """Testing batched changes."""
+
+    obj = {1: 1}
+    sh_obj1 = SharedObject(obj=obj, create=True, name='batch_obj', is_nested=True)
+    sh_obj2 = SharedObject(create=False, name='batch_obj')
+
+    with sh_obj1.batch():
+        for i in range(100):
+            obj[i] = i
+            sh_obj1[i] = i
+        obj[100] = [100]
+        sh_obj1[100] = [100]
+        del obj[0]
+        del sh_obj1[0]
+        obj.update({i: -i for i in range(50, 150)})
+        sh_obj1.update({i: -i for i in range(50, 150)})
+    assert obj == sh_obj1 == sh_obj2
+
+    sh_obj1.unlink()
+    del sh_obj1
+    del sh_obj2
+
+    obj = deque(maxlen=50)
+    sh_obj1 = SharedObject(obj=obj, create=True, name='batch_deq', is_nested=False)
+    sh_obj2 = SharedObject(create=False, name='batch_deq')
+
+    with sh_obj1.batch():
+        for i in range(40):
+            obj.append(i)
+            sh_obj1.append(i)
+        obj.extendleft(range(20))
+        sh_obj1.extendleft(range(20))
+        assert obj.popleft() == sh_obj1.popleft()
+    assert obj == sh_obj1 == sh_obj2
+
+    sh_obj1.unlink()
+    del sh_obj1
+    del sh_obj2
+
+
+def test_ring_buffer_shared_object():
+    """Testing wraparound of the op-log and full dumps taken by policy."""
+
+    obj = {}
+    sh_obj1 = SharedObject(obj=obj, create=True, name='ring_obj', size=500, is_nested=False)
+    sh_obj2 = SharedObject(create=False, name='ring_obj')
+
+    for i in range(2000):
+        obj[i % 20] = i
+        sh_obj1[i % 20] = i
+        if i % 3 == 0:
+            assert obj == sh_obj2
+
+    obj['big'] = 'x' * 1000
+    sh_obj1['big'] = 'x' * 1000
+    assert obj == sh_obj1 == sh_obj2
+
+    sh_obj3 = SharedObject(create=False, name='ring_obj')
+    assert obj == sh_obj3
+
+    sh_obj1.unlink()
+    del sh_obj1
+    del sh_obj2
+    del sh_obj3
+
+    obj = []
+    sh_obj1 = SharedObject(obj=obj, create=True, name='ring_pol', size=100_000, is_nested=False, snapshot_ops=10)
+    for i in range(25):
+        obj.append(i)
+        sh_obj1.append(i)
+    assert sh_obj1._full_dump_counter == 2
+
+    sh_obj2 = SharedObject(create=False, name='ring_pol')
+    assert obj == sh_obj1 == sh_obj2
+
+    sh_obj1.unlink()
+    del sh_obj1
+    del sh_obj2
+
+
+class Blob:
+    """Bytes-like payload which is pickled out-of-band with protocol 5."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def __reduce_ex__(self, protocol):
+        if protocol >= 5:
+            return Blob, (pickle.PickleBuffer(self.data),)
+        return Blob, (bytes(self.data),)
+
+    def __eq__(self, other):
+        return bytes(self.data) == bytes(other.data)
+
+
+def test_out_of_band_full_dump():
+    """Testing full dumps with out-of-band buffers."""
+
+    obj = [Blob(b'a' * 100_000), 1]
+    sh_obj1 = SharedObject(obj=obj, create=True, name='oob_obj', is_nested=False, out_of_band=True)
+    sh_obj2 = SharedObject(create=False, name='oob_obj')
+    assert obj == sh_obj1 == sh_obj2
+    assert sh_obj2._full_dump_memory is not None
+
+    obj.append(Blob(b'b' * 10))
+    sh_obj1.append(Blob(b'b' * 10))
+    assert obj == sh_obj1 == sh_obj2
+
+    sh_obj1.unlink()
+    del sh_obj1
+    del sh_obj2
+
+
+def test_sync_modes():
+    """Testing 'interval' and 'manual' sync modes of readers."""
+
+    sh_obj1 = SharedObject(obj={1: 1}, create=True, name='sync_obj', is_nested=False)
+    sh_obj2 = SharedObject(create=False, name='sync_obj', sync='manual')
+    sh_obj3 = SharedObject(create=False, name='sync_obj', sync='interval', sync_interval=10**9)
+    assert sh_obj1 == sh_obj2 == sh_obj3
+
+    sh_obj1[2] = 2
+    assert 2 not in sh_obj2
+    sh_obj2.refresh()
+    assert 2 in sh_obj2
+
+    sh_obj3.refresh()
+    sh_obj1[3] = 3
+    assert 3 not in sh_obj3
+    sh_obj3.refresh()
+    assert 3 in sh_obj3
+
+    sh_obj2[4] = 4
+    assert sh_obj1 == sh_obj2 == {1: 1, 2: 2, 3: 3, 4: 4}
+
+    sh_obj1.unlink()
+    del sh_obj1
+    del sh_obj2
+    del sh_obj3
+
+
+@pytest.mark.parametrize('serializer', ['marshal', 'msgpack'])
+def test_codecs(serializer):
+    """Testing plain codecs negotiated by attachers."""
+
+    if serializer == 'msgpack':
+        pytest.importorskip('msgpack')
+
+    obj = OrderedDict({'a': (1, 2), 'b': [3.5, 'x'], 'c': {4, 5}})
+    sh_obj1 = SharedObject(obj=obj, create=True, name=f'{serializer}_obj', size=300,
+                           is_nested=False, serializer=serializer)
+    sh_obj2 = SharedObject(create=False, name=f'{serializer}_obj')
+    assert sh_obj2._serializer.name == serializer
+    assert obj == sh_obj1 == sh_obj2
+
+    for i in range(100):
+        obj[i] = (i, str(i))
+        sh_obj1[i] = (i, str(i))
+    obj.move_to_end('a')
+    sh_obj1.move_to_end('a')
+    assert obj == sh_obj1 == sh_obj2
+    assert list(obj) == list(sh_obj2)
+    assert type(sh_obj2.data) is OrderedDict
+
+    sh_obj1.unlink()
+    del sh_obj1
+    del sh_obj2
+
+
+def test_record_encoding():
+    """Testing compact op-log records."""
+
+    codec = get_codec('pickle')
+    for func_name, args, kwargs in [
+        ('append', (1,), {}),
+        ('__setitem__', ('key', 2.5), {}),
+        ('update', ({(1, 2): b'x', None: [True, 'y']},), {}),
+        ('append', (Blob(b'blob'),), {}),
+        ('sort', (), {'reverse': True}),
+        ('copy', (), {}),
+    ]:
+        record = encode_record(codec, func_name, args, kwargs)
+        assert decode_record(codec, memoryview(bytes(record))) == (func_name, args, kwargs)
+
+    assert len(encode_record(codec, 'append', (1,), {})) < len(pickle.dumps(('append', (1,), {})))
+
+
+def test_wait_for_change():
+    """Testing blocking and asynchronous waiting for changes."""
+
+    sh_obj1 = SharedObject(obj=deque(), create=True, name='wait_obj', is_nested=False)
+    sh_obj2 = SharedObject(create=False, name='wait_obj')
+
+    assert sh_obj2.wait_for_change(timeout=0.01) is False
+
+    timer = threading.Timer(0.05, sh_obj1.append, (1,))
+    timer.start()
+    assert sh_obj2.wait_for_change(timeout=10) is True
+    assert sh_obj2 == deque([1])
+    timer.join()
+
+    async def consume(sh_obj):
+        versions = []
+        async for version in sh_obj.changes():
+            versions.append(version)
+            if len(sh_obj) == 3:
+                return versions
+
+    timer = threading.Timer(0.05, sh_obj1.extend, ([2, 3],))
+    timer.start()
+    versions = asyncio.run(asyncio.wait_for(consume(sh_obj2), timeout=10))
+    assert versions[-1] == sh_obj1._update_stream_position
+    assert sh_obj2 == deque([1, 2, 3])
+    timer.join()
+
+    sh_obj1.unlink()
+    del sh_obj1
+    del sh_obj2
+
+
+def test_full_dump_segments_reuse():
+    """Testing that full dumps alternate between two reused, growing segments."""
+
+    obj = []
+    sh_obj1 = SharedObject(obj=obj, create=True, name='dump_obj', is_nested=False)
+    sh_obj2 = SharedObject(create=False, name='dump_obj')
+
+    names = set()
+    for i in range(6):
+        obj.append('x' * 10 ** i)
+        sh_obj1.append('x' * 10 ** i)
+        names.add(sh_obj1.dump_full_object().name)
+        assert obj == sh_obj2
+
+    assert names == {'dump_obj_dump0', 'dump_obj_dump1'}
+    assert sh_obj1._full_dump_slots_remote[0] > 1
+    assert obj == SharedObject(create=False, name='dump_obj')
+
+    sh_obj1.unlink()
+    del sh_obj1
+    del sh_obj2
+
+
+def test_op_log_growth():
+    """Testing that the op-log grows when it fills up too often and readers follow it."""
+
+    obj = {}
+    sh_obj1 = SharedObject(obj=obj, create=True, name='grow_obj', size=500, is_nested=False, max_size=8_000)
+    sh_obj2 = SharedObject(create=False, name='grow_obj')
+    sh_obj3 = SharedObject(obj={}, create=True, name='fixed_obj', size=500, is_nested=False, min_dump_interval=0)
+
+    for i in range(2000):
+        obj[i % 50] = i
+        sh_obj1[i % 50] = i
+        sh_obj3[i % 50] = i
+        if i % 7 == 0:
+            assert obj == sh_obj2
+
+    assert sh_obj1.size == 8_000
+    assert sh_obj1._buffer_generation == 4
+    assert obj == sh_obj2 == SharedObject(create=False, name='grow_obj')
+    assert sh_obj2.size == 8_000
+    assert sh_obj3.size == 500
+
+    sh_obj1.unlink()
+    sh_obj3.unlink()
+    del sh_obj1
+    del sh_obj2
+    del sh_obj3
+
+    # Attached writers keep to the limits of the creator.
+    sh_obj1 = SharedObject(obj={}, create=True, name='grow_capped', size=500, is_nested=False, max_size=2_000)
+    sh_obj2 = SharedObject(create=False, name='grow_capped')
+    for i in range(2000):
+        sh_obj2[i % 50] = i
+    assert sh_obj2.size == 2_000
+    assert sh_obj1 == {i: 1950 + i for i in range(50)}
+
+    sh_obj1.unlink()
+    del sh_obj1
+    del sh_obj2
+
+    sh_obj = SharedObject(obj={'a': [1, 2, 3]}, create=True, name='grow_nested', size=100_000, is_nested=True)
+    assert sh_obj['a'].size == 1_000
+
+    sh_obj.unlink()
+    del sh_obj
+
+
+def _attach_lazily(name):
+    sh_obj = SharedObject(create=False, name=name)
+    children = list(sh_obj.data.values())
+    assert all('_lazy_init' in child.__dict__ for child in children)
+
+    assert sh_obj['k5'] == [5, 6]
+    assert sum('_lazy_init' not in child.__dict__ for child in children) == 1
+
+    sh_obj._load_full_object(force=True)
+    assert sh_obj.data['k5'] is children[5]
+    sh_obj['k5'].append(7)
+    sh_obj.close()
+
+
+def test_lazy_nested_children():
+    """Testing that nested children attach on first access and handles are cached per process."""
+
+    obj = {f'k{i}': [i, i + 1] for i in range(50)}
+    sh_obj1 = SharedObject(obj=obj, create=True, name='lazy_obj', is_nested=True)
+    sh_obj1.dump_full_object()
+
+    process = multiprocessing.Process(target=_attach_lazily, args=('lazy_obj', ))
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+    assert sh_obj1['k5'] == [5, 6, 7]
+
+    sh_obj2 = SharedObject(create=False, name='lazy_obj')
+    assert sh_obj2['k1'] is sh_obj1['k1']
+
+    sh_obj1.unlink()
+    del sh_obj1
+    del sh_obj2
+
+
+def _write_arena_children(name):
+    sh_obj = SharedObject(create=False, name=name)
+    assert sh_obj['k3'] == [3, 4]
+    sh_obj['k3'].append(5)
+    sh_obj['new'] = {'x': [1]}
+    for i in range(3000):
+        sh_obj['k7'].append(i)
+    sh_obj.close()
+
+
+def test_arena_nested_children():
+    """Testing nested children carved from shared arenas."""
+
+    obj = {f'k{i}': [i, i + 1] for i in range(100)}
+    sh_obj = SharedObject(obj=obj, create=True, name='arena_obj', is_nested=True, arena=True, arena_size=1 << 16)
+    assert sh_obj['k1']._in_arena
+    assert sh_obj['k1']._lock is sh_obj['k2']._lock
+
+    process = multiprocessing.Process(target=_write_arena_children, args=('arena_obj', ))
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+
+    assert sh_obj['k3'] == [3, 4, 5]
+    assert sh_obj['new'] == {'x': [1]}
+    assert sh_obj['k7'] == [7, 8] + list(range(3000))
+    assert sh_obj['k7'].size > 1_000
+
+    assert sh_obj._arena.segment(2)
+
+    # Segments of children stay within the 31 characters of shared memory names on macOS.
+    child = sh_obj['k7']
+    child.dump_full_object()
+    names = [child.name, child._buffer_name(child._buffer_generation), child._dump_slot_name(1)]
+    names += [name for name in os.listdir('/dev/shm') if name.startswith('arena_obj')] if os.path.isdir('/dev/shm') else []
+    assert max(len(f'/{name}') for name in names) <= 31
+
+    sh_obj.unlink()
+    if os.path.isdir('/dev/shm'):
+        assert not [name for name in os.listdir('/dev/shm') if name.startswith('arena_obj')]
+    del sh_obj
+
+
+def test_stats():
+    """Testing shared and per-process statistics and the metrics hook."""
+
+    events = []
+    sh_obj1 = SharedObject(obj=[], create=True, name='stats_obj', is_nested=False)
+    sh_obj2 = SharedObject(create=False, name='stats_obj')
+
+    set_metrics_hook(lambda name, event, values: events.append((name, event, values)))
+    try:
+        for i in range(10):
+            sh_obj1.append(i)
+        assert sh_obj2.stats()['lag_bytes'] > 0
+        assert len(sh_obj2) == 10
+        sh_obj1.dump_full_object()
+        sh_obj2._load_full_object()
+    finally:
+        set_metrics_hook(None)
+
+    # The initial extend is an op as well.
+    stats1, stats2 = sh_obj1.stats(), sh_obj2.stats()
+    assert stats1['ops_written'] == stats2['ops_written'] == 11
+    assert stats1['op_log_bytes'] == stats2['op_log_bytes'] > 0
+    assert stats2['full_dumps'] == 1 and stats2['full_dump_bytes'] > 0
+    assert stats1['records_replayed'] == 0
+    assert stats2['records_replayed'] == 11
+    assert stats2['full_loads'] == 1
+    assert stats2['lag_bytes'] == 0
+
+    assert [event for _, event, _ in events].count('write') == 10
+    assert [values['records'] for _, event, values in events if event == 'replay'] == [10]
+    assert {event for _, event, _ in events} == {'write', 'replay', 'full_dump', 'full_load'}
+
+    sh_obj1.unlink()
+    del sh_obj1
+    del sh_obj2
+
+
+def test_save_load(tmp_path):
+    """Testing saving to a file and loading back with the op-log records after the full dump and the journal."""
+
+    path, journal = str(tmp_path / 'obj.snapshot'), str(tmp_path / 'obj.journal')
+    obj = defaultdict(list, {'a': [1]})
+    sh_obj1 = SharedObject(obj=obj, create=True, name='save_obj', is_nested=False, journal=journal)
+    sh_obj1.dump_full_object()
+    for i in range(10):
+        obj[i] = [i]
+        sh_obj1[i] = [i]
+    with sh_obj1.batch():
+        sh_obj1['b'] = 2
+        sh_obj1.pop('a')
+    obj['b'] = 2
+    obj.pop('a')
+    sh_obj1.save(path)
+
+    # Ops written after the save are recovered from the journal, up to the torn one.
+    for i in range(5):
+        obj[i] = None
+        sh_obj1[i] = None
+    sh_obj1.unlink()
+    sh_obj1.close()
+    with open(journal, 'ab') as file:
+        file.write(b'\x10\x00\x00\x00torn')
+
+    sh_obj2 = SharedObject.load(path, name='save_obj', journal=journal)
+    sh_obj3 = SharedObject(create=False, name='save_obj')
+    assert obj == sh_obj2 == sh_obj3
+    assert isinstance(sh_obj3.data, defaultdict)
+
+    sh_obj2['c'] = 3
+    obj['c'] = 3
+    sh_obj2.unlink()
+    sh_obj2.close()
+    sh_obj4 = SharedObject.load(path, name='save_obj', journal=journal)
+    assert obj == sh_obj4
+
+    sh_obj4.unlink()
+    del sh_obj3
+    del sh_obj4
+
+
+def test_save_without_journal(tmp_path):
+    """Testing that a process without the journal saves the size of the journal written by the others."""
+
+    path, journal = str(tmp_path / 'obj.snapshot'), str(tmp_path / 'obj.journal')
+    writer = SharedObject(obj=[], create=True, name='save_reader_obj', is_nested=False, journal=journal)
+    reader = SharedObject(create=False, name='save_reader_obj')
+    for i in range(5):
+        writer.append(i)
+    reader.save(path)
+    writer.append(5)
+    reader.close()
+    writer.unlink()
+    writer.close()
+
+    sh_obj = SharedObject.load(path, name='save_reader_obj', journal=journal)
+    assert sh_obj == list(range(6))
+    sh_obj.unlink()
+    del sh_obj
+
+
+def test_journal_shared(tmp_path):
+    """Testing that writers attached without the journal append their ops to it."""
+
+    path, journal = str(tmp_path / 'obj.snapshot'), str(tmp_path / 'obj.journal')
+    sh_obj1 = SharedObject(obj=[-1], create=True, name='journal_obj', is_nested=False, journal=journal)
+    sh_obj1.save(path)
+    process = multiprocessing.Process(target=_append_range, args=('journal_obj', 100))
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+    with pytest.raises(Exception):
+        SharedObject(create=False, name='journal_obj', journal=str(tmp_path / 'other.journal'))
+    sh_obj1.unlink()
+    sh_obj1.close()
+
+    sh_obj2 = SharedObject.load(path, name='journal_obj', journal=journal)
+    assert sh_obj2 == [-1] + list(range(100))
+    sh_obj3 = SharedObject(create=False, name='journal_obj')
+    sh_obj3.append(100)
+    sh_obj2.unlink()
+    sh_obj2.close()
+    sh_obj4 = SharedObject.load(path, name='journal_obj', journal=journal)
+    assert sh_obj4 == [-1] + list(range(101))
+
+    sh_obj4.unlink()
+    del sh_obj3
+    del sh_obj4
+
+
+def _task_handle(sh_obj):
+    return os.getpid(), id(sh_obj), len(sh_obj), sh_obj.stats()['records_replayed']
+
+
+def test_attached_handles():
+    """Testing that unpickled root objects are attached once per process and by object id."""
+
+    sh_obj1 = SharedObject(obj=[1, 2], create=True, name='pool_obj', is_nested=False)
+    sh_obj1.dump_full_object()
+
+    with multiprocessing.Pool(1) as pool:
+        results = [pool.apply(_task_handle, (sh_obj1, )) for _ in range(3)]
+        sh_obj1.append(3)
+        results.append(pool.apply(_task_handle, (sh_obj1, )))
+    assert len({result[:2] for result in results}) == 1
+    assert [result[2:] for result in results] == [(2, 1), (2, 1), (2, 1), (3, 2)]
+
+    # An object created again under the same name is attached again.
+    sh_obj2 = pickle.loads(pickle.dumps(sh_obj1))
+    assert pickle.loads(pickle.dumps(sh_obj1)) is sh_obj2 and sh_obj2 == [1, 2, 3]
+    sh_obj1.unlink()
+    sh_obj1.close()
+    sh_obj1 = SharedObject(obj=[4], create=True, name='pool_obj', is_nested=False)
+    sh_obj3 = pickle.loads(pickle.dumps(sh_obj1))
+    assert sh_obj3 is not sh_obj2 and sh_obj3 == [4]
+
+    sh_obj1.unlink()
+    del sh_obj1
+    del sh_obj2
+    del sh_obj3
+
+
+def _task_mapped(sh_obj):
+    len(sh_obj)
+    if not os.path.exists('/proc/self/maps'):
+        return None
+    with open('/proc/self/maps') as file:
+        return {line.split('/dev/shm/')[1].split()[0] for line in file if '/dev/shm/' in line}
+
+
+def test_attached_handles_unlinked():
+    """Testing that pool workers let go of the objects unlinked by their owners."""
+
+    with multiprocessing.Pool(1) as pool:
+        # The worker is started first, so it maps only the segments it attaches.
+        sh_obj1 = SharedObject(obj=[1], create=True, name='pool_old_obj', is_nested=False)
+        sh_obj2 = SharedObject(obj=[2], create=True, name='pool_new_obj', is_nested=False)
+        mapped = pool.apply(_task_mapped, (sh_obj1, ))
+        sh_obj1.unlink()
+        mapped_after = pool.apply(_task_mapped, (sh_obj2, ))
+    if mapped is not None:
+        assert 'pool_old_obj' in mapped and 'pool_new_obj' not in mapped
+        assert 'pool_new_obj' in mapped_after
+        assert not [name for name in mapped_after if name.startswith('pool_old_obj')]
+
+    sh_obj2.unlink()
+    del sh_obj1
+    del sh_obj2
+
+
+def test_snapshot():
+    """Testing that snapshots are not changed by later ops and copy the data only when needed."""
+
+    obj = {i: i for i in range(100)}
+    sh_obj1 = SharedObject(obj=obj, create=True, name='snapshot_obj', is_nested=False)
+    sh_obj2 = SharedObject(create=False, name='snapshot_obj')
+
+    snapshot = sh_obj2.snapshot()
+    assert snapshot.position == sh_obj2._update_stream_position
+    for key, value in snapshot.items():
+        sh_obj1[key + 100] = value
+        sh_obj2[key] = None
+    assert snapshot == obj and len(sh_obj2) == 200
+    assert sh_obj2.snapshot() == sh_obj1 and sh_obj2.snapshot() is not snapshot
+    with pytest.raises(AttributeError):
+        snapshot.update({})
+
+    # Without a snapshot alive the data is changed in place.
+    del snapshot
+    data = sh_obj1.data
+    sh_obj1.snapshot()
+    sh_obj1[0] = 0
+    assert sh_obj1.data is data
+
+    sh_obj1.unlink()
+    del sh_obj1
+    del sh_obj2
+
+
+def test_result_records():
+    """Testing that expensive and not deterministic ops are replayed from their results."""
+
+    obj = [(i * 7 % 10, i) for i in range(50)]
+    sh_obj1 = SharedObject(obj=obj, create=True, name='result_obj', is_nested=False)
+    sh_obj2 = SharedObject(create=False, name='result_obj')
+    obj.sort(key=lambda item: item[0], reverse=True)
+    sh_obj1.sort(key=lambda item: item[0], reverse=True)
+    assert obj == sh_obj1 == sh_obj2
+    with sh_obj1.batch():
+        sh_obj1.sort()
+        sh_obj1.append((0, 0))
+    obj.sort()
+    obj.append((0, 0))
+    assert obj == sh_obj2
+    sh_obj1.unlink()
+
+    obj = set(range(100))
+    sh_obj1 = SharedObject(obj=obj, create=True, name='result_set', is_nested=False)
+    sh_obj2 = SharedObject(create=False, name='result_set')
+    obj.discard(sh_obj1.pop())
+    position = sh_obj1._update_stream_position
+    obj.intersection_update(range(10, 200))
+    sh_obj1.intersection_update(range(10, 200))
+    records, _ = sh_obj1._read_records(position, sh_obj1._update_stream_position)
+    assert [func_name for func_name, _, _ in records] == ['difference_update']
+    obj.intersection_update({20, 30, 1000})
+    sh_obj1.intersection_update({20, 30, 1000})
+    assert obj == sh_obj1 == sh_obj2
+
+    sh_obj1.unlink()
+    del sh_obj1
+    del sh_obj2
+
+
+def _incr_range(name, n):
+    sh_obj = SharedObject(create=False, name=name)
+    for _ in range(n):
+        sh_obj.incr('hits')
+    sh_obj.close()
+
+
+def test_atomic_ops():
+    """Testing read-modify-write ops of dict values across processes."""
+
+    sh_obj1 = SharedObject(obj={'n': 1}, create=True, name='atomic_obj', is_nested=False)
+    sh_obj2 = SharedObject(create=False, name='atomic_obj')
+    assert sh_obj1.incr('n') == 2 and sh_obj2.incr('m', 0.5) == 0.5
+    assert sh_obj2.compare_and_set('n', 2, 'x') and not sh_obj1.compare_and_set('n', 2, 'y')
+    position = sh_obj1._update_stream_position
+    assert not sh_obj1.compare_and_set('absent', None, 1)
+    assert sh_obj1._update_stream_position == position
+    assert sh_obj1.get_and_set('n', 3) == 'x' and sh_obj2.get_and_set('k', 4) is None
+    assert sh_obj2 == {'n': 3, 'm': 0.5, 'k': 4}
+
+    processes = [multiprocessing.Process(target=_incr_range, args=('atomic_obj', 200)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert sh_obj2['hits'] == 800
+
+    sh_obj1.unlink()
+    del sh_obj1
+    del sh_obj2
@@ -0,0 +1,93 @@
+from SharedQueue import SharedQueue
+from queue import Empty, Full
+import multiprocessing
+import pickle
+import pytest
+
+
+def _consume(name, results):
+    sh_queue = SharedQueue(create=False, name=name)
+    items = []
+    while True:
+        batch = sh_queue.get_many(10)
+        if None in batch:
+            # Stop signals taken along with the own one are left to the other consumers.
+            items.extend(batch[:batch.index(None)])
+            if batch.index(None) + 1 < len(batch):
+                sh_queue.put_many(batch[batch.index(None) + 1:])
+            break
+        items.extend(batch)
+    results.put(items)
+    sh_queue.close()
+
+
+def _produce(name, start, n):
+    sh_queue = SharedQueue(create=False, name=name)
+    for i in range(start, start + n, 5):
+        sh_queue.put_many(range(i, min(i + 5, start + n)))
+    sh_queue.close()
+
+
+def test_shared_queue():
+    """Testing FIFO order, bounds and the blocking variants of the shared queue."""
+
+    sh_queue1 = SharedQueue(obj=[1, 'a'], create=True, name='queue_ring', maxsize=4, item_size=64)
+    sh_queue2 = pickle.loads(pickle.dumps(sh_queue1))
+    assert len(sh_queue2) == 2
+
+    sh_queue2.put((2, 3))
+    sh_queue1.put_nowait({'b': 4})
+    assert sh_queue1.full()
+    with pytest.raises(Full):
+        sh_queue2.put_nowait(5)
+    with pytest.raises(Full):
+        sh_queue2.put(5, timeout=0.01)
+
+    assert sh_queue2.get() == 1
+    assert sh_queue1.get_many(10) == ['a', (2, 3), {'b': 4}]
+    assert sh_queue1.empty()
+    with pytest.raises(Empty):
+        sh_queue1.get_nowait()
+    with pytest.raises(Empty):
+        sh_queue2.get(timeout=0.01)
+
+    # All or nothing without blocking.
+    sh_queue1.put(0)
+    with pytest.raises(Full):
+        sh_queue1.put_many(range(4), block=False)
+    sh_queue1.put_many(range(1, 4), block=False)
+    assert sh_queue2.get_many(4) == [0, 1, 2, 3]
+
+    with pytest.raises(Exception):
+        sh_queue1.put('x' * 100)
+
+    sh_queue1.unlink()
+    del sh_queue1
+    del sh_queue2
+
+
+def test_shared_queue_concurrent():
+    """Testing that every item goes to exactly one of the concurrent consumers."""
+
+    consumers, producers, n = 3, 2, 1000
+    sh_queue = SharedQueue(create=True, name='queue_conc', maxsize=16, item_size=32)
+    results = multiprocessing.Queue()
+    consumer_processes = [multiprocessing.Process(target=_consume, args=('queue_conc', results)) for _ in range(consumers)]
+    producer_processes = [multiprocessing.Process(target=_produce, args=('queue_conc', n * i, n)) for i in range(producers)]
+    for process in consumer_processes + producer_processes:
+        process.start()
+    for process in producer_processes:
+        process.join()
+    for _ in range(consumers):
+        sh_queue.put(None)
+
+    items = []
+    for _ in range(consumers):
+        items.extend(results.get())
+    for process in consumer_processes:
+        process.join()
+
+    assert sorted(items) == list(range(producers * n))
+
+    sh_queue.unlink()
+    del sh_queue